@@ -1,27 +1,100 @@
+import sys
+from api.startup import StartupProfiler, FirstConnectionMarker, HEAVY_MODULES
+PROFILER = StartupProfiler.from_argv(sys.argv) # installed before the imports below so they are timed
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api.routes import router
 import uvicorn, argparse, asyncio
 from contextlib import asynccontextmanager
-from core.llm import LLMClient, initialise_llm
-from core.issue import IssueManager
+from core.cache import ResponseCache, CACHE_MODES, REPLAY_TIMINGS
+from speech.backends import BACKEND_CHOICES
+if PROFILER is not None:
+    PROFILER.mark("imports")
 
 
 """
 Lifespan for the app
+The server starts accepting as soon as FastAPI is up: the services (LLM client, issue manager, residency, speech)
+and their heavy imports (ollama, numpy, the diagnostics stack, RAG) are created by a background task, which the
+routes that need them wait for (see _started in api/routes.py).
 """
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await initialise_llm(app)
-    app.state.issue_manager = IssueManager()
+    app.state.startup = asyncio.create_task(start_services(app), name="startup")
+    if PROFILER is not None:
+        PROFILER.mark("accepting connections")
     try:
         yield
     finally:
+        if not app.state.startup.done():
+            app.state.startup.cancel()
+        if hasattr(app.state, "issue_manager"):
+            await app.state.issue_manager.stop()
+        if hasattr(app.state, "plan_library"):
+            await app.state.plan_library.stop()
+        if hasattr(app.state, "speech"):
+            await app.state.speech.stop()
+        if hasattr(app.state, "residency"):
+            await app.state.residency.stop()
         if hasattr(app.state, "llm_client"):
             await app.state.llm_client.close()
         print("LLM connection closed", flush=True)
 
 
+async def start_services(app: FastAPI) -> None:
+    try:
+        await _start_services(app)
+    except Exception as e:
+        print(f"Startup failed: {e}", flush=True)
+        raise
+
+
+async def _start_services(app: FastAPI) -> None:
+    # import on a worker thread so the event loop keeps serving (e.g. the UI polling /test) meanwhile
+    await asyncio.to_thread(lambda: [__import__(name) for name in HEAVY_MODULES])
+    from core.llm import initialise_llm
+    from core.issue import IssueManager
+    from core.agents.turn_cache import TurnCache
+    from core.residency import ResidencyManager
+    from speech.service import TranscriptionService
+    from core.agents.fault_codes import load_fault_code_index
+
+    try:
+        await asyncio.to_thread(load_fault_code_index) # parsed once; the fault-code fast path then answers in milliseconds
+    except (OSError, ValueError) as e:
+        print(f"Fault code table not loaded: {e}", flush=True)
+    await initialise_llm(app)
+    turn_cache_config = getattr(app.state, "turn_cache_config", None) # opt-in (--turn-cache)
+    turn_cache = None
+    if turn_cache_config is not None and hasattr(app.state, "llm_client"):
+        turn_cache = TurnCache(app.state.llm_client.embed, **turn_cache_config)
+    plan_library = None
+    plan_library_dir = getattr(app.state, "plan_library_dir", None)
+    if plan_library_dir:
+        from core.agents.plan_library import PlanLibrary
+        try:
+            plan_library = await asyncio.to_thread(PlanLibrary, plan_library_dir) # fingerprints the RAG store
+        except (OSError, ValueError) as e:
+            print(f"Maintenance plan library not loaded: {e}", flush=True)
+        else:
+            plan_library.start() # re-checks it periodically, so a rebuilt store invalidates the plans
+            app.state.plan_library = plan_library
+    issue_config = getattr(app.state, "issue_config", {})
+    app.state.issue_manager = IssueManager(turn_cache=turn_cache, plan_library=plan_library, **issue_config)
+    if hasattr(app.state, "llm_client"):
+        app.state.residency = ResidencyManager(app.state.llm_client, on_ready=lambda ready: setattr(app.state, "llm_ready", ready))
+        app.state.residency.start()
+    speech_config = dict(getattr(app.state, "speech_config", {"model_size": "base", "preload": True}) or {})
+    if speech_config:
+        preload = speech_config.pop("preload")
+        app.state.speech = TranscriptionService(**speech_config)
+        app.state.speech.start(preload=preload)
+    if PROFILER is not None:
+        PROFILER.mark("services ready")
+        PROFILER.report()
+
+
 app = FastAPI(lifespan=lifespan)
 
 
@@ -40,13 +113,46 @@ app.add_middleware(
 
 
 app.include_router(router)
+if PROFILER is not None:
+    app.add_middleware(FirstConnectionMarker, profiler=PROFILER)
 
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--port", type=int, required=True)
     p.add_argument("--db", type=str, help="Database path (optional)")
+    p.add_argument("--llm-cache", choices=CACHE_MODES, default="off", help="LLM response cache mode (record/replay for deterministic sessions)")
+    p.add_argument("--llm-cache-path", type=str, help="JSONL file the LLM response cache is persisted to (optional)")
+    p.add_argument("--llm-cache-timing", choices=REPLAY_TIMINGS, default="collapsed", help="Replay cached streams instantly or with their recorded timing")
+    p.add_argument("--small-model", type=str, help="Model for light calls: communications and tests-log summaries (default: the router's); the large model's name routes every call to it")
+    p.add_argument("--turn-cache", action="store_true", help="Reuse diagnostics turns of similar states from earlier issues (semantic turn cache)")
+    p.add_argument("--turn-cache-dir", type=str, help="Persist the semantic diagnostics turn cache in this directory (implies --turn-cache)")
+    p.add_argument("--turn-cache-threshold", type=float, default=0.95, help="Cosine similarity needed to reuse a cached turn")
+    p.add_argument("--plan-library-dir", type=str, help="Serve precomputed maintenance plans from this library (built with python -m core.agents.plan_library build)")
+    p.add_argument("--whisper-model", type=str, default="base", help="Whisper model kept resident for speech-to-text")
+    p.add_argument("--speech-backend", choices=BACKEND_CHOICES, default="auto", help="Speech-to-text engine (auto: faster-whisper int8 when installed, else openai-whisper)")
+    p.add_argument("--speech-threads", type=int, help="CPU threads for speech-to-text (default: physical cores - 1)")
+    p.add_argument("--speech-compute-type", type=str, help="faster-whisper compute type (default: int8 on CPU, float16 on GPU)")
+    p.add_argument("--speech-lazy", action="store_true", help="Load the Whisper model on the first transcription instead of at startup")
+    p.add_argument("--no-speech", action="store_true", help="Disable the in-backend speech-to-text service")
+    p.add_argument("--issue-archive-dir", type=str, help="Append a compact record of every closed issue to JSONL files in this directory (optional)")
+    p.add_argument("--issue-idle-timeout", type=float, default=1800, help="Close an issue after this many seconds without a message from the technician")
+    p.add_argument("--profile-startup", action="store_true", help="Report import times and time to first accept/connection")
     args = p.parse_args()
 
+    if args.llm_cache != "off":
+        app.state.llm_cache = ResponseCache(mode=args.llm_cache, path=args.llm_cache_path, timing=args.llm_cache_timing)
+        print(f"LLM response cache: {args.llm_cache} ({args.llm_cache_path or 'in memory'})")
+    app.state.speech_config = None if args.no_speech else {
+        "model_size": args.whisper_model, "backend": args.speech_backend, "threads": args.speech_threads,
+        "compute_type": args.speech_compute_type, "preload": not args.speech_lazy,
+    }
+    app.state.issue_config = {"archive_dir": args.issue_archive_dir, "issue_params": {"idle_timeout_seconds": args.issue_idle_timeout}}
+    if args.small_model:
+        app.state.model_tiers = {"small": args.small_model}
+    if args.turn_cache or args.turn_cache_dir:
+        app.state.turn_cache_config = {"directory": args.turn_cache_dir, "threshold": args.turn_cache_threshold}
+    app.state.plan_library_dir = args.plan_library_dir
+
     print(f"Starting FastAPI server on port {args.port}")
     if args.db:
         print(f"Database path: {args.db}")
@@ -1,8 +1,27 @@
+from typing import Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Request
+from fastapi.responses import JSONResponse, Response
+import asyncio, json
+from core.metrics import REGISTRY, CONTENT_TYPE
 
 router = APIRouter()
 
 
+async def _started(state) -> bool:
+    """
+    Wait for the services created in the background at startup (see lifespan in api/__main__.py).
+    Returns False if startup failed (the error is logged there).
+    """
+    startup = getattr(state, "startup", None)
+    if startup is None:
+        return True
+    try:
+        await asyncio.shield(startup)
+        return True
+    except Exception:
+        return False
+
+
 # # Route for raising a new issue
 # @router.post("/raise-issue")
 # def raise_issue(issue: Issue):
@@ -21,11 +40,20 @@ Calling the route will:
 async def create_issue(websocket: WebSocket):
     await websocket.accept()
     app_data = websocket.app.state
+    if not await _started(app_data):
+        await websocket.send_json({"type": "issue.error", "payload": {"message": "Backend failed to start"}})
+        await websocket.close(code=1011)
+        return
+
+    # a technician is here: make sure the models are loaded (no-op if they already are)
+    if getattr(app_data, "residency", None) is not None:
+        app_data.residency.on_client_connected()
 
     # check if an issue is already in progress, if so close the connection
     issue = await app_data.issue_manager.get_current()
     if issue is not None:
-        await websocket.send_json({"type": "issue.create_rejected", "reason": "active_issue_exists"})
+        # a client that lost its connection resumes with /issue/attach
+        await websocket.send_json({"type": "issue.create_rejected", "reason": "active_issue_exists", "issue_id": issue.id})
         await websocket.close(code=1008, reason="active_issue_exists")
         return
 
@@ -41,8 +69,19 @@ async def create_issue(websocket: WebSocket):
         await issue.emit("issue.created", {"issue_id": issue.id, "created_at": issue.created_at})
         issue.start()
 
-        # receive loop: forward inbound ws messages to IssueContext
-        while True:
+        await _receive(websocket, issue, app_data)
+    except Exception as e:
+        await _connection_error(websocket, issue, e)
+
+
+async def _receive(websocket: WebSocket, issue, app_data) -> None:
+    """
+    Receive loop shared by /issue/create and /issue/attach: forward inbound ws messages to the IssueContext until the
+    issue is closed; on disconnect, clear the connection (unless a newer one already replaced it).
+    """
+    from core.issue import IssueProgress # loaded by the startup task; kept out of this module's imports
+    try:
+        while issue.progress == IssueProgress.ACTIVE:
             incoming = await websocket.receive_json()
             if not isinstance(incoming, dict):
                 continue
@@ -51,16 +90,51 @@ async def create_issue(websocket: WebSocket):
             incoming.setdefault("v", 1)
             incoming.setdefault("source", "ws")
             issue.ingest(incoming)
-
     except WebSocketDisconnect:
         # client disconnected; clear connection
-        if issue is not None:
-            await app_data.issue_manager.clear_connection(issue)
+        await app_data.issue_manager.clear_connection(issue, websocket)
+
+
+async def _connection_error(websocket: WebSocket, issue, e: Exception) -> None:
+    from core.issue import IssueProgress
+    if issue is not None and issue.progress != IssueProgress.ACTIVE:
+        return # closed by the IssueManager, which also closed the socket
+    try:
+        await websocket.send_json({"type": "issue.error", "payload": {"message": str(e)}})
+    finally:
+        await websocket.close(code=1011)
+
+
+
+"""
+ROUTE: "/issue/attach"
+Reattach to the current issue after the connection dropped (flaky workshop Wi-Fi), without re-running any work.
+Query parameters: issue_id, and last_seq (the `seq` of the last event the client processed). The client gets
+issue.attached, then every event it missed in order, or an issue.snapshot of the current state when the gap is
+larger than the issue's replay buffer (or last_seq is omitted). Unknown or closed issues get issue.attach_rejected.
+"""
+@router.websocket("/issue/attach")
+async def attach_issue(websocket: WebSocket, issue_id: str, last_seq: Optional[int] = None):
+    await websocket.accept()
+    app_data = websocket.app.state
+    if not await _started(app_data):
+        await websocket.send_json({"type": "issue.error", "payload": {"message": "Backend failed to start"}})
+        await websocket.close(code=1011)
+        return
+
+    if getattr(app_data, "residency", None) is not None:
+        app_data.residency.on_client_connected()
+
+    issue = None
+    try:
+        issue, reason = await app_data.issue_manager.attach(issue_id, websocket, last_seq)
+        if issue is None:
+            await websocket.send_json({"type": "issue.attach_rejected", "issue_id": issue_id, "payload": {"reason": reason}})
+            await websocket.close(code=1008, reason=reason)
+            return
+        await _receive(websocket, issue, app_data)
     except Exception as e:
-        try:
-            await websocket.send_json({"type": "issue.error", "payload": {"message": str(e)}})
-        finally:
-            await websocket.close(code=1011)
+        await _connection_error(websocket, issue, e)
 
 
 
@@ -82,6 +156,127 @@ ROUTE: "/issue/"
 
 
 
+"""
+ROUTE: "/issues"
+The current issue (state, idle time, approximate memory by part) and the recently closed ones. Memory is as of the
+last reap; pass ?memory=fresh to measure it now.
+"""
+@router.get("/issues")
+async def issues(request: Request):
+    if not await _started(request.app.state):
+        return JSONResponse({"error": "startup_failed"}, status_code=503)
+    return request.app.state.issue_manager.status(fresh_memory=request.query_params.get("memory") == "fresh")
+
+
+
+"""
+ROUTE: "/ready"
+Readiness probe: 200 once Ollama is reachable and the models the app needs are resident, and also while idle
+(outside shop hours with no client, when models are allowed to unload; the next connection loads them).
+503 while starting, loading or when Ollama is unreachable. The body reports residency details either way.
+"""
+@router.get("/ready")
+def ready(request: Request):
+    startup = getattr(request.app.state, "startup", None)
+    if startup is not None and not startup.done():
+        return JSONResponse({"ready": False, "reason": "starting"}, status_code=503)
+    residency = getattr(request.app.state, "residency", None)
+    if residency is None:
+        return JSONResponse({"ready": False, "reason": "llm_not_initialised"}, status_code=503)
+    status = residency.status()
+    return JSONResponse(status, status_code=200 if status["state"] in ("ready", "idle") else 503)
+
+
+
+"""
+ROUTE: "/metrics"
+LLM, RAG and diagnostics-turn latency/throughput in the Prometheus text format (see core/metrics.py).
+"""
+@router.get("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+
+"""
+ROUTE: "/speech/transcribe"
+Speech-to-text with the backend's resident Whisper model (see speech/service.py).
+POST the recording as the request body (?format=wav|pcm_s16le|pcm_f32le, &sample_rate= for raw PCM, &language=).
+Returns {"text", "language", "timing"}; 400 for undecodable audio, 429 when the queue is full and 503 when
+speech-to-text is unavailable.
+"""
+@router.post("/speech/transcribe")
+async def transcribe(request: Request, format: str = "wav", sample_rate: int = 16000, language: Optional[str] = None):
+    from speech.audio import decode_audio
+    from speech.service import SpeechBusy, SpeechUnavailable
+    await _started(request.app.state)
+    speech = getattr(request.app.state, "speech", None)
+    if speech is None:
+        return JSONResponse({"error": "speech_disabled"}, status_code=503)
+    try:
+        audio = decode_audio(await request.body(), format=format, sample_rate=sample_rate)
+        return await speech.transcribe(audio, language=language)
+    except ValueError as e:
+        return JSONResponse({"error": "invalid_audio", "message": str(e)}, status_code=400)
+    except SpeechBusy as e:
+        return JSONResponse({"error": "busy", "message": str(e)}, status_code=429, headers={"Retry-After": "1"})
+    except SpeechUnavailable as e:
+        return JSONResponse({"error": "unavailable", "message": str(e)}, status_code=503)
+
+
+"""
+The same over a websocket: send {"type": "start", "format", "sample_rate", "language"} (optional), the audio as
+binary frames, then {"type": "end"}. Each "end" is answered with speech.transcript or speech.error, so one
+connection can carry several recordings.
+"""
+@router.websocket("/speech/transcribe")
+async def transcribe_ws(websocket: WebSocket):
+    from speech.audio import decode_audio
+    from speech.service import SpeechBusy, SpeechUnavailable
+    await websocket.accept()
+    await _started(websocket.app.state)
+    speech = getattr(websocket.app.state, "speech", None)
+    options = {"format": "wav", "sample_rate": 16000, "language": None}
+    chunks: list[bytes] = []
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                chunks.append(message["bytes"])
+                continue
+            try:
+                control = json.loads(message.get("text") or "{}")
+            except json.JSONDecodeError:
+                continue
+            if control.get("type") == "start":
+                options.update({k: control[k] for k in options if k in control})
+                chunks = []
+            elif control.get("type") == "end":
+                data, chunks = b"".join(chunks), []
+                if speech is None:
+                    await websocket.send_json({"type": "speech.error", "payload": {"error": "speech_disabled"}})
+                    continue
+                try:
+                    audio = decode_audio(data, format=options["format"], sample_rate=int(options["sample_rate"]))
+                    result = await speech.transcribe(audio, language=options["language"])
+                    await websocket.send_json({"type": "speech.transcript", "payload": result})
+                except (ValueError, SpeechBusy, SpeechUnavailable) as e:
+                    error = {ValueError: "invalid_audio", SpeechBusy: "busy"}.get(type(e), "unavailable")
+                    await websocket.send_json({"type": "speech.error", "payload": {"error": error, "message": str(e)}})
+    except WebSocketDisconnect:
+        pass
+
+
+@router.get("/speech/status")
+async def speech_status(request: Request):
+    await _started(request.app.state)
+    speech = getattr(request.app.state, "speech", None)
+    return {"enabled": False} if speech is None else {"enabled": True, **speech.status()}
+
+
+
 # Test route
 @router.get("/test")
 def test():
@@ -0,0 +1,113 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+import builtins, sys, threading, time
+
+try:
+    import psutil # optional: only used to include interpreter start-up in the timings
+except ImportError:
+    psutil = None
+
+
+# imported by the app lazily (see lifespan in api/__main__.py); warmed in the background once the server accepts
+HEAVY_MODULES = (
+    "numpy",
+    "ollama",
+    "core.llm",
+    "core.residency",
+    "core.issue",
+    "core.agents.turn_cache",
+    "rag.retriever",
+    "speech.service",
+)
+
+
+
+"""
+StartupProfiler
+`python -m api --profile-startup` support. install() wraps __import__ before the app's own imports run and records
+each module's first import (self and cumulative time, like python -X importtime); mark() records startup phases.
+report() prints the phases (time since the process started) and the slowest imports.
+Only this module's imports run before the hook, so it stays dependency free (psutil is optional).
+"""
+class StartupProfiler:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.process_offset = 0.0 # interpreter start-up before this module was imported
+        if psutil is not None:
+            try:
+                self.process_offset = max(0.0, time.time() - psutil.Process().create_time())
+            except psutil.Error:
+                pass
+        self.imports: Dict[str, Tuple[float, float]] = {} # module -> (self seconds, cumulative seconds)
+        self.phases: List[Tuple[str, float]] = []
+        self._original_import = None
+
+    @classmethod
+    def from_argv(cls, argv: List[str]) -> Optional["StartupProfiler"]:
+        if "--profile-startup" not in argv:
+            return None
+        profiler = cls()
+        profiler.install()
+        return profiler
+
+    def install(self) -> None:
+        original = self._original_import = builtins.__import__
+        local = threading.local() # per thread: the background warmup imports while the server runs
+        records = self.imports
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            stack = local.__dict__.setdefault("stack", []) # children's time of each import in progress
+            stack.append(0.0)
+            started = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                elapsed = time.perf_counter() - started
+                children = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                records.setdefault(name, (elapsed - children, elapsed))
+
+        builtins.__import__ = timed_import
+
+    def uninstall(self) -> None:
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def elapsed(self) -> float:
+        return self.process_offset + time.perf_counter() - self.started
+
+    def mark(self, phase: str) -> None:
+        self.phases.append((phase, self.elapsed()))
+
+    def report(self, top: int = 25) -> None:
+        lines = ["", "Startup profile (seconds since process start):"]
+        if self.process_offset:
+            lines.append(f"  {'interpreter':<32}{self.process_offset:8.3f}")
+        lines += [f"  {phase:<32}{at:8.3f}" for phase, at in self.phases]
+        lines += ["", f"Slowest imports ({len(self.imports)} modules, self / cumulative):"]
+        for name, (own, cumulative) in sorted(self.imports.items(), key=lambda kv: kv[1][1], reverse=True)[:top]:
+            lines.append(f"  {name:<40}{own:8.3f}{cumulative:8.3f}")
+        print("\n".join(lines), flush=True)
+
+
+
+"""
+FirstConnectionMarker
+ASGI middleware (profiling only) that marks the first HTTP request or websocket the server accepts.
+"""
+class FirstConnectionMarker:
+    def __init__(self, app, profiler: StartupProfiler):
+        self.app = app
+        self.profiler = profiler
+        self.seen = False
+
+    async def __call__(self, scope, receive, send):
+        if not self.seen and scope["type"] in ("http", "websocket"):
+            self.seen = True
+            self.profiler.mark("first connection")
+            print(f"Startup profile: first connection ({scope['type']} {scope.get('path')}) at {self.profiler.elapsed():.3f}s", flush=True)
+        await self.app(scope, receive, send)
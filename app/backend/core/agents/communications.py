@@ -39,9 +39,9 @@ class CommunicationsAgent:
         await self.emit("communications.talk", {"message": message})
 
 
-    async def communicate_test(self, test: Test) -> None:
+    async def communicate_test(self, test: Test, cached: bool = False, cache_similarity: Optional[float] = None) -> None:
         """
-        Communicate the test to the user.
+        Communicate the test to the user. `cached` marks a test served from the turn cache rather than generated.
         """
         COMMUNICATION_SYSTEM_PROMPT = """Convert vehicle diagnostic tests into clear user instructions.
 
@@ -71,7 +71,7 @@ class CommunicationsAgent:
         # _final_answer_chunks: List[str] = []
         # async for chunk in self.client.chat(
         #     messages=llm_messages,
-        #     think=False,  # Disable verbose reasoning
+        #     profile="communications",
         # ):
         #     if chunk["thinking"]:
         #         # stream thinking to UI
@@ -85,12 +85,22 @@ class CommunicationsAgent:
         
         full_test_payload = {
             "test_id": test["id"],
-            "test_rationale": test["rationale"],
-        } | test
+            "test_rationale": test.get("rationale"),
+        } | test | {"cached": cached}
+        if cached:
+            full_test_payload["cache_similarity"] = cache_similarity
         await self.emit("diagnostics.test", full_test_payload)
         return None
 
 
+    async def communicate_partial(self, type: str, payload: Dict[str, Any]) -> None:
+        """
+        Forward a partial result while the diagnostics agent is still generating (e.g. the next test's text
+        and instruction steps). Partial events are provisional; the following diagnostics.test is authoritative.
+        """
+        await self.emit(type, payload)
+
+
 
     def construct_outbound_message(self, type: str, payload: Dict[str, Any], issue_id: str) -> InboundMessage:
         """
@@ -0,0 +1,148 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import asyncio
+from core.llm import LLMClient, LLMPriority
+from core.agents.utilities import _jd
+from core.agents.probability import ProbabilityEngine
+
+
+def _ratio_label(ratio: float) -> Optional[str]:
+    # likelihood relative to the mean over hypotheses -> evidence label (None when neutral)
+    if ratio >= 2.0:
+        return "++"
+    if ratio >= 1.15:
+        return "+"
+    if ratio <= 0.5:
+        return "--"
+    if ratio <= 0.87:
+        return "-"
+    return None
+
+
+def evidence_direction(engine: ProbabilityEngine, test_id: Optional[str]) -> Dict[str, str]:
+    """
+    How the result of `test_id` moved each hypothesis, as evidence labels, read back from the engine history.
+    Likelihood updates are converted to labels by comparing each likelihood with the mean. Neutral entries are omitted.
+    """
+    directions: Dict[str, str] = {}
+    if not test_id:
+        return directions
+    for update in engine.history:
+        if update.get("source") != test_id:
+            continue
+        if update["kind"] == "evidence":
+            directions.update({hid: label for hid, label in update["evidence"].items() if label != "0"})
+        elif update["kind"] == "likelihood" and update["likelihoods"]:
+            likelihoods = update["likelihoods"]
+            mean = sum(likelihoods.values()) / len(likelihoods)
+            if mean <= 0:
+                continue
+            for hid, value in likelihoods.items():
+                label = _ratio_label(value / mean)
+                if label:
+                    directions[hid] = label
+    return directions
+
+
+def compact_test(test: Dict[str, Any], engine: ProbabilityEngine) -> List[Any]:
+    """[name, result, evidence direction] for a finished test."""
+    name = test.get("test_text") or test.get("name") or test.get("description") or test.get("id")
+    return [name, test.get("result"), evidence_direction(engine, test.get("id"))]
+
+
+
+"""
+TestsLogCompactor
+Bounds the tests log that goes into each diagnostics prompt:
+- the last `keep_verbatim` finished tests are passed through unchanged,
+- older tests are collapsed into [name, result, evidence] tuples,
+- once `fold_every` tuples have built up they are folded, in the background, into a running LLM summary
+  that is reused by every following turn.
+If folding keeps failing, at most `max_compact` tuples are kept and the oldest are dropped from the prompt.
+"""
+class TestsLogCompactor:
+    SYSTEM_PROMPT = """
+You maintain the running summary of a vehicle diagnostics session.
+You are given the previous summary, the current hypotheses as [id, diagnosis, probability] and further tests as [test, result, evidence],
+where evidence maps hypothesis ids to "++", "+", "-" or "--".
+Write an updated summary in at most 120 words: what has been checked, what was found, which hypotheses were supported or ruled out.
+Refer to hypotheses by id and diagnosis. Output only the summary text.
+"""
+
+    def __init__(self, llm_client: LLMClient, keep_verbatim: int = 4, fold_every: int = 6, max_compact: int = 12):
+        self.client = llm_client
+        self.keep_verbatim = keep_verbatim
+        self.fold_every = fold_every
+        self.max_compact = max_compact
+        self.summary: str = ""
+        self.folded: int = 0 # number of tests (from the start of the log) covered by the summary
+        self._fold_task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {"folds": 0, "fold_failures": 0}
+
+    def view(self, prior_tests: List[Dict[str, Any]], engine: ProbabilityEngine) -> Dict[str, Any]:
+        """
+        Compacted form of the finished tests (the log without the most recent test):
+        {"summary", "earlier_tests" (tuples), "omitted" (tests dropped entirely), "recent_tests" (verbatim)}.
+        """
+        folded = min(self.folded, len(prior_tests))
+        split = max(folded, len(prior_tests) - self.keep_verbatim)
+        earlier = [compact_test(t, engine) for t in prior_tests[folded:split]]
+        omitted = max(0, len(earlier) - self.max_compact)
+        return {
+            "summary": self.summary,
+            "earlier_tests": earlier[omitted:],
+            "omitted": omitted,
+            "recent_tests": prior_tests[split:],
+        }
+
+    def maybe_fold(self, prior_tests: List[Dict[str, Any]], engine: ProbabilityEngine) -> None:
+        """Start a background fold when enough compacted tests have accumulated and none is running."""
+        if self._fold_task is not None and not self._fold_task.done():
+            return
+        split = len(prior_tests) - self.keep_verbatim
+        if split - self.folded < self.fold_every:
+            return
+        tuples = [compact_test(t, engine) for t in prior_tests[self.folded:split]]
+        self._fold_task = asyncio.create_task(self._fold(tuples, split, engine.prompt_view()), name="tests-log-fold")
+
+    async def _fold(self, tuples: List[List[Any]], upto: int, hypotheses: List[List[Any]]) -> None:
+        user_prompt = (
+            "Previous summary: {summary}\n"
+            "Current hypotheses: {hypotheses}\n"
+            "Further tests: {tests}\n"
+        ).format(summary=self.summary or "(none)", hypotheses=_jd(hypotheses), tests=_jd(tuples))
+        messages = [
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ]
+
+        async def generate() -> str:
+            chunks: List[str] = []
+            async for chunk in self.client.chat(messages=messages, profile="summary", priority=LLMPriority.PREFETCH, agent="compactor"):
+                if chunk["content"]:
+                    chunks.append(chunk["content"])
+            return "".join(chunks).strip()
+
+        # in its own task: preemption cancels the task holding the scheduler slot, cancel() cancels this one
+        task = asyncio.create_task(generate(), name="tests-log-fold-generate")
+        try:
+            summary = await task
+            if not summary:
+                raise ValueError("empty summary")
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                task.cancel()
+                raise
+            return # preempted; the tuples stay in the prompt and the next turn retries
+        except Exception as e:
+            self.stats["fold_failures"] += 1
+            print(f"Tests log fold failed: {e}", flush=True)
+            return
+        self.summary = summary
+        self.folded = upto
+        self.stats["folds"] += 1
+
+    def cancel(self) -> None:
+        if self._fold_task is not None and not self._fold_task.done():
+            self._fold_task.cancel()
+        self._fold_task = None
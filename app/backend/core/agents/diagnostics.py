@@ -1,14 +1,21 @@
 import typing, json
 import re
 import uuid
+from collections import Counter
 from typing import Any, Dict, List, Protocol, TypedDict, Optional, Tuple, Awaitable, Callable
-from core.llm import LLMClient
-from core.agents.utilities import _jd, parse_llm_json, normalise_probabilities
+from core.llm import LLMClient, LLMPriority
+from core.agents.utilities import _jd, parse_llm_json, typeddict_schema, PARSE_STATS
+from core.agents.streaming import IncrementalJSONParser
+from core.agents.compaction import TestsLogCompactor
+from core.agents.turn_cache import TurnCache
+from core.agents.probability import ProbabilityEngine
+from core.agents.selection import TestQueue, match_outcome, outcome_likelihoods
 
 
 
 # ----- TYPES -----
 class DiagnosisProbability(TypedDict):
+    id: str #stable hypothesis id assigned by the ProbabilityEngine
     diagnosis: str
     probability: float
 
@@ -22,20 +29,50 @@ class Test(TypedDict):
     result: Any
 
 
+class TestInstruction(TypedDict):
+    step_number: str
+    step_text: str
+
+
+class TestCandidate(TypedDict, total=False):
+    id: str
+    test_text: str #initial message to the user
+    test_instructions: List[TestInstruction]
+    test_result_field_label: str
+    test_result_field_type: str #text|number|boolean|array
+    test_result_field_options: List[str]
+    safety_and_warnings: List[str]
+    effort: int #1 (trivial) to 5 (workshop job)
+    likelihoods: Dict[str, List[float]] #hypothesis id -> P(outcome | hypothesis), aligned with the outcomes
+    result: Any
+
+
+class NewHypothesis(TypedDict):
+    diagnosis: str
+    prior: float
+
+
+class DiagnosticsTurn(TypedDict):
+    """Shape of one diagnostics LLM response (also used as its structured-output schema)."""
+    evidence: Dict[str, str] #hypothesis id -> evidence label
+    new_hypotheses: List[NewHypothesis]
+    candidate_tests: List[TestCandidate]
+
+
 
 # ----- AGENT BASE CLASS -----
 """
 DiagnosticsAgent Base Class
 The role of the diagnostics agent is to come up with tests to run and then update the probabilities.
-Inputs: diagnosis_probabilities, tests_log
+Inputs: probability engine (updated in place), tests_log
 Ouputs: diagnosis_probabilities_updated, next_test
 """
 class DiagnosticsAgent:
     async def run(
         self, 
-        diagnosis_probabilities: List[DiagnosisProbability | None], 
+        engine: ProbabilityEngine, 
         tests_log: List[Test]
-    ) -> Tuple[List[DiagnosisProbability], str]:
+    ) -> Tuple[List[DiagnosisProbability], Test]:
         pass
 
 
@@ -46,73 +83,158 @@ LLM Diagnostics Agent
 """
 class LLMDiagnosticsAgent(DiagnosticsAgent):
     SYSTEM_PROMPT = """
-You are a vehicle diagnostics agent. Analyze test results and update diagnosis probabilities.
-Then provide the next test and details of this test. 
+You are a vehicle diagnostics agent. Judge how the most recent test result bears on each current hypothesis.
+Then propose a slate of candidate next tests. 
 
 Output ONLY this JSON:
 {
-  "updated_probabilities": [
-    { "diagnosis": "description", "probability": 0.5 }
+  "evidence": { "h1": "++", "h2": "-" },
+  "new_hypotheses": [
+    { "diagnosis": "description", "prior": 0.2 }
   ],
-  "next_test": {
-    "test_text": "initial message to user",
-    "test_instructions": [ { "step_number": "1", "step_text": "instruction" } ],
-    "test_result_field_label": "field label",
-    "test_result_field_type": "text|number|boolean|array",
-    "test_result_field_options": [ "option1", "option2" ],
-    "safety_and_warnings": [ "warning1", "warning2" ]
-  }
+  "candidate_tests": [
+    {
+      "test_text": "initial message to user",
+      "test_instructions": [ { "step_number": "1", "step_text": "instruction" } ],
+      "test_result_field_label": "field label",
+      "test_result_field_type": "boolean|array|text|number",
+      "test_result_field_options": [ "option1", "option2" ],
+      "safety_and_warnings": [ "warning1", "warning2" ],
+      "effort": 1,
+      "likelihoods": { "h1": [0.9, 0.1], "h2": [0.2, 0.8] }
+    }
+  ]
 }
 
-Rules for probabilities:
-- If there are no current diagnoses, you need to come up with some. 
-- Update probabilities: strong support ×2.0, some support ×1.2, neutral ×1.0, some contradiction ×0.8, strong contradiction ×0.5
-- Don't normalize probabilities.
-- If there is a potential diagnosis that is missing from the list, add it.
-Rules for the next test:
-- A test should be a single test that can be under
-- Choose next test that reveals most info with least effort.
-- Outcome Data should store the options if the outcome is an array
+Rules for evidence:
+- Hypotheses are given as [id, diagnosis, probability]. Refer to them only by id.
+- Label each hypothesis the result bears on: "++" strong support, "+" some support, "-" some contradiction, "--" strong contradiction. Omit neutral ones.
+- Never output probabilities for existing hypotheses; they are computed for you.
+- If there are no current hypotheses, or a potential diagnosis is missing, add it to new_hypotheses with a prior between 0 and 1.
+- Ids for new hypotheses continue the sequence (the next unused h number), in the order you list them.
+Rules for candidate tests:
+- Propose up to {max_candidates} distinct tests, each a single test the user can carry out. List the one you would run next first.
+- Prefer boolean or array result fields so outcomes can be enumerated.
+- effort: 1 (a glance) to 5 (a workshop job).
+- likelihoods: for each hypothesis id, the probability of each outcome if that hypothesis is true, in outcome order ([yes, no] for boolean, option order for array).
 General rules:
+- The session is one conversation: each new message gives the latest results and the current hypotheses; earlier messages are context.
 - Output only JSON, no extra text
 """
-
-    def __init__(self, llm_client: LLMClient):
+    OUTPUT_SCHEMA = typeddict_schema(DiagnosticsTurn)
+
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        max_candidates: int = 4,
+        min_local_score: float = 0.1,
+        compactor: Optional[TestsLogCompactor] = None,
+        max_history_turns: int = 8,
+        turn_cache: Optional[TurnCache] = None,
+    ):
         self.client = llm_client
+        self.max_candidates = max_candidates
+        self.min_local_score = min_local_score # minimum information gain per effort to issue a queued test without the LLM
+        self.test_queue = TestQueue() # remaining candidate tests for this issue
+        self.compactor = compactor or TestsLogCompactor(llm_client) # keeps the prior tests log in the prompt bounded
+        self.max_history_turns = max_history_turns # LLM turns appended before the history is rebuilt from the compactor
+        self.turn_cache = turn_cache # optional semantic cache of turns shared across issues
+        self.speculative = False # forks hold their turn back from the turn cache until they are adopted
+        self._pending_store: Optional[Tuple[Any, ...]] = None # LLM turn not yet stored in the turn cache
+        self.last_turn: Dict[str, Any] = {"source": None} # how the last turn was produced: queue | cache | llm (+ its LLM timings)
+
+        # Append-only conversation (system prompt, context, then a user delta + compact assistant answer per LLM turn).
+        # Earlier messages are never edited, so the server can reuse its KV cache for everything but the new delta.
+        self.messages: List[Dict[str, str]] = []
+        self._logged_tests = 0 # tests_log entries already present in self.messages
+        self._history_turns = 0
+        self._history_folded = 0 # compactor.folded when the history was last rebuilt
+        self.last_metrics: Optional[Dict[str, Any]] = None
+
+    def fork(self) -> "LLMDiagnosticsAgent":
+        """Copy of this agent with an independent test queue and history (used for speculative turns). The compactor is shared."""
+        clone = LLMDiagnosticsAgent(
+            self.client, self.max_candidates, self.min_local_score, self.compactor, self.max_history_turns, self.turn_cache,
+        )
+        clone.adopt(self)
+        clone.test_queue = self.test_queue.copy()
+        clone.speculative = True
+        clone._pending_store = None
+        return clone
+
+    def adopt(self, other: "LLMDiagnosticsAgent") -> None:
+        """Take over the test queue and conversation state of another agent (e.g. an adopted speculative branch)."""
+        self.test_queue = other.test_queue
+        self.messages = list(other.messages)
+        self._logged_tests = other._logged_tests
+        self._history_turns = other._history_turns
+        self._history_folded = other._history_folded
+        self.last_turn = other.last_turn
+        self._pending_store = other._pending_store
+
+    async def commit_turn(self) -> None:
+        """Store the last LLM turn in the turn cache; a speculative branch's turn only once it has been adopted."""
+        pending, self._pending_store = self._pending_store, None
+        if pending is not None and self.turn_cache is not None:
+            await self.turn_cache.store(*pending)
 
     async def run(
         self, 
-        diagnosis_probabilities: List[DiagnosisProbability | None], 
+        engine: ProbabilityEngine, 
         tests_log: List[Test],
         on_thinking: Optional[Callable[[str], Awaitable[None]]] = None,
+        priority: LLMPriority = LLMPriority.FOREGROUND,
+        on_partial: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None,
     ) -> Tuple[List[DiagnosisProbability], Test]:
 
-        user_prompt = (
-            "Most recent test result: {test_result}\n"
-            "Current hypothesis probabilities: {diagnosis_probabilities}\n"
-            "Prior log of all previous tests: {tests_log}\n"
-        )
-
         # Separate most recent test from prior log
         most_recent_test = tests_log[-1] if tests_log else {}
         prior_tests_log = tests_log[:-1] if tests_log else []
 
-        user_prompt = user_prompt.format(
-            test_result=_jd(most_recent_test),
-            diagnosis_probabilities=_jd(diagnosis_probabilities),
-            tests_log=_jd(prior_tests_log)
-        )
-
-        llm_messages = [
-            {"role": "system", "content": self.SYSTEM_PROMPT},
-            {"role": "user", "content": user_prompt}
-        ]
-
-        # Stream response, buffer final answer
+        # If the result matches an enumerable outcome, update the hypotheses locally from the test's likelihoods
+        applied_locally = self._apply_result_locally(engine, most_recent_test)
+        if applied_locally:
+            next_test = self.test_queue.pop_best(engine, min_score=self.min_local_score)
+            if next_test is not None:
+                self.last_turn = {"source": "queue"}
+                return engine.as_list(), self._prepare(next_test)
+
+        # Otherwise reuse the turn of a sufficiently similar state from an earlier session, if there is one
+        probe = None
+        if self.turn_cache is not None and not applied_locally:
+            probe = await self.turn_cache.lookup(engine, tests_log)
+            if probe is not None and probe["turn"] is not None and probe["turn"]["candidate_tests"]:
+                turn = probe["turn"]
+                self._apply_turn(engine, turn["evidence"], turn["new_hypotheses"], most_recent_test, applied_locally)
+                self.turn_cache.likelihoods_for_engine(turn["candidate_tests"], engine)
+                self.last_turn = {"source": "cache", "similarity": probe["similarity"]}
+                return engine.as_list(), self._issue_from_slate(engine, turn["candidate_tests"])
+        engine_before = engine.copy() if probe is not None else None
+
+        if self._needs_rebuild(tests_log):
+            self._rebuild_history(engine, prior_tests_log)
+
+        # only what happened since the previous LLM turn is appended
+        user_prompt = ""
+        resolved_locally = [self._strip_test(t) for t in tests_log[self._logged_tests:-1]]
+        if resolved_locally:
+            user_prompt += "Results already applied to the hypotheses: {tests}\n".format(tests=_jd(resolved_locally))
+        user_prompt += "Most recent test result: {test_result}\n".format(test_result=_jd(self._strip_test(most_recent_test)))
+        user_prompt += "Current hypotheses: {hypotheses}\n".format(hypotheses=_jd(engine.prompt_view()))
+        if applied_locally:
+            user_prompt += "The most recent result has already been applied to the hypotheses; return empty evidence.\n"
+
+        llm_messages = self.messages + [{"role": "user", "content": user_prompt}]
+
+        # Stream response; parse the content incrementally so partial results can be forwarded early
         _final_answer_chunks: List[str] = []
+        parser = IncrementalJSONParser()
+        hypotheses_applied = False
         async for chunk in self.client.chat(
             messages=llm_messages,
-            think=False,  # Disable verbose reasoning
+            profile="diagnostics",  # reasoning off, bounded output
+            format=self.OUTPUT_SCHEMA,
+            priority=priority,
         ):
             if chunk["thinking"]:
                 if on_thinking is not None:
@@ -121,32 +243,189 @@ General rules:
                     except Exception:
                         pass
                 print(chunk["thinking"], end="", flush=True)   # reasoning stream only
-            if chunk["content"]:
-                _final_answer_chunks.append(chunk["content"])
+            if chunk.get("metrics"):
+                self.last_metrics = chunk["metrics"]
+            if not chunk["content"]:
+                continue
+            _final_answer_chunks.append(chunk["content"])
+
+            for kind, path, value in parser.feed(chunk["content"]):
+                # new_hypotheses follows evidence in the schema, so the hypothesis update is final once it closes
+                if kind == "value" and path == ("new_hypotheses",) and not hypotheses_applied:
+                    partial = parser.value if isinstance(parser.value, dict) else {}
+                    self._apply_turn(engine, partial.get("evidence"), value, most_recent_test, applied_locally)
+                    hypotheses_applied = True
+                    await self._emit_partial(on_partial, "diagnostics.probabilities", {
+                        "probabilities": engine.as_list(),
+                        "entropy": engine.entropy(),
+                        "provisional": True,
+                    })
+                elif on_partial is not None:
+                    partial_event = self._test_partial(kind, path, value)
+                    if partial_event is not None:
+                        await self._emit_partial(on_partial, "diagnostics.test_partial", partial_event)
 
         # Join buffered content and store for later use
         self.last_raw_output = "".join(_final_answer_chunks)
-        result = parse_llm_json(self.last_raw_output)
+        if parser.done and isinstance(parser.value, dict):
+            result = parser.value
+            PARSE_STATS.setdefault("diagnostics", Counter())["incremental"] += 1
+        else:
+            result = parse_llm_json(self.last_raw_output, source="diagnostics")
+        candidates = result.get("candidate_tests") or ([result["next_test"]] if result.get("next_test") else [])
+        candidates = [c for c in candidates if isinstance(c, dict)]
+        if not candidates:
+            raise ValueError("Diagnostics agent returned no candidate tests")
+
+        if not hypotheses_applied:
+            self._apply_turn(engine, result.get("evidence"), result.get("new_hypotheses"), most_recent_test, applied_locally)
+        next_test = self._issue_from_slate(engine, candidates)
+
+        # the turn succeeded: extend the history with the delta sent and a compact record of the answer
+        self.messages = llm_messages + [{"role": "assistant", "content": self._compact_answer(result, next_test)}]
+        self._logged_tests = len(tests_log)
+        self._history_turns += 1
+        self.last_turn = {"source": "llm", "metrics": self.last_metrics}
+        if probe is not None:
+            self._pending_store = (probe, {**result, "candidate_tests": candidates}, engine_before, engine.copy())
+            if not self.speculative:
+                await self.commit_turn()
+
+        return engine.as_list(), next_test
+
+
+    def _issue_from_slate(self, engine: ProbabilityEngine, candidates: List[Dict[str, Any]]) -> Test:
+        """The fresh slate replaces the queue; issue the best candidate and keep the rest."""
+        for candidate in candidates:
+            if not candidate.get("id"):
+                candidate["id"] = str(uuid.uuid4())
+        self.test_queue.replace(candidates)
+        next_test = self.test_queue.pop_best(engine) or candidates[0]
+        self.test_queue.discard(next_test["id"])
+        return self._prepare(next_test)
+
+
+    @staticmethod
+    def _compact_answer(result: Dict[str, Any], next_test: Dict[str, Any]) -> str:
+        """
+        What the history keeps of an answer: the evidence, the new diagnoses and the test that was issued.
+        The full slate (instructions, likelihood tables, the other candidates) would make every later prompt grow
+        by a whole answer per turn; the queued candidates live in the test queue instead.
+        """
+        new_hypotheses = [
+            h.get("diagnosis") if isinstance(h, dict) else h for h in result.get("new_hypotheses") or [] if isinstance(h, (str, dict))
+        ]
+        return _jd({
+            "evidence": result.get("evidence") if isinstance(result.get("evidence"), dict) else {},
+            "new_hypotheses": [h for h in new_hypotheses if h],
+            "next_test": next_test.get("test_text") or next_test.get("id"),
+        })
+
+
+    def _needs_rebuild(self, tests_log: List[Test]) -> bool:
+        return (
+            not self.messages
+            or self._logged_tests >= len(tests_log)
+            or self._history_turns >= self.max_history_turns
+            or self._history_folded != self.compactor.folded # a new summary is available
+        )
 
-        diagnosis_probabilities_updated = result["updated_probabilities"]
-        next_test = result["next_test"]
+    def _rebuild_history(self, engine: ProbabilityEngine, prior_tests_log: List[Test]) -> None:
+        """
+        Start a fresh history: the system prompt plus the compacted prior log as context.
+        This is the only point where the prompt prefix changes, so it happens once per fold or max_history_turns.
+        """
+        self.messages = [{"role": "system", "content": self.SYSTEM_PROMPT.replace("{max_candidates}", str(self.max_candidates))}]
+        prior_log = self.compactor.view([self._strip_test(t) for t in prior_tests_log], engine)
+        context = ""
+        if prior_log["summary"]:
+            context += "Summary of earlier tests: {summary}\n".format(summary=prior_log["summary"])
+        if prior_log["earlier_tests"] or prior_log["omitted"]:
+            context += "Earlier tests as [test, result, evidence]{omitted}: {tuples}\n".format(
+                omitted=f" ({prior_log['omitted']} older tests omitted)" if prior_log["omitted"] else "",
+                tuples=_jd(prior_log["earlier_tests"]),
+            )
+        if prior_log["recent_tests"]:
+            context += "Previous tests: {tests_log}\n".format(tests_log=_jd(prior_log["recent_tests"]))
+        if context:
+            self.messages.append({"role": "user", "content": context})
+        self._logged_tests = len(prior_tests_log)
+        self._history_turns = 0
+        self._history_folded = self.compactor.folded
+
+
+    @staticmethod
+    def _apply_turn(
+        engine: ProbabilityEngine,
+        evidence: Optional[Dict[str, str]],
+        new_hypotheses: Optional[List[Any]],
+        most_recent_test: Dict[str, Any],
+        applied_locally: bool,
+    ) -> None:
+        """Apply the evidence labels (unless the result was already applied locally), then add new hypotheses."""
+        if not applied_locally and isinstance(evidence, dict):
+            engine.apply_evidence(evidence, source=most_recent_test.get("id"))
+        new_hypotheses = [h for h in new_hypotheses or [] if isinstance(h, (str, dict))]
+        if len(engine) == 0:
+            # first turn: the priors are relative weights for the initial hypothesis set
+            engine.seed(new_hypotheses)
+            new_hypotheses = []
+        for hypothesis in new_hypotheses:
+            if isinstance(hypothesis, str):
+                engine.add_hypothesis(hypothesis)
+            elif isinstance(hypothesis, dict) and hypothesis.get("diagnosis"):
+                engine.add_hypothesis(hypothesis["diagnosis"], hypothesis.get("prior"))
+
+    @staticmethod
+    def _test_partial(kind: str, path: Tuple[Any, ...], value: Any) -> Optional[Dict[str, Any]]:
+        """
+        Map a parser event on the first candidate test to a provisional preview payload. The final choice
+        between candidates is only made once the whole slate is in, so the preview can be superseded.
+        """
+        if len(path) < 2 or path[:2] != ("candidate_tests", 0):
+            return None
+        if kind == "string" and path[2:] == ("test_text",):
+            return {"field": "test_text", "delta": value, "provisional": True}
+        if kind == "value" and len(path) == 4 and path[2] == "test_instructions" and isinstance(value, dict):
+            return {"field": "test_instructions", "index": path[3], "step": value, "provisional": True}
+        if kind == "value" and path[2:] == ("safety_and_warnings",) and isinstance(value, list):
+            return {"field": "safety_and_warnings", "value": value, "provisional": True}
+        return None
+
+    @staticmethod
+    async def _emit_partial(on_partial: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]], event_type: str, payload: Dict[str, Any]) -> None:
+        if on_partial is None:
+            return
+        try:
+            await on_partial(event_type, payload)
+        except Exception:
+            pass
+
+    def _apply_result_locally(self, engine: ProbabilityEngine, test: Dict[str, Any]) -> bool:
+        """
+        Bayesian update from the test's own likelihood estimates. Returns False when the test has no
+        likelihoods or the result does not match one of its enumerable outcomes.
+        """
+        if not test.get("likelihoods") or len(engine) == 0:
+            return False
+        outcome_index = match_outcome(test, test.get("result"))
+        if outcome_index is None:
+            return False
+        engine.apply_likelihoods(outcome_likelihoods(engine, test, outcome_index), source=test.get("id"))
+        return True
+
+    @staticmethod
+    def _prepare(test: Dict[str, Any]) -> Test:
+        next_test = dict(test)
         next_test["result"] = None #ensure the result is None until the user runs the test
         # Ensure the test has a unique identifier for UI round-trips
         if "id" not in next_test or not next_test["id"]:
             next_test["id"] = str(uuid.uuid4())
+        return next_test
 
-        # normalise probabilities
-        diagnosis_probabilities_updated = normalise_probabilities(diagnosis_probabilities_updated)
-
-        return diagnosis_probabilities_updated, next_test
-
-        
-
-
-
-
-
-
-
-
+    # likelihood tables are bookkeeping for the local scorer; instructions, warnings and effort were for the technician
+    _UNPROMPTED_FIELDS = ("likelihoods", "test_instructions", "safety_and_warnings", "effort")
 
+    @classmethod
+    def _strip_test(cls, test: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in test.items() if k not in cls._UNPROMPTED_FIELDS}
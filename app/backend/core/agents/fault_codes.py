@@ -0,0 +1,216 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, TypedDict
+from functools import lru_cache
+from pathlib import Path
+import json, re, uuid
+
+
+VEHICLE = "daf-lf45-lf55"
+FAULT_CODES_PATH = Path(__file__).resolve().parents[4] / "data" / VEHICLE / "fault_codes.json"
+
+# "1-10", "12 - 34": one to three digits either side; not part of a longer number, date or range, and not a range
+# of measurements ("1-2 mm", "10-15 bar", "5 - 10 V")
+_UNITS = r"mm|cm|km|m|µm|bar|psi|kpa|mv|v|ma|a|ohms?|Ω|k?nm|kg|g|rpm|ms|s|sec|seconds?|min|minutes?|h|hrs?|hours?|l|°c?|%"
+FAULT_CODE_PATTERN = re.compile(
+    rf"(?<![\d.\-/])(\d{{1,3}})\s?-\s?(\d{{1,3}})(?![\d.\-/])(?!\s?(?:{_UNITS})(?![^\W\d_]))", re.I
+)
+
+# pdf extraction left page furniture and the table header in some fields
+_JUNK = re.compile(r"https?://|Fault code Fault code|DAVIE XD|©")
+_MAX_CAUSES = 4 # per fault: the first test offers these (plus "none of these") as its options
+_MAX_SEED_PRIOR = 0.5 # below the maintenance prefetch threshold (0.6): one confirming test must not settle a diagnosis
+# what a fault does rather than what causes it ("- wrong assessment by ECU", "- ABS deactivated")
+_EFFECT = re.compile(r"deactivated|not working|no reading|limitation|wrong assessment|not available|not possible|cannot|shuts down", re.I)
+
+
+
+# ----- TYPES -----
+class FaultCode(TypedDict):
+    code: str
+    system: str # "fault-type" in fault_codes.json (ABS/ASR, EBS, UPEC, AS Tronic, ...)
+    name: str
+    description: str
+    symptoms: str
+    causes: List[str]
+
+
+
+# ----- PARSING -----
+def _clean(text: Optional[str]) -> str:
+    text = re.sub(r"\s+", " ", text or "").strip()
+    junk = _JUNK.search(text)
+    return text[: junk.start()].strip() if junk else text
+
+
+def _clauses(text: str) -> List[str]:
+    clauses = (c.strip(" .,:;-") for c in re.split(r";\s|\s?-\s", text))
+    return [c for c in clauses if len(c) >= 3 and not _EFFECT.search(c)]
+
+
+def fault_causes(entry: Dict[str, Any]) -> List[str]:
+    """
+    Possible causes of a fault_codes.json entry. The extracted table mixes the cause column into the description
+    ("... due to: <cause>- <effect>") and the symptoms ("<cause>; <cause>- <cause>- <effect>"): the dashed list ends
+    at the first capitalised clause, and effect clauses within it are dropped.
+    """
+    if entry.get("possible_causes"):
+        return _clauses(_clean(entry["possible_causes"]))[:_MAX_CAUSES]
+    description, symptoms = _clean(entry.get("fault_description")), _clean(entry.get("symptoms"))
+    causes: List[str] = []
+    due_to = "due to:" in description
+    if due_to:
+        causes += _clauses(re.split(r"-\s*(?=[A-Z])", description.split("due to:", 1)[1], maxsplit=1)[0])
+    if symptoms and (due_to or re.search(r"-\s*[A-Z]", symptoms)):
+        causes += _clauses(re.split(r"-\s*(?=[A-Z])", symptoms, maxsplit=1)[0])
+    return list(dict.fromkeys(causes))[:_MAX_CAUSES]
+
+
+def _fault(entry: Dict[str, Any]) -> FaultCode:
+    return {
+        "code": entry["fault code"],
+        "system": entry.get("fault-type") or "",
+        "name": _clean(entry.get("fault_name")),
+        "description": _clean(entry.get("fault_description")),
+        "symptoms": _clean(entry.get("symptoms")),
+        "causes": fault_causes(entry),
+    }
+
+
+
+"""
+FaultCodeIndex
+Dashboard fault codes of the vehicle, by code. A code can exist in several systems' tables (e.g. "3-1" in ABS/ASR,
+EBS and AS Tronic), so lookups return every candidate; a system named in the technician's text narrows them down.
+"""
+class FaultCodeIndex:
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self._by_code: Dict[str, List[FaultCode]] = {}
+        for entry in entries:
+            if entry.get("fault code"):
+                self._by_code.setdefault(entry["fault code"], []).append(_fault(entry))
+        self.systems = sorted({f["system"] for faults in self._by_code.values() for f in faults if f["system"]})
+        # how technicians name a system: the table's name or a part of it ("ABS" for ABS/ASR, "Tronic" for AS Tronic)
+        self._aliases = {
+            s: {s} | {part for part in re.split(r"[/()\s\-]+", s) if len(part) >= 3 and not part.isdigit()} for s in self.systems
+        }
+
+    def __len__(self) -> int:
+        return len(self._by_code)
+
+    def faults(self) -> List[FaultCode]:
+        return [fault for faults in self._by_code.values() for fault in faults]
+
+    def lookup(self, code: str) -> List[FaultCode]:
+        return list(self._by_code.get(code, []))
+
+    def match(self, text: str) -> List[FaultCode]:
+        """Known fault codes mentioned in `text` (in order), narrowed to the systems the text names, if any."""
+        faults: List[FaultCode] = []
+        for a, b in FAULT_CODE_PATTERN.findall(text or ""):
+            for fault in self.lookup(f"{int(a)}-{int(b)}"):
+                if fault not in faults:
+                    faults.append(fault)
+        named = {
+            s for s, aliases in self._aliases.items()
+            if any(re.search(rf"(?<!\w){re.escape(a)}(?!\w)", text or "", re.I) for a in aliases)
+        }
+        narrowed = [f for f in faults if f["system"] in named]
+        return narrowed or faults
+
+
+@lru_cache(maxsize=4)
+def load_fault_code_index(path: Path = FAULT_CODES_PATH) -> FaultCodeIndex:
+    with open(path, "r", encoding="utf-8") as f:
+        return FaultCodeIndex(json.load(f))
+
+
+
+# ----- SEEDING -----
+def fault_label(fault: FaultCode) -> str:
+    return f"{fault['system']} {fault['code']}"
+
+
+def seed_hypotheses(faults: List[FaultCode], other_prior: float = 0.2, max_prior: float = _MAX_SEED_PRIOR) -> List[Dict[str, Any]]:
+    """
+    Initial hypotheses for the matched faults as ProbabilityEngine.seed() input: each fault gets an equal share,
+    split across its causes (or one hypothesis for the fault itself when the table lists none), plus a last
+    hypothesis for a cause the table does not list. That one gets at least `other_prior` and whatever the
+    `max_prior` cap takes from the others, so a single match never starts out certain or prefetches a repair plan.
+    """
+    hypotheses: List[Dict[str, Any]] = []
+    for fault in faults:
+        causes = fault["causes"] or [None]
+        for cause in causes:
+            diagnosis = f"{cause} ({fault_label(fault)}: {fault['name']})" if cause else f"{fault['name']} ({fault_label(fault)})"
+            hypotheses.append({"diagnosis": diagnosis, "prior": min((1.0 - other_prior) / len(faults) / len(causes), max_prior)})
+    codes = ", ".join(dict.fromkeys(f["code"] for f in faults))
+    other_prior = max(other_prior, 1.0 - sum(h["prior"] for h in hypotheses))
+    hypotheses.append({"diagnosis": f"Cause of fault code {codes} not listed in the fault table (wiring, connectors or ECU)", "prior": other_prior})
+    return hypotheses
+
+
+def first_test(faults: List[FaultCode], hypothesis_ids: List[str]) -> Dict[str, Any]:
+    """
+    A first test derived from the fault table, with likelihoods for the local Bayesian update; `hypothesis_ids` are
+    the engine ids of seed_hypotheses(faults), in order. The same code in several systems: which system reports it.
+    One system with listed causes: which of them is present. Otherwise: whether the code comes back once cleared.
+    """
+    ids = iter(hypothesis_ids)
+    owners = [(fault, [next(ids) for _ in (fault["causes"] or [None])]) for fault in faults]
+    other = next(ids)
+    code = ", ".join(dict.fromkeys(f["code"] for f in faults))
+    test: Dict[str, Any] = {
+        "id": str(uuid.uuid4()),
+        "result": None,
+        "safety_and_warnings": ["Switch off the ignition before disconnecting connectors or measuring resistance."],
+        "source": "fault_codes",
+    }
+
+    if len({f["system"] for f in faults}) > 1:
+        options = [fault_label(f) for f in faults] + ["Not sure"]
+        spread = lambda i: [0.85 if j == i else 0.15 / (len(options) - 1) for j in range(len(options))]
+        likelihoods = {hid: spread(i) for i, (_, hids) in enumerate(owners) for hid in hids}
+        likelihoods[other] = [1.0 / len(options)] * len(options)
+        return {**test,
+            "test_text": f"Fault code {code} is used by several systems. Which one reports it?" if len({f["code"] for f in faults}) == 1
+                else f"Fault codes {code} belong to different systems. Which one is active?",
+            "test_instructions": [
+                {"step_number": "1", "step_text": "Connect DAVIE (or open the dashboard fault menu) and read out the active fault codes."},
+                {"step_number": "2", "step_text": f"Note which system lists code {code}: " + "; ".join(f"{fault_label(f)} ({f['name']})" for f in faults) + "."},
+            ],
+            "test_result_field_label": "System reporting the code",
+            "test_result_field_type": "array",
+            "test_result_field_options": options,
+            "safety_and_warnings": [],
+            "effort": 1,
+            "likelihoods": likelihoods,
+        }
+
+    fault, hids = owners[0]
+    if not fault["causes"]:
+        return {**test,
+            "test_text": f"Fault code {code} ({fault['system']}): {fault['description'] or fault['name']}. Check whether the fault is still active.",
+            "test_instructions": [
+                {"step_number": "1", "step_text": f"Read out and note fault code {code}, then clear it."},
+                {"step_number": "2", "step_text": "Switch the ignition off and on again (or road test briefly) and read out the fault codes again."},
+            ],
+            "test_result_field_label": f"Is {code} active again?",
+            "test_result_field_type": "boolean",
+            "test_result_field_options": [],
+            "effort": 1,
+            "likelihoods": {hids[0]: [0.9, 0.1], other: [0.5, 0.5]},
+        }
+
+    options = fault["causes"] + ["None of these"]
+    spread = lambda i, p: [p if j == i else (1.0 - p) / (len(options) - 1) for j in range(len(options))]
+    likelihoods = {hid: spread(i, 0.75) for i, hid in enumerate(hids)}
+    likelihoods[other] = spread(len(options) - 1, 0.7)
+    return {**test,
+        "test_text": f"Fault code {code} ({fault['system']}): {fault['description'] or fault['name']}. Check the likely causes below.",
+        "test_instructions": [{"step_number": str(i + 1), "step_text": f"Check: {cause}."} for i, cause in enumerate(fault["causes"])],
+        "test_result_field_label": "What did you find?",
+        "test_result_field_type": "array",
+        "test_result_field_options": options,
+        "effort": 2,
+        "likelihoods": likelihoods,
+    }
@@ -1,9 +1,18 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, TypedDict
+import asyncio
 from core.agents.diagnostics import DiagnosisProbability, Test
-from core.llm import LLMClient
-from core.agents.utilities import _jd, parse_llm_json
+from core.llm import LLMClient, LLMPriority
+from core.agents.utilities import _jd, parse_llm_json, typeddict_schema
+from core.agents.fault_codes import VEHICLE, load_fault_code_index, fault_label
+from core import metrics
 from pathlib import Path
-from rag.retriever import RagRetriever
+
+
+class MaintenancePlan(TypedDict):
+    tools: List[str]
+    parts: List[str]
+    steps: List[str]
+    difficulty: int
 
 
 class MaintainenceAgent:
@@ -28,12 +37,17 @@ class MaintainenceAgent:
     - Steps: The steps needed to fix the vehicle (can be empty if no steps are needed).
     - Difficulty: A number between 1 and 10, 1 being a very quick simple fix a child could do and 10 being difficult even for a professional mechanic.
     """
+    OUTPUT_SCHEMA = typeddict_schema(MaintenancePlan)
     
 
-    def __init__(self, llm_client: LLMClient):
+    def __init__(self, llm_client: LLMClient, plan_library: Optional[Any] = None, vehicle: str = VEHICLE):
         self.client = llm_client
-        # Reusable RAG retriever (store assumed at app/backend/rag/store)
+        # Reusable RAG retriever (store assumed at app/backend/rag/store); imported here so the API starts without it
+        from rag.retriever import RagRetriever
         self.retriever = RagRetriever(base_url=getattr(llm_client, "base_url", "http://localhost:11434"))
+        self.plan_library = plan_library # optional PlanLibrary of precomputed plans for known fault codes
+        self.vehicle = vehicle
+        self.last_metrics: Optional[Dict[str, Any]] = None # prefill/decode timings of the last generation
 
     def query_rag(self, problem_description: List[Test], diagnosis: DiagnosisProbability, diagnosis_history: List[Test], k: int = 10) -> List[Dict[str, Any]]:
         issue = diagnosis.get("diagnosis") or ""
@@ -44,7 +58,8 @@ class MaintainenceAgent:
             f"Recent Test History: {diagnosis_history[-3:] if diagnosis_history else []}\n"
         )
         # Prefer maintenance and shared
-        return self.retriever.search(q, k=k, namespaces=["maintenance", "shared"], systems=self.match_system(issue), types=None)
+        system = self.match_system(issue)
+        return self.retriever.search(q, k=k, namespaces=["maintenance", "shared"], systems=[system] if system else None, types=None)
 
     
     
@@ -114,17 +129,53 @@ class MaintainenceAgent:
     
     
     
-    async def run(self, problem_description: List[Test], diagnosis: DiagnosisProbability, diagnosis_history: List[Test]) -> Dict[str, Any]:
+    def from_library(self, problem_description: List[Test], diagnosis: DiagnosisProbability) -> Optional[Dict[str, Any]]:
+        """
+        The precomputed plan for the diagnosis, if the library has one: the fault codes are read from the diagnosis
+        (seeded hypotheses name theirs) and the technician's description.
+        """
+        if self.plan_library is None:
+            return None
+        text = " ".join([str(diagnosis.get("diagnosis") or "")] + [str(t.get("result") or "") for t in problem_description or []])
+        try:
+            fault_codes = [fault_label(f) for f in load_fault_code_index().match(text)]
+        except (OSError, ValueError):
+            return None
+        if not fault_codes:
+            return None
+        record = self.plan_library.lookup(self.vehicle, fault_codes, diagnosis.get("diagnosis"))
+        if record is None:
+            return None
+        print(f"Using library maintenance plan for {record['fault_code']}: {record['diagnosis']}", flush=True)
+        return record["plan"]
+
+    async def run(
+        self,
+        problem_description: List[Test],
+        diagnosis: DiagnosisProbability,
+        diagnosis_history: List[Test],
+        priority: LLMPriority = LLMPriority.FOREGROUND,
+        documentation: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
         """
-        Stream reasoning and return the final parsed maintenance plan JSON.
+        Return the maintenance plan: from the plan library when it has one for this diagnosis, otherwise streamed
+        from the LLM (reasoning on) over the retrieved documentation (or `documentation`, if already retrieved).
         """
-        # Retrieve relevant documentation from RAG
-        relevant_documentation = self.query_rag(problem_description, diagnosis, diagnosis_history)
+        plan = self.from_library(problem_description, diagnosis)
+        if plan is not None:
+            metrics.MAINTENANCE_PLANS.inc(source="library")
+            return plan
 
+        # Retrieve relevant documentation from RAG (blocking embedding call + numpy search, so off the event loop)
+        relevant_documentation = documentation
+        if relevant_documentation is None:
+            relevant_documentation = await asyncio.to_thread(self.query_rag, problem_description, diagnosis, diagnosis_history)
+
+        # most stable content first (the problem and test history are shared by every plan for this issue)
         user_prompt = (
             "Problem Description: {problem_description}\n"
-            "Diagnosis: {diagnosis}\n"
             "Diagnosis History: {diagnosis_history}\n"
+            "Diagnosis: {diagnosis}\n"
             "Relevant Documentation: {relevant_documentation}\n"
         ).format(
             problem_description=_jd(problem_description),
@@ -141,14 +192,19 @@ class MaintainenceAgent:
         _final_answer_chunks: List[str] = []
         async for chunk in self.client.chat(
             messages=llm_messages,
-            think=True,
+            profile="maintenance",  # reasoning on, long output allowance
+            format=self.OUTPUT_SCHEMA,
+            priority=priority,
         ):
+            if chunk.get("metrics"):
+                self.last_metrics = chunk["metrics"]
             if chunk.get("thinking"):
                 print(chunk["thinking"], end="", flush=True)
             if chunk.get("content"):
                 _final_answer_chunks.append(chunk["content"])
 
         self.last_raw_output = "".join(_final_answer_chunks)
-        plan = parse_llm_json(self.last_raw_output)
+        plan = parse_llm_json(self.last_raw_output, source="maintenance")
+        metrics.MAINTENANCE_PLANS.inc(source="llm")
         return plan
         
\ No newline at end of file
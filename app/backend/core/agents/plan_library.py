@@ -0,0 +1,263 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, TypedDict
+from pathlib import Path
+import argparse, asyncio, datetime, json, re, time
+from rag.retriever import STORE_DIR, store_fingerprint, store_signature
+
+
+# bump when the maintenance prompt or the record format changes: plans of other versions are not served
+PLAN_LIBRARY_VERSION = 1
+
+
+def normalise_diagnosis(text: Optional[str]) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+def plan_key(vehicle: str, fault_code: str, diagnosis: str) -> str:
+    """`fault_code` is the system-qualified label (see fault_codes.fault_label), e.g. "ABS/ASR 1-1"."""
+    return f"{vehicle}|{fault_code}|{normalise_diagnosis(diagnosis)}"
+
+
+
+# ----- TYPES -----
+class PlanRecord(TypedDict):
+    version: int
+    key: str
+    vehicle: str
+    fault_code: str
+    diagnosis: str
+    plan: Dict[str, Any]       # MaintenancePlan
+    rag_fingerprint: str       # store the plan's documentation came from
+    sources: List[Dict[str, Any]]
+    model: Optional[str]
+    generated_at: str
+    seconds: float
+
+
+
+"""
+PlanLibrary
+Precomputed maintenance plans for known fault codes, keyed by vehicle, fault code and normalised diagnosis and built
+offline by `python -m core.agents.plan_library build`. Records are appended to <directory>/plans.jsonl (a later record
+for the same key wins). Only records of the current PLAN_LIBRARY_VERSION generated from the current RAG store are
+served: the store is fingerprinted when the library loads, and once started the library re-checks it (by file size
+and mtime, off the event loop) every `check_interval` seconds, so rebuilding the store invalidates the plans without
+restarting the backend.
+"""
+class PlanLibrary:
+    def __init__(self, directory: str | Path, store_dir: Path = STORE_DIR, check_interval: float = 30):
+        self.directory = Path(directory)
+        self.path = self.directory / "plans.jsonl"
+        self.store_dir = Path(store_dir)
+        self.plans: Dict[str, PlanRecord] = {}
+        self.rag_fingerprint: Optional[str] = None
+        self._signature = None
+        self.stats: Dict[str, int] = {"loaded": 0, "stale": 0, "hits": 0, "misses": 0, "invalidations": 0}
+        self.check_interval = check_interval
+        self._task: Optional[asyncio.Task] = None
+        self.load()
+
+    # ---- lifecycle ----
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch_store(), name="plan-library-store")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch_store(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check_store()
+            except (OSError, ValueError) as e:
+                print(f"Plan library store check failed: {e}", flush=True)
+
+    # ---- lookup / add ----
+    def lookup(self, vehicle: str, fault_codes: List[str], diagnosis: Optional[str]) -> Optional[PlanRecord]:
+        """The plan for `diagnosis` under any of `fault_codes` (system-qualified labels), or None."""
+        for fault_code in fault_codes:
+            record = self.plans.get(plan_key(vehicle, fault_code, diagnosis or ""))
+            if record is not None:
+                self.stats["hits"] += 1
+                return record
+        self.stats["misses"] += 1
+        return None
+
+    def has(self, vehicle: str, fault_code: str, diagnosis: str) -> bool:
+        return plan_key(vehicle, fault_code, diagnosis) in self.plans
+
+    def add(self, record: PlanRecord) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if self._valid(record, self.rag_fingerprint):
+            self.plans[record["key"]] = record
+
+    # ---- validity ----
+    @staticmethod
+    def _valid(record: Dict[str, Any], rag_fingerprint: Optional[str]) -> bool:
+        return record.get("version") == PLAN_LIBRARY_VERSION and record.get("rag_fingerprint") == rag_fingerprint
+
+    async def check_store(self) -> bool:
+        """Reload (in a worker thread) if the RAG store changed since the last load; True if it did."""
+        if await asyncio.to_thread(store_signature, self.store_dir) == self._signature:
+            return False
+        print("RAG store changed; reloading the maintenance plan library", flush=True)
+        self.stats["invalidations"] += 1
+        await asyncio.to_thread(self.load)
+        return True
+
+    # ---- persistence ----
+    def load(self) -> None:
+        # built aside and swapped in at the end: lookups on the event loop see the old plans or the new ones
+        signature = store_signature(self.store_dir)
+        fingerprint = store_fingerprint(self.store_dir)
+        plans: Dict[str, PlanRecord] = {}
+        stale = 0
+        if self.path.exists():
+            with self.path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        stale += 1 # a torn final line from an interrupted build
+                        continue
+                    if self._valid(record, fingerprint):
+                        plans[record["key"]] = record
+                    else:
+                        stale += 1
+        self.plans, self.rag_fingerprint, self._signature = plans, fingerprint, signature
+        self.stats["loaded"], self.stats["stale"] = len(plans), stale
+        if self.path.exists():
+            print(f"Loaded {len(plans)} maintenance plans from {self.path} ({stale} stale)", flush=True)
+
+    def status(self) -> Dict[str, Any]:
+        return {"path": str(self.path), "version": PLAN_LIBRARY_VERSION, "rag_fingerprint": self.rag_fingerprint, "plans": len(self.plans), **self.stats}
+
+
+
+# ----- OFFLINE BUILD -----
+def _sources(documentation: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    keys = ("doc_title", "section_title", "page_start", "page_end", "filename")
+    return [{"score": round(d.get("score", 0.0), 3), **{k: (d.get("meta") or {}).get(k) for k in keys}} for d in documentation]
+
+
+async def build(args) -> None:
+    """
+    Generate plans for every cause listed in fault_codes.json (see fault_codes.seed_hypotheses): retrieve the
+    manual sections for each, then generate up to --concurrency plans at a time through the LLM scheduler.
+    Plans are appended as they finish, so an interrupted build resumes where it stopped.
+    """
+    from core.llm import LLMClient, ModelRouter
+    from core.agents.fault_codes import VEHICLE, load_fault_code_index, seed_hypotheses, fault_label
+    from core.agents.maintainence import MaintainenceAgent
+
+    faults = [
+        f for f in load_fault_code_index().faults()
+        if (not args.systems or f["system"] in args.systems) and (not args.codes or f["code"] in args.codes)
+    ]
+    library = PlanLibrary(args.dir)
+    if library.rag_fingerprint is None:
+        raise SystemExit(f"No RAG store at {library.store_dir}; build it first (rag/build.py)")
+    jobs = [
+        (fault, hypothesis["diagnosis"])
+        for fault in faults
+        for hypothesis in seed_hypotheses([fault])[:-1] # the last is the catch-all "not in the table"
+        if args.force or not library.has(VEHICLE, fault_label(fault), hypothesis["diagnosis"])
+    ][: args.limit]
+    print(f"Generating {len(jobs)} plans for {len(faults)} faults ({len(library.plans)} already in the library)", flush=True)
+
+    router = None if args.no_router else ModelRouter(models={"large": args.model})
+    client = LLMClient(base_url=args.base_url, model=args.model, keep_alive="30m", router=router)
+    client.scheduler.concurrency = args.llm_concurrency
+    agent = MaintainenceAgent(client)
+    throttle = asyncio.Semaphore(args.concurrency)
+    done = {"ok": 0, "failed": 0}
+
+    async def generate(fault, diagnosis: str) -> None:
+        async with throttle:
+            problem = [{
+                "id": "issue_description", "name": "Issue Description", "description": "Fault code shown on the dashboard",
+                "result": f"Fault code {fault['code']} ({fault['system']}): {fault['description'] or fault['name']}",
+            }]
+            hypothesis = {"id": "h1", "diagnosis": diagnosis, "probability": 1.0}
+            started = time.perf_counter()
+            try:
+                documentation = await asyncio.to_thread(agent.query_rag, problem, hypothesis, [])
+                plan = await agent.run(problem, hypothesis, [], documentation=documentation)
+            except Exception as e:
+                done["failed"] += 1
+                print(f"  failed {fault_label(fault)}: {diagnosis[:60]!r}: {e}", flush=True)
+                return
+            library.add({
+                "version": PLAN_LIBRARY_VERSION,
+                "key": plan_key(VEHICLE, fault_label(fault), diagnosis),
+                "vehicle": VEHICLE,
+                "fault_code": fault_label(fault),
+                "diagnosis": diagnosis,
+                "plan": plan,
+                "rag_fingerprint": library.rag_fingerprint,
+                "sources": _sources(documentation),
+                "model": client.model,
+                "generated_at": datetime.datetime.utcnow().isoformat(),
+                "seconds": round(time.perf_counter() - started, 2),
+            })
+            done["ok"] += 1
+            print(f"  [{done['ok'] + done['failed']}/{len(jobs)}] {fault_label(fault)}: {diagnosis[:60]!r}", flush=True)
+
+    try:
+        await asyncio.gather(*(generate(fault, diagnosis) for fault, diagnosis in jobs))
+    finally:
+        await client.close()
+    print(f"Done: {done['ok']} generated, {done['failed']} failed, {len(library.plans)} plans in {library.path}", flush=True)
+
+
+def inspect(directory: Path, show: int = 5) -> None:
+    library = PlanLibrary(directory)
+    print(json.dumps(library.status(), indent=2))
+    by_system: Dict[str, int] = {}
+    for record in library.plans.values():
+        system = record["fault_code"].rsplit(" ", 1)[0]
+        by_system[system] = by_system.get(system, 0) + 1
+    for system, count in sorted(by_system.items()):
+        print(f"  {system:<20}{count:6d}")
+    for record in list(library.plans.values())[:show]:
+        print(f"--- {record['fault_code']}: {record['diagnosis']}")
+        print("  " + "\n  ".join(str(step) for step in (record["plan"].get("steps") or [])[:5]))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Build or inspect the precomputed maintenance plan library")
+    sub = p.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--dir", type=str, required=True, help="Plan library directory")
+    b.add_argument("--systems", nargs="*", help="Only these fault types (e.g. ABS/ASR UPEC)")
+    b.add_argument("--codes", nargs="*", help="Only these fault codes (e.g. 1-1 48-2)")
+    b.add_argument("--limit", type=int, help="Generate at most this many plans")
+    b.add_argument("--force", action="store_true", help="Regenerate plans that are already in the library")
+    b.add_argument("--base-url", type=str, default="http://localhost:11434", help="Ollama endpoint")
+    b.add_argument("--model", type=str, default="gpt-oss:20b", help="Large model")
+    b.add_argument("--no-router", action="store_true", help="Send every call to --model")
+    b.add_argument("--concurrency", type=int, default=4, help="Plans in flight (retrieval and queued generations)")
+    b.add_argument("--llm-concurrency", type=int, default=1, help="Generations run at once (the scheduler's slots)")
+    ins = sub.add_parser("inspect")
+    ins.add_argument("--dir", type=str, required=True, help="Plan library directory")
+    ins.add_argument("--show", type=int, default=5, help="Number of plans to print")
+    args = p.parse_args()
+    if args.command == "build":
+        asyncio.run(build(args))
+    elif args.command == "inspect":
+        inspect(Path(args.dir), args.show)
+
+
+if __name__ == "__main__":
+    main()
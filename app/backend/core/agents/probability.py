@@ -0,0 +1,264 @@
+from __future__ import annotations
+import math
+import re
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+
+# ----- EVIDENCE LABELS -----
+# Likelihood multipliers applied to a hypothesis for each evidence label the LLM emits.
+EVIDENCE_MULTIPLIERS: Dict[str, float] = {
+    "++": 2.0,  # strong support
+    "+": 1.2,   # some support
+    "0": 1.0,   # neutral
+    "-": 0.8,   # some contradiction
+    "--": 0.5,  # strong contradiction
+}
+
+# Longhand labels the model sometimes produces instead of the compact codes
+EVIDENCE_ALIASES: Dict[str, str] = {
+    "strong_support": "++",
+    "strong support": "++",
+    "support": "+",
+    "some_support": "+",
+    "some support": "+",
+    "neutral": "0",
+    "none": "0",
+    "contradiction": "-",
+    "some_contradiction": "-",
+    "some contradiction": "-",
+    "strong_contradiction": "--",
+    "strong contradiction": "--",
+}
+
+
+# Smallest share a new hypothesis starts with: multiplicative updates can never lift a zero probability again
+MIN_PRIOR = 1e-3
+
+
+def normalise_evidence_label(label: Any) -> str:
+    """
+    Map an evidence label (compact code or longhand) onto one of EVIDENCE_MULTIPLIERS' keys.
+    Unknown labels are treated as neutral.
+    """
+    text = str(label).strip().lower()
+    if text in EVIDENCE_MULTIPLIERS:
+        return text
+    return EVIDENCE_ALIASES.get(text, "0")
+
+
+def _normalise_diagnosis(text: str) -> str:
+    return re.sub(r"\s+", " ", str(text).strip().lower())
+
+
+
+"""
+ProbabilityEngine
+Deterministic store of diagnosis hypotheses for a single issue.
+Hypotheses are kept as a numpy probability vector with stable ids ("h1", "h2", ...), so the LLM only
+has to emit compact evidence labels per id and all of the arithmetic happens locally.
+"""
+class ProbabilityEngine:
+    def __init__(self, hypotheses: Optional[List[Dict[str, Any]]] = None):
+        self._ids: List[str] = []
+        self._diagnoses: List[str] = []
+        self._p: np.ndarray = np.zeros(0, dtype=np.float64)
+        self._next_id: int = 1
+        self.history: List[Dict[str, Any]] = []  # ordered record of every update applied
+
+        if hypotheses:
+            self.seed(hypotheses)
+
+    # ---- state ----
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def ids(self) -> List[str]:
+        return list(self._ids)
+
+    @property
+    def vector(self) -> np.ndarray:
+        return self._p.copy()
+
+    def probability(self, hypothesis_id: str) -> float:
+        try:
+            return float(self._p[self._ids.index(hypothesis_id)])
+        except ValueError:
+            return 0.0
+
+    def diagnosis(self, hypothesis_id: str) -> Optional[str]:
+        try:
+            return self._diagnoses[self._ids.index(hypothesis_id)]
+        except ValueError:
+            return None
+
+    def find(self, diagnosis: str) -> Optional[str]:
+        """Return the id of an existing hypothesis with the same (normalised) diagnosis text."""
+        key = _normalise_diagnosis(diagnosis)
+        for hid, text in zip(self._ids, self._diagnoses):
+            if _normalise_diagnosis(text) == key:
+                return hid
+        return None
+
+    def copy(self) -> "ProbabilityEngine":
+        clone = ProbabilityEngine()
+        clone._ids = list(self._ids)
+        clone._diagnoses = list(self._diagnoses)
+        clone._p = self._p.copy()
+        clone._next_id = self._next_id
+        clone.history = list(self.history)
+        return clone
+
+    # ---- updates ----
+    def seed(self, hypotheses: List[Dict[str, Any]]) -> List[str]:
+        """
+        Add a batch of hypotheses with raw (unnormalised) weights, then normalise.
+        Accepts {"diagnosis": ..., "probability" | "prior": ...} dicts or plain strings.
+        """
+        ids: List[str] = []
+        weights: List[float] = []
+        for h in hypotheses:
+            if isinstance(h, str):
+                diagnosis, weight = h, None
+            else:
+                diagnosis = h.get("diagnosis") or ""
+                weight = h.get("probability", h.get("prior"))
+            if not str(diagnosis).strip():
+                continue
+            existing = self.find(diagnosis)
+            if existing is not None:
+                ids.append(existing)
+                continue
+            ids.append(self._append(str(diagnosis).strip(), 0.0))
+            weights.append(_as_weight(weight))
+
+        # fill in missing weights with the mean of the provided ones (or uniform)
+        known = [w for w in weights if w is not None]
+        fill = (sum(known) / len(known)) if known else 1.0
+        new = np.array([fill if w is None else w for w in weights], dtype=np.float64)
+        if len(new):
+            # a zero weight would never recover; floor it relative to the batch
+            self._p[len(self._p) - len(new):] = np.maximum(new, MIN_PRIOR * (float(new.max()) or 1.0))
+        self.normalise()
+        self.history.append({"kind": "seed", "ids": ids})
+        return ids
+
+    def add_hypothesis(self, diagnosis: str, prior: Optional[float] = None) -> str:
+        """
+        Add a single hypothesis and return its id (the existing id if it is already present).
+        `prior` is the share of probability mass the new hypothesis takes (at least MIN_PRIOR); by default
+        it gets a uniform 1/(n+1) share and existing hypotheses are scaled down proportionally.
+        """
+        existing = self.find(diagnosis)
+        if existing is not None:
+            return existing
+
+        n = len(self._ids)
+        share = _as_weight(prior)
+        if share is None or share >= 1.0:
+            share = 1.0 / (n + 1)
+        share = max(share, MIN_PRIOR)
+        if n == 0:
+            share = 1.0
+
+        self._p = self._p * (1.0 - share)
+        hid = self._append(str(diagnosis).strip(), share)
+        self.normalise()
+        self.history.append({"kind": "add", "id": hid, "prior": share})
+        return hid
+
+    def apply_evidence(self, evidence: Dict[str, Any], source: Optional[str] = None) -> Dict[str, str]:
+        """
+        Apply per-hypothesis evidence labels (see EVIDENCE_MULTIPLIERS) and renormalise.
+        Unknown ids are ignored. Returns the normalised labels that were applied.
+        """
+        applied: Dict[str, str] = {}
+        multipliers = np.ones(len(self._ids), dtype=np.float64)
+        for hid, label in (evidence or {}).items():
+            if hid not in self._ids:
+                continue
+            code = normalise_evidence_label(label)
+            multipliers[self._ids.index(hid)] = EVIDENCE_MULTIPLIERS[code]
+            applied[hid] = code
+
+        self._p = self._p * multipliers
+        self.normalise()
+        self.history.append({"kind": "evidence", "source": source, "evidence": applied})
+        return applied
+
+    def apply_likelihoods(self, likelihoods: Dict[str, float], source: Optional[str] = None) -> None:
+        """
+        Bayesian update with explicit likelihoods P(observation | hypothesis).
+        Hypotheses without an entry keep likelihood 1.0.
+        """
+        L = np.ones(len(self._ids), dtype=np.float64)
+        for hid, value in (likelihoods or {}).items():
+            if hid in self._ids:
+                w = _as_weight(value)
+                L[self._ids.index(hid)] = 1.0 if w is None else w
+        self._p = self._p * L
+        self.normalise()
+        self.history.append({"kind": "likelihood", "source": source, "likelihoods": dict(likelihoods or {})})
+
+    def normalise(self) -> None:
+        if len(self._p) == 0:
+            return
+        total = float(self._p.sum())
+        if total <= 1e-12 or not math.isfinite(total):
+            # Evidence eliminated everything; fall back to uniform rather than divide by zero
+            self._p = np.full(len(self._p), 1.0 / len(self._p), dtype=np.float64)
+        else:
+            self._p = self._p / total
+
+    # ---- summaries ----
+    def entropy(self) -> float:
+        """Shannon entropy of the hypothesis distribution, in bits."""
+        p = self._p[self._p > 0]
+        if len(p) == 0:
+            return 0.0
+        return float(-(p * np.log2(p)).sum())
+
+    def leader(self) -> Optional[Dict[str, Any]]:
+        if len(self._p) == 0:
+            return None
+        i = int(np.argmax(self._p))
+        return {"id": self._ids[i], "diagnosis": self._diagnoses[i], "probability": float(self._p[i])}
+
+    def above_threshold(self, threshold: float) -> Optional[Dict[str, Any]]:
+        """Return the leading hypothesis if its probability exceeds `threshold`, otherwise None."""
+        leader = self.leader()
+        if leader is not None and leader["probability"] > threshold:
+            return leader
+        return None
+
+    def as_list(self) -> List[Dict[str, Any]]:
+        """Hypotheses as DiagnosisProbability dicts, most likely first."""
+        order = np.argsort(-self._p, kind="stable")
+        return [
+            {"id": self._ids[i], "diagnosis": self._diagnoses[i], "probability": float(self._p[i])}
+            for i in order
+        ]
+
+    def prompt_view(self) -> List[List[Any]]:
+        """Compact [id, diagnosis, probability] rows for LLM prompts."""
+        return [[h["id"], h["diagnosis"], round(h["probability"], 3)] for h in self.as_list()]
+
+    # ---- internals ----
+    def _append(self, diagnosis: str, weight: float) -> str:
+        hid = f"h{self._next_id}"
+        self._next_id += 1
+        self._ids.append(hid)
+        self._diagnoses.append(diagnosis)
+        self._p = np.append(self._p, np.float64(weight))
+        return hid
+
+
+def _as_weight(value: Any) -> Optional[float]:
+    try:
+        w = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(w) or w < 0:
+        return None
+    return w
@@ -0,0 +1,165 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from core.agents.probability import ProbabilityEngine
+
+
+# ----- OUTCOMES -----
+_TRUE_WORDS = {"true", "yes", "y", "1", "on", "present", "pass", "ok"}
+_FALSE_WORDS = {"false", "no", "n", "0", "off", "absent", "fail"}
+
+
+def enumerate_outcomes(test: Dict[str, Any]) -> Optional[List[Any]]:
+    """
+    Enumerate the possible results of a test, or None if they are open-ended (text/number).
+    Boolean tests are ordered [True, False]; array tests follow test_result_field_options.
+    """
+    field_type = str(test.get("test_result_field_type") or "").lower()
+    options = test.get("test_result_field_options") or []
+    if field_type == "boolean":
+        return [True, False]
+    if field_type == "array" and isinstance(options, list) and len(options) > 1:
+        return list(options)
+    return None
+
+
+def match_outcome(test: Dict[str, Any], result: Any) -> Optional[int]:
+    """Index of `result` within enumerate_outcomes(test), or None if it cannot be matched."""
+    outcomes = enumerate_outcomes(test)
+    if outcomes is None or result is None:
+        return None
+    if outcomes == [True, False]:
+        if isinstance(result, bool):
+            return 0 if result else 1
+        text = str(result).strip().lower()
+        if text in _TRUE_WORDS:
+            return 0
+        if text in _FALSE_WORDS:
+            return 1
+        return None
+    text = str(result).strip().lower()
+    for i, option in enumerate(outcomes):
+        if str(option).strip().lower() == text:
+            return i
+    return None
+
+
+def likelihood_matrix(engine: ProbabilityEngine, test: Dict[str, Any]) -> Optional[np.ndarray]:
+    """
+    Build P(outcome | hypothesis) as a [num_hypotheses, num_outcomes] array aligned with engine.ids.
+    Hypotheses the test carries no estimate for are treated as uninformative (uniform).
+    """
+    outcomes = enumerate_outcomes(test)
+    if outcomes is None or len(engine) == 0:
+        return None
+    n = len(outcomes)
+    estimates = test.get("likelihoods") or {}
+    rows: List[np.ndarray] = []
+    for hid in engine.ids:
+        row = _likelihood_row(estimates.get(hid), n)
+        rows.append(row if row is not None else np.full(n, 1.0 / n))
+    return np.vstack(rows)
+
+
+def _likelihood_row(value: Any, n: int) -> Optional[np.ndarray]:
+    # a single number on a boolean test is read as P(True | hypothesis)
+    if isinstance(value, (int, float)) and n == 2:
+        value = [float(value), 1.0 - float(value)]
+    if not isinstance(value, list) or len(value) != n:
+        return None
+    try:
+        row = np.clip(np.array(value, dtype=np.float64), 1e-3, None)
+    except (TypeError, ValueError):
+        return None
+    return row / row.sum()
+
+
+def expected_information_gain(engine: ProbabilityEngine, test: Dict[str, Any]) -> float:
+    """
+    Expected reduction in hypothesis entropy (bits) from running `test`:
+    H(prior) - sum_o P(o) * H(posterior | o)
+    """
+    L = likelihood_matrix(engine, test)
+    if L is None:
+        return 0.0
+    prior = engine.vector
+    joint = prior[:, None] * L           # P(h, o)
+    p_outcome = joint.sum(axis=0)         # P(o)
+    expected_posterior_entropy = 0.0
+    for o, po in enumerate(p_outcome):
+        if po <= 0:
+            continue
+        posterior = joint[:, o] / po
+        nz = posterior[posterior > 0]
+        expected_posterior_entropy += po * float(-(nz * np.log2(nz)).sum())
+    return max(0.0, engine.entropy() - expected_posterior_entropy)
+
+
+def outcome_probabilities(engine: ProbabilityEngine, test: Dict[str, Any]) -> Optional[List[float]]:
+    """Predicted P(outcome) for each of enumerate_outcomes(test) under the current hypotheses."""
+    L = likelihood_matrix(engine, test)
+    if L is None:
+        return None
+    return [float(p) for p in engine.vector @ L]
+
+
+def outcome_likelihoods(engine: ProbabilityEngine, test: Dict[str, Any], outcome_index: int) -> Dict[str, float]:
+    """P(observed outcome | hypothesis) per hypothesis id, for ProbabilityEngine.apply_likelihoods."""
+    L = likelihood_matrix(engine, test)
+    if L is None:
+        return {}
+    return {hid: float(L[i, outcome_index]) for i, hid in enumerate(engine.ids)}
+
+
+def score_test(engine: ProbabilityEngine, test: Dict[str, Any]) -> float:
+    """Expected information gain per unit of effort (effort defaults to 1, clamped to 1-5)."""
+    try:
+        effort = min(5.0, max(1.0, float(test.get("effort") or 1)))
+    except (TypeError, ValueError):
+        effort = 1.0
+    return expected_information_gain(engine, test) / effort
+
+
+
+"""
+TestQueue
+Per-issue queue of candidate tests generated by the diagnostics agent.
+Candidates are re-scored against the current hypotheses after every result, so the next test can often
+be issued locally without another LLM round trip.
+"""
+class TestQueue:
+    def __init__(self, max_size: int = 8):
+        self.max_size = max_size
+        self.candidates: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def copy(self) -> "TestQueue":
+        clone = TestQueue(self.max_size)
+        clone.candidates = [dict(c) for c in self.candidates]
+        return clone
+
+    def replace(self, candidates: List[Dict[str, Any]]) -> None:
+        """Replace the queue with a fresh slate of candidates."""
+        self.candidates = list(candidates)[: self.max_size]
+
+    def discard(self, test_id: str) -> None:
+        self.candidates = [c for c in self.candidates if c.get("id") != test_id]
+
+    def ranked(self, engine: ProbabilityEngine) -> List[Tuple[float, Dict[str, Any]]]:
+        scored = [(score_test(engine, c), c) for c in self.candidates]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored
+
+    def pop_best(self, engine: ProbabilityEngine, min_score: float = 0.0) -> Optional[Dict[str, Any]]:
+        """
+        Remove and return the highest scoring candidate if it scores at least `min_score`.
+        Returns None (leaving the queue untouched) otherwise.
+        """
+        ranked = self.ranked(engine)
+        if not ranked or ranked[0][0] < min_score:
+            return None
+        best = ranked[0][1]
+        self.discard(best.get("id"))
+        return best
@@ -0,0 +1,138 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import asyncio, time
+from core.llm import LLMPriority
+from core.agents.probability import ProbabilityEngine
+from core.agents.selection import enumerate_outcomes, match_outcome, outcome_probabilities
+
+
+"""
+SpeculativeBranch
+One precomputed diagnostics turn for a single hypothesised outcome of the pending test.
+The branch owns forked copies of the agent and engine, so adopting it is a plain swap.
+"""
+class SpeculativeBranch:
+    def __init__(self, outcome_index: int, outcome: Any, probability: float, agent: Any, engine: ProbabilityEngine):
+        self.outcome_index = outcome_index
+        self.outcome = outcome
+        self.probability = probability
+        self.agent = agent
+        self.engine = engine
+        self.task: Optional[asyncio.Task] = None
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+
+
+"""
+Speculator
+While the technician performs a test with enumerable outcomes, precompute the next diagnostics turn for the
+most likely outcomes at SPECULATIVE priority. The scheduler preempts these generations as soon as a real
+request needs the LLM. On submit the matching branch is adopted and the rest are cancelled.
+"""
+class Speculator:
+    def __init__(self, max_branches: int = 2, min_outcome_probability: float = 0.1):
+        self.max_branches = max_branches
+        self.min_outcome_probability = min_outcome_probability
+        self.test_id: Optional[str] = None
+        self._branches: Dict[int, SpeculativeBranch] = {}
+        self.stats: Dict[str, Any] = {
+            "speculations": 0,     # tests speculated on
+            "branches": 0,         # branches started
+            "hits": 0,             # submitted result matched a usable branch
+            "misses": 0,           # no usable branch for the submitted result
+            "preempted": 0,        # branches cancelled by the scheduler before finishing
+            "wasted_seconds": 0.0, # wall time spent on branches that were never used
+        }
+
+    def start(self, agent: Any, engine: ProbabilityEngine, tests_log: List[Dict[str, Any]], test: Dict[str, Any]) -> None:
+        """Begin speculating on `test` (the newest, still unanswered, entry of tests_log)."""
+        self.cancel()
+        outcomes = enumerate_outcomes(test)
+        if not outcomes:
+            return
+
+        probabilities = outcome_probabilities(engine, test) or [1.0 / len(outcomes)] * len(outcomes)
+        ranked = sorted(range(len(outcomes)), key=lambda i: probabilities[i], reverse=True)
+        chosen = [i for i in ranked if probabilities[i] >= self.min_outcome_probability][: self.max_branches]
+        if not chosen:
+            return
+
+        self.test_id = test.get("id")
+        self.stats["speculations"] += 1
+        for i in chosen:
+            branch = SpeculativeBranch(i, outcomes[i], probabilities[i], agent.fork(), engine.copy())
+            hypothesised_log = list(tests_log[:-1]) + [{**test, "result": outcomes[i]}]
+            branch.task = asyncio.create_task(
+                self._run_branch(branch, hypothesised_log),
+                name=f"speculate-{self.test_id}-{i}",
+            )
+            self._branches[i] = branch
+            self.stats["branches"] += 1
+
+    async def _run_branch(self, branch: SpeculativeBranch, tests_log: List[Dict[str, Any]]):
+        try:
+            return await branch.agent.run(branch.engine, tests_log, priority=LLMPriority.SPECULATIVE)
+        finally:
+            branch.finished = time.perf_counter()
+
+    async def take(self, test: Dict[str, Any]) -> Optional[SpeculativeBranch]:
+        """
+        Return the branch matching the submitted result of `test` (awaiting it if it is still running),
+        or None on a miss. All other branches are cancelled and counted as wasted.
+        """
+        if test.get("id") != self.test_id or not self._branches:
+            self.cancel()
+            return None
+
+        index = match_outcome(test, test.get("result"))
+        branch = self._branches.pop(index, None) if index is not None else None
+        self.cancel()
+
+        if branch is None or branch.task is None:
+            self.stats["misses"] += 1
+            return None
+        try:
+            # the branch is now answering a real request, so it must not be preempted any more
+            branch.agent.client.scheduler.promote(branch.task, LLMPriority.FOREGROUND)
+            await branch.task
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise
+            # the branch was preempted before it could finish
+            self.stats["preempted"] += 1
+            self.stats["misses"] += 1
+            self.stats["wasted_seconds"] += branch.elapsed()
+            return None
+        except Exception as e:
+            print(f"Speculative branch failed: {e}", flush=True)
+            self.stats["misses"] += 1
+            self.stats["wasted_seconds"] += branch.elapsed()
+            return None
+
+        self.stats["hits"] += 1
+        return branch
+
+    def cancel(self) -> None:
+        """Cancel all outstanding branches, counting them as wasted compute."""
+        for branch in self._branches.values():
+            if branch.task is None:
+                continue
+            if not branch.task.done():
+                branch.task.cancel()
+            elif branch.task.cancelled():
+                self.stats["preempted"] += 1
+            self.stats["wasted_seconds"] += branch.elapsed()
+        self._branches = {}
+        self.test_id = None
+
+    def report(self) -> Dict[str, Any]:
+        resolved = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "wasted_seconds": round(self.stats["wasted_seconds"], 3),
+            "hit_rate": (self.stats["hits"] / resolved) if resolved else None,
+        }
@@ -0,0 +1,195 @@
+from __future__ import annotations
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+Path = Tuple[Any, ...] # keys / list indices from the root, e.g. ("candidate_tests", 0, "test_text")
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_WHITESPACE = " \t\r\n"
+
+
+
+"""
+IncrementalJSONParser
+Parses a JSON document as it streams in, chunk by chunk, and reports progress as events:
+  ("string", path, delta)  new characters of a string value that is still being generated
+  ("value", path, value)   a value (scalar, object or array) at `path` has completed
+Text before the first '{' / '[' (e.g. prose) is ignored. Parsing stops once the root value completes.
+"""
+class IncrementalJSONParser:
+    def __init__(self):
+        self.value: Any = None
+        self.done: bool = False
+        self._started = False
+        self._stack: List[Dict[str, Any]] = [] # open containers: {"container", "key", "expect"}
+
+        # active string token
+        self._string: Optional[List[str]] = None
+        self._string_is_key = False
+        self._string_emitted = 0
+        self._escape = False
+        self._unicode: Optional[str] = None
+
+        # active number / literal token
+        self._literal: Optional[List[str]] = None
+
+    def feed(self, text: str) -> List[Tuple[str, Path, Any]]:
+        events: List[Tuple[str, Path, Any]] = []
+        for ch in text:
+            if self.done:
+                break
+            if self._string is not None:
+                self._feed_string(ch, events)
+                continue
+            if self._literal is not None:
+                if ch not in ",]}" and ch not in _WHITESPACE:
+                    self._literal.append(ch)
+                    continue
+                self._finish_literal(events)
+                if self.done:
+                    break
+            self._feed_structural(ch, events)
+
+        # report the part of an unfinished string value that arrived in this chunk
+        if self._string is not None and not self._string_is_key and len(self._string) > self._string_emitted:
+            events.append(("string", self._path(), "".join(self._string[self._string_emitted:])))
+            self._string_emitted = len(self._string)
+        return events
+
+    # ---- tokens ----
+    def _feed_string(self, ch: str, events: List[Tuple[str, Path, Any]]) -> None:
+        if self._unicode is not None:
+            self._unicode += ch
+            if len(self._unicode) == 4:
+                self._append_codepoint(int(self._unicode, 16))
+                self._unicode = None
+            return
+        if self._escape:
+            self._escape = False
+            if ch == "u":
+                self._unicode = ""
+            else:
+                self._string.append(_ESCAPES.get(ch, ch))
+            return
+        if ch == "\\":
+            self._escape = True
+            return
+        if ch != '"':
+            self._string.append(ch)
+            return
+
+        # closing quote
+        text = "".join(self._string)
+        if self._string_is_key:
+            frame = self._stack[-1]
+            frame["key"] = text
+            frame["expect"] = ":"
+        else:
+            if len(self._string) > self._string_emitted:
+                events.append(("string", self._path(), "".join(self._string[self._string_emitted:])))
+            self._complete(text, events)
+        self._string = None
+
+    def _append_codepoint(self, code: int) -> None:
+        # join UTF-16 surrogate pairs written as two \u escapes
+        if 0xDC00 <= code <= 0xDFFF and self._string and 0xD800 <= ord(self._string[-1]) <= 0xDBFF:
+            high = ord(self._string.pop())
+            code = 0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)
+        self._string.append(chr(code))
+
+    def _finish_literal(self, events: List[Tuple[str, Path, Any]]) -> None:
+        raw = "".join(self._literal)
+        self._literal = None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw # leave malformed literals as text rather than abort the stream
+        self._complete(value, events)
+
+    # ---- structure ----
+    def _feed_structural(self, ch: str, events: List[Tuple[str, Path, Any]]) -> None:
+        if not self._started:
+            if ch not in "{[":
+                return
+            self._started = True
+        if ch in _WHITESPACE:
+            return
+
+        frame = self._stack[-1] if self._stack else None
+        expect = frame["expect"] if frame else "value"
+
+        if expect == "key":
+            if ch == '"':
+                self._start_string(is_key=True)
+            elif ch == "}":
+                self._close(events)
+        elif expect == ":":
+            if ch == ":":
+                frame["expect"] = "value"
+        elif expect == "value":
+            if ch == "]" and frame is not None and isinstance(frame["container"], list) and not frame["container"]:
+                self._close(events)
+            elif ch in "{[":
+                self._open({} if ch == "{" else [], events)
+            elif ch == '"':
+                self._start_string(is_key=False)
+            else:
+                self._literal = [ch]
+        elif expect == "next":
+            if ch == ",":
+                if isinstance(frame["container"], dict):
+                    frame["expect"] = "key"
+                else:
+                    frame["key"] += 1
+                    frame["expect"] = "value"
+            elif ch in "}]":
+                self._close(events)
+
+    def _start_string(self, is_key: bool) -> None:
+        self._string = []
+        self._string_is_key = is_key
+        self._string_emitted = 0
+        self._escape = False
+        self._unicode = None
+
+    def _open(self, container: Any, events: List[Tuple[str, Path, Any]]) -> None:
+        # attach the container to its parent right away so partial state is visible in self.value
+        if self._stack:
+            self._assign(container)
+        else:
+            self.value = container
+        self._stack.append({
+            "container": container,
+            "key": None if isinstance(container, dict) else 0,
+            "expect": "key" if isinstance(container, dict) else "value",
+        })
+
+    def _close(self, events: List[Tuple[str, Path, Any]]) -> None:
+        frame = self._stack.pop()
+        path = self._path()
+        events.append(("value", path, frame["container"]))
+        if self._stack:
+            self._stack[-1]["expect"] = "next"
+        else:
+            self.done = True
+
+    def _complete(self, value: Any, events: List[Tuple[str, Path, Any]]) -> None:
+        if not self._stack:
+            self.value = value
+            self.done = True
+            events.append(("value", (), value))
+            return
+        self._assign(value)
+        events.append(("value", self._path(), value))
+        self._stack[-1]["expect"] = "next"
+
+    def _assign(self, value: Any) -> None:
+        frame = self._stack[-1]
+        if isinstance(frame["container"], dict):
+            frame["container"][frame["key"]] = value
+        else:
+            frame["container"].append(value)
+
+    def _path(self) -> Path:
+        return tuple(frame["key"] for frame in self._stack)
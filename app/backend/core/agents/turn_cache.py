@@ -0,0 +1,261 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+import argparse, asyncio, copy, json, time, uuid
+import numpy as np
+from core.agents.probability import ProbabilityEngine
+
+
+def turn_state(engine: ProbabilityEngine, tests_log: List[Dict[str, Any]]) -> str:
+    """
+    Text describing a diagnostics state for embedding: the initial complaint, the hypothesis set
+    (by diagnosis text, since ids are per issue) and the latest result.
+    """
+    complaint = tests_log[0].get("result") if tests_log else ""
+    hypotheses = "; ".join(f"{h['diagnosis']} ({h['probability']:.1f})" for h in engine.as_list())
+    lines = [f"Complaint: {complaint}", f"Hypotheses: {hypotheses or 'none'}"]
+    if len(tests_log) > 1:
+        last = tests_log[-1]
+        name = last.get("test_text") or last.get("name") or last.get("description") or ""
+        lines.append(f"Last test: {name} -> {json.dumps(last.get('result'), ensure_ascii=False)}")
+    return "\n".join(lines)
+
+
+def _to_diagnoses(mapping: Dict[str, Any], engine: ProbabilityEngine) -> Dict[str, Any]:
+    return {engine.diagnosis(hid): value for hid, value in (mapping or {}).items() if engine.diagnosis(hid)}
+
+
+def _to_ids(mapping: Dict[str, Any], engine: ProbabilityEngine) -> Dict[str, Any]:
+    return {engine.find(diagnosis): value for diagnosis, value in (mapping or {}).items() if engine.find(diagnosis)}
+
+
+
+"""
+TurnCache
+Semantic cache of diagnostics turns shared by all issues. A turn is stored under the embedding of the state it
+answered (see turn_state) with hypothesis ids replaced by diagnosis text, and served for any later state whose
+embedding has cosine similarity >= threshold. Entries expire ttl_seconds after creation and the least recently used are
+evicted beyond max_entries. Every lookup (hit or not) is logged when persisted, for offline inspection:
+    python -m core.agents.turn_cache inspect --dir <dir>
+"""
+class TurnCache:
+    def __init__(
+        self,
+        embed,                                   # async callable: text -> List[float]
+        threshold: float = 0.95,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 2000,
+        directory: Optional[str | Path] = None,
+    ):
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.directory = Path(directory) if directory else None
+        self.entries: List[Dict[str, Any]] = []
+        self._matrix: Optional[np.ndarray] = None # normalised vectors, rebuilt lazily after changes
+        self._lock = asyncio.Lock()
+        self.stats: Dict[str, int] = {"lookups": 0, "hits": 0, "stores": 0, "expired": 0, "evicted": 0, "embed_failures": 0}
+        if self.directory is not None:
+            self.load()
+
+    # ---- lookup / store ----
+    async def lookup(self, engine: ProbabilityEngine, tests_log: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Embed the current state and find the closest cached one. Returns a probe
+        {"state", "vector", "similarity", "turn"} where "turn" (remapped to the engine's ids) is None on a miss,
+        or None if the state could not be embedded. Pass the probe to store() after a miss.
+        """
+        state = turn_state(engine, tests_log)
+        vector = await self._embed(state)
+        if vector is None:
+            return None
+        self.stats["lookups"] += 1
+        self._expire()
+        index, similarity = self._nearest(vector)
+        hit = index is not None and similarity >= self.threshold
+        if self.directory is not None:
+            await asyncio.to_thread(self._log_lookup, state, self.entries[index]["state"] if index is not None else None, similarity, hit)
+        probe = {"state": state, "vector": vector, "similarity": similarity, "turn": None}
+        if hit:
+            entry = self.entries[index]
+            entry["hits"] += 1
+            entry["last_used"] = time.time()
+            self.stats["hits"] += 1
+            probe["turn"] = self._for_engine(entry["turn"], engine)
+            if self.directory is not None:
+                async with self._lock:
+                    await asyncio.to_thread(self.save) # keep the persisted hit counts current for inspection
+        return probe
+
+    async def store(self, probe: Dict[str, Any], turn: Dict[str, Any], engine_before: ProbabilityEngine, engine_after: ProbabilityEngine) -> None:
+        """
+        Store an LLM turn under the probed state it answered. Evidence is keyed by the hypotheses before the turn,
+        candidate likelihoods by those after it (they may refer to new hypotheses).
+        """
+        record = {
+            "evidence": _to_diagnoses(turn.get("evidence"), engine_before),
+            "new_hypotheses": copy.deepcopy(turn.get("new_hypotheses") or []),
+            "candidate_tests": [
+                {**{k: copy.deepcopy(v) for k, v in c.items() if k not in ("id", "result")},
+                 "likelihoods": _to_diagnoses(c.get("likelihoods"), engine_after)}
+                for c in turn.get("candidate_tests") or [] if isinstance(c, dict)
+            ],
+        }
+        async with self._lock:
+            index, similarity = self._nearest(probe["vector"])
+            if index is not None and similarity >= 0.99:
+                self.entries.pop(index) # near-duplicate state: keep the fresher turn
+            now = time.time()
+            self.entries.append({
+                "id": str(uuid.uuid4()), "state": probe["state"], "vector": probe["vector"], "turn": record,
+                "created": now, "last_used": now, "hits": 0,
+            })
+            self.stats["stores"] += 1
+            self._evict()
+            self._matrix = None
+            if self.directory is not None:
+                await asyncio.to_thread(self.save)
+
+    def _for_engine(self, record: Dict[str, Any], engine: ProbabilityEngine) -> Dict[str, Any]:
+        # evidence is remapped now; candidate likelihoods keep diagnosis keys until new hypotheses have ids
+        return {
+            "evidence": _to_ids(record["evidence"], engine),
+            "new_hypotheses": copy.deepcopy(record["new_hypotheses"]),
+            "candidate_tests": copy.deepcopy(record["candidate_tests"]),
+        }
+
+    @staticmethod
+    def likelihoods_for_engine(candidates: List[Dict[str, Any]], engine: ProbabilityEngine) -> None:
+        """Replace diagnosis-keyed likelihoods of served candidates with the engine's ids (in place)."""
+        for candidate in candidates:
+            candidate["likelihoods"] = _to_ids(candidate.get("likelihoods"), engine)
+
+    # ---- index ----
+    async def _embed(self, text: str) -> Optional[np.ndarray]:
+        try:
+            vector = np.asarray(await self.embed(text), dtype=np.float32)
+        except Exception as e:
+            self.stats["embed_failures"] += 1
+            print(f"Turn cache embedding failed: {e}", flush=True)
+            return None
+        return vector / (np.linalg.norm(vector) + 1e-8)
+
+    def _nearest(self, vector: np.ndarray) -> Tuple[Optional[int], float]:
+        if not self.entries:
+            return None, 0.0
+        if self._matrix is None:
+            self._matrix = np.stack([e["vector"] for e in self.entries])
+        if self._matrix.shape[1] != vector.shape[0]:
+            return None, 0.0 # embedding model changed
+        sims = self._matrix @ vector
+        index = int(np.argmax(sims))
+        return index, float(sims[index])
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        kept = [e for e in self.entries if e["created"] >= cutoff]
+        if len(kept) != len(self.entries):
+            self.stats["expired"] += len(self.entries) - len(kept)
+            self.entries = kept
+            self._matrix = None
+
+    def _evict(self) -> None:
+        if len(self.entries) <= self.max_entries:
+            return
+        self.entries.sort(key=lambda e: e["last_used"])
+        evicted = len(self.entries) - self.max_entries
+        self.entries = self.entries[evicted:]
+        self.stats["evicted"] += evicted
+
+    # ---- persistence ----
+    def load(self) -> None:
+        entries_path = self.directory / "entries.jsonl"
+        vectors_path = self.directory / "vectors.npy"
+        if not entries_path.exists() or not vectors_path.exists():
+            return
+        vectors = np.load(vectors_path)
+        with entries_path.open("r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        if len(entries) != len(vectors):
+            print(f"Turn cache at {self.directory} is inconsistent; starting empty", flush=True)
+            return
+        for entry, vector in zip(entries, vectors):
+            entry["vector"] = vector.astype(np.float32)
+        self.entries = entries
+        self._expire()
+        print(f"Loaded {len(self.entries)} cached diagnostics turns from {self.directory}", flush=True)
+
+    def save(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entries = list(self.entries)
+        tmp = self.directory / "entries.jsonl.tmp"
+        with tmp.open("w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps({k: v for k, v in entry.items() if k != "vector"}, ensure_ascii=False) + "\n")
+        if entries:
+            np.save(self.directory / "vectors.npy", np.stack([e["vector"] for e in entries]))
+        tmp.replace(self.directory / "entries.jsonl")
+
+    def _log_lookup(self, state: str, matched: Optional[str], similarity: float, hit: bool) -> None:
+        # file I/O: called on a worker thread
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with (self.directory / "lookups.jsonl").open("a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "time": time.time(), "state": state, "matched": matched,
+                "similarity": round(similarity, 4), "hit": hit, "threshold": self.threshold,
+            }, ensure_ascii=False) + "\n")
+
+
+
+# ----- OFFLINE INSPECTION -----
+def inspect(directory: Path, show: int = 5) -> None:
+    """Print cache contents and lookup quality: similarity distribution, hit rate per threshold, closest pairs."""
+    entries_path = directory / "entries.jsonl"
+    if entries_path.exists():
+        with entries_path.open("r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        print(f"{len(entries)} cached turns")
+        for entry in sorted(entries, key=lambda e: -e["hits"])[:show]:
+            first = (entry["turn"]["candidate_tests"] or [{}])[0].get("test_text")
+            print(f"  {entry['hits']:4d} hits  {entry['state'].splitlines()[0][:70]!r} -> {first!r}")
+
+    lookups_path = directory / "lookups.jsonl"
+    if not lookups_path.exists():
+        print("No lookups logged")
+        return
+    with lookups_path.open("r", encoding="utf-8") as f:
+        lookups = [json.loads(line) for line in f if line.strip()]
+    if not lookups:
+        print("No lookups logged")
+        return
+    sims = np.array([l["similarity"] for l in lookups])
+    print(f"\n{len(lookups)} lookups, {sum(l['hit'] for l in lookups)} hits")
+    print("similarity percentiles: " + ", ".join(f"p{p}={np.percentile(sims, p):.3f}" for p in (10, 50, 90, 99)))
+    print("hit rate if the threshold were:")
+    for t in (0.85, 0.9, 0.93, 0.95, 0.97, 0.99):
+        print(f"  {t:.2f}: {(sims >= t).mean():.1%}")
+
+    # the pairs nearest the threshold are where a wrong hit (or a needless miss) is most likely
+    threshold = lookups[-1]["threshold"]
+    borderline = sorted((l for l in lookups if l["matched"]), key=lambda l: abs(l["similarity"] - threshold))[:show]
+    print(f"\nClosest to the threshold ({threshold}):")
+    for l in borderline:
+        print(f"--- similarity {l['similarity']:.3f} ({'hit' if l['hit'] else 'miss'})")
+        print("  query:   " + l["state"].replace("\n", "\n           "))
+        print("  matched: " + l["matched"].replace("\n", "\n           "))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Inspect the diagnostics turn cache")
+    sub = p.add_subparsers(dest="command", required=True)
+    ins = sub.add_parser("inspect")
+    ins.add_argument("--dir", type=str, required=True, help="Turn cache directory")
+    ins.add_argument("--show", type=int, default=5, help="Number of entries / lookup pairs to print")
+    args = p.parse_args()
+    if args.command == "inspect":
+        inspect(Path(args.dir), args.show)
+
+
+if __name__ == "__main__":
+    main()
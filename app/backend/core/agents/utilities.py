@@ -1,6 +1,16 @@
 import json
 import re
-from typing import Any, Dict, List
+from collections import Counter
+from typing import Any, Dict, List, Optional, Union, get_args, get_origin, get_type_hints, is_typeddict
+from core.metrics import CallbackCounter
+
+
+# How often each parse path in parse_llm_json is taken, per source (agent)
+PARSE_STATS: Dict[str, Counter] = {}
+CallbackCounter(
+    "dashtech_llm_parse_total", "LLM output parses by agent and the path taken (failed = unparseable).", ("agent", "path"),
+    lambda: {(source, path): n for source, paths in list(PARSE_STATS.items()) for path, n in list(paths.items())},
+)
 
 # ----- UTILITIES -----
 def _jd(x) -> str:
@@ -8,25 +18,29 @@ def _jd(x) -> str:
     return json.dumps(x, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
 
 
-def parse_llm_json(output_text: str) -> Dict[str, Any]:
+def parse_llm_json(output_text: str, source: str = "unknown") -> Dict[str, Any]:
     """
     Parse an LLM response that is intended to be JSON into a Python dict.
 
     This helper is resilient to common LLM formatting quirks:
     - Surrounding prose before/after the JSON block
     - Markdown code fences (``` or ```json)
+    - Truncated output (unclosed strings/objects at the end)
     - Minor JSON-ish issues (trailing commas, Python booleans/None)
 
     It will try multiple strategies in order:
-    1) Direct json.loads
+    1) Direct json.loads (the normal path with schema-constrained output)
     2) Strip markdown code fences and retry
     3) Extract substring from first '{' to last '}' and retry
-    4) Progressive truncation from the end to find the largest valid JSON
+    4) Single-pass scan for the outermost balanced object (closing it if the output was truncated)
     5) Light normalization (booleans/None, trailing commas, naive quote fix) and retry
 
+    The path taken is counted in PARSE_STATS[source].
     Raises ValueError if it cannot produce a dict.
     """
+    stats = PARSE_STATS.setdefault(source, Counter())
     if output_text is None:
+        stats["failed"] += 1
         raise ValueError("parse_llm_json: output_text is None")
 
     text = str(output_text).strip()
@@ -43,6 +57,7 @@ def parse_llm_json(output_text: str) -> Dict[str, Any]:
     # 1) Direct parse
     parsed = _try_parse(text)
     if parsed is not None:
+        stats["direct"] += 1
         return parsed
 
     # 2) Strip code fences if present
@@ -51,6 +66,7 @@ def parse_llm_json(output_text: str) -> Dict[str, Any]:
         fenced = fence_match.group(1).strip()
         parsed = _try_parse(fenced)
         if parsed is not None:
+            stats["fenced"] += 1
             return parsed
         text = fenced  # continue attempts using the inside of the fence
 
@@ -58,16 +74,18 @@ def parse_llm_json(output_text: str) -> Dict[str, Any]:
     first = text.find("{")
     last = text.rfind("}")
     if first != -1 and last != -1 and last > first:
-        candidate = text[first:last + 1]
-        parsed = _try_parse(candidate)
+        parsed = _try_parse(text[first:last + 1])
         if parsed is not None:
+            stats["span"] += 1
             return parsed
 
-        # 4) Progressive truncation from the end
-        for idx in range(last, first, -1):
-            parsed = _try_parse(text[first:idx])
-            if parsed is not None:
-                return parsed
+    # 4) Outermost balanced object, in one pass
+    candidate = scan_balanced_object(text)
+    if candidate is not None:
+        parsed = _try_parse(candidate)
+        if parsed is not None:
+            stats["balanced_scan"] += 1
+            return parsed
 
         # 5) Light normalization and retry
         def _normalize_jsonish(s: str) -> str:
@@ -82,38 +100,90 @@ def parse_llm_json(output_text: str) -> Dict[str, Any]:
                 s = s.replace("'", '"')
             return s
 
-        normalized = _normalize_jsonish(candidate)
-        parsed = _try_parse(normalized)
+        parsed = _try_parse(_normalize_jsonish(candidate))
         if parsed is not None:
+            stats["normalised"] += 1
             return parsed
 
     # If we get here, we failed all attempts
+    stats["failed"] += 1
     raise ValueError("Failed to parse LLM output as a JSON object (dict)")
 
 
+def scan_balanced_object(text: str) -> Optional[str]:
+    """
+    Return the outermost balanced {...} object starting at the first '{' in `text`, in a single linear pass.
+    String literals (and escapes inside them) are skipped. If the text ends before the object closes
+    (truncated output), open strings and containers are closed so the result can still be parsed.
+    Returns None if there is no '{'.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if stack and stack[-1] == ch:
+                stack.pop()
+            if not stack:
+                return text[start:i + 1]
+
+    # truncated: close whatever is still open
+    tail = text[start:]
+    if escaped:
+        tail = tail[:-1]
+    if in_string:
+        tail += '"'
+    tail = re.sub(r"[,:\s]+$", "", tail)
+    return tail + "".join(reversed(stack))
+
+
+def typeddict_schema(td: Any) -> Dict[str, Any]:
+    """
+    Derive a JSON schema (as accepted by Ollama's `format`) from a TypedDict or typing annotation.
+    Supports str/int/float/bool/Any, List[...], Dict[str, ...], Optional/Union and nested TypedDicts.
+    """
+    if is_typeddict(td):
+        hints = get_type_hints(td)
+        return {
+            "type": "object",
+            "properties": {name: typeddict_schema(hint) for name, hint in hints.items()},
+            "required": sorted(td.__required_keys__),
+        }
+
+    origin = get_origin(td)
+    args = get_args(td)
+    if origin in (list, List):
+        return {"type": "array", "items": typeddict_schema(args[0]) if args else {}}
+    if origin in (dict, Dict):
+        return {"type": "object", "additionalProperties": typeddict_schema(args[1]) if len(args) == 2 else {}}
+    if origin is Union or (origin is not None and str(origin) == "types.UnionType"):
+        options = [typeddict_schema(a) for a in args if a is not type(None)]
+        return options[0] if len(options) == 1 else {"anyOf": options}
+
+    return {
+        str: {"type": "string"},
+        int: {"type": "integer"},
+        float: {"type": "number"},
+        bool: {"type": "boolean"},
+    }.get(td, {})
 
 
 def lookup_error_code(error_code: str) -> str:
     pass
-
-
-def normalise_probabilities(probabilities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    if not probabilities:
-        return probabilities
-    
-    # Calculate the sum of all probabilities
-    total = sum(prob.get("probability", 0) for prob in probabilities)
-    
-    # If total is 0 or very close to 0, return equal probabilities
-    if total <= 1e-10:
-        equal_prob = 1.0 / len(probabilities)
-        return [
-            {**prob, "probability": equal_prob}
-            for prob in probabilities
-        ]
-    
-    # Normalize each probability by dividing by the total
-    return [
-        {**prob, "probability": prob.get("probability", 0) / total}
-        for prob in probabilities
-    ]
\ No newline at end of file
@@ -0,0 +1,178 @@
+from __future__ import annotations
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from collections import OrderedDict
+from pathlib import Path
+import asyncio, hashlib, json, re, time
+
+
+CACHE_MODES = ("off", "cache", "record", "replay")
+REPLAY_TIMINGS = ("collapsed", "preserved")
+
+# profiles whose prompts repeat verbatim in production and are safe to serve from the cache
+# (warmup is left out on purpose: its point is to make Ollama load the model)
+DEFAULT_CACHED_PROFILES: Set[str] = {"communications"}
+
+# generated ids (tests, issues) differ on every run; they are masked so recorded sessions replay
+_UUID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+# options that do not change the generated text (num_ctx only matters if the prompt would be truncated)
+_IGNORED_OPTIONS = {"num_ctx"}
+
+
+class CacheMiss(KeyError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+
+"""
+ResponseCache
+Exact-match cache of streamed LLM responses, keyed by (model, normalised messages, generation options, think, format).
+Entries keep every chunk with its delay after the previous one, so a replay can reproduce the original timing
+or collapse it. Modes:
+- off:    never used
+- cache:  serve hits and store misses, for the profiles in `profiles` only (production)
+- record: always generate and store every response (all profiles)
+- replay: serve every response from the cache; a miss raises CacheMiss (deterministic sessions with no model)
+With `path` set, entries are appended to a JSONL file and loaded again on start.
+"""
+class ResponseCache:
+    def __init__(
+        self,
+        mode: str = "cache",
+        path: Optional[str | Path] = None,
+        max_entries: int = 512,
+        timing: str = "collapsed",
+        profiles: Optional[Set[str]] = None,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}' (expected one of {', '.join(CACHE_MODES)})")
+        if timing not in REPLAY_TIMINGS:
+            raise ValueError(f"Unknown replay timing '{timing}' (expected one of {', '.join(REPLAY_TIMINGS)})")
+        self.mode = mode
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        self.timing = timing
+        self.profiles = set(DEFAULT_CACHED_PROFILES if profiles is None else profiles)
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lines_on_disk = 0
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        if self.path is not None:
+            self.load()
+
+    # ---- keys ----
+    def applies(self, profile: str) -> bool:
+        if self.mode == "off":
+            return False
+        if self.mode == "cache":
+            return profile in self.profiles
+        return True
+
+    @staticmethod
+    def key(
+        model: str,
+        messages: List[Dict[str, Any]],
+        options: Dict[str, Any],
+        think: bool,
+        format: Optional[Dict[str, Any] | str] = None,
+    ) -> str:
+        normalised = [
+            {"role": m.get("role"), "content": _normalise_text(m.get("content") or "")}
+            for m in messages
+        ]
+        payload = {
+            "model": model,
+            "messages": normalised,
+            "options": {k: v for k, v in sorted(options.items()) if k not in _IGNORED_OPTIONS},
+            "think": bool(think),
+            "format": format,
+        }
+        blob = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    # ---- lookup / store ----
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry
+
+    def put(self, key: str, chunks: List[Tuple[float, Dict[str, Any]]], model: str, profile: str) -> None:
+        entry = {
+            "key": key,
+            "model": model,
+            "profile": profile,
+            "created": time.time(),
+            "chunks": [[round(delay, 4), chunk] for delay, chunk in chunks],
+        }
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self.stats["stores"] += 1
+        self._evict()
+        if self.path is not None:
+            self._append(entry)
+
+    async def replay(self, entry: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the recorded chunks, sleeping for the recorded delays when timing is 'preserved'."""
+        for delay, chunk in entry["chunks"]:
+            if self.timing == "preserved" and delay > 0:
+                await asyncio.sleep(delay)
+            chunk = dict(chunk)
+            if chunk.get("metrics"):
+                chunk["metrics"] = {**chunk["metrics"], "cached": True}
+            yield chunk
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    # ---- persistence ----
+    def load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        lines = 0
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue # a torn final line from an interrupted write
+                self._entries[entry["key"]] = entry
+                self._entries.move_to_end(entry["key"])
+        self._lines_on_disk = lines
+        self._evict()
+        print(f"Loaded {len(self._entries)} cached LLM responses from {self.path}", flush=True)
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        # rewrite the file once it holds mostly superseded/evicted entries, otherwise append
+        if self._lines_on_disk >= 2 * self.max_entries:
+            self.save()
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._lines_on_disk += 1
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        tmp.replace(self.path)
+        self._lines_on_disk = len(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _normalise_text(text: str) -> str:
+    # line endings and trailing whitespace do not change what the model sees in any meaningful way
+    text = _UUID.sub("<id>", text.replace("\r\n", "\n"))
+    return re.sub(r"[ \t]+\n", "\n", text).strip()
@@ -1,11 +1,24 @@
-from typing import Any, Dict, List, Set, Optional, Tuple, Union
+from typing import Any, Awaitable, Callable, Dict, List, Set, Optional, Tuple, Union
+from collections import OrderedDict, deque
 from enum import Enum
-import uuid, datetime, asyncio
+from pathlib import Path
+from types import FunctionType, MethodType, ModuleType
+import uuid, datetime, asyncio, json, sys, time
 from fastapi import WebSocket
 from core.agents.diagnostics import LLMDiagnosticsAgent, DiagnosisProbability, Test
+from core.agents.probability import ProbabilityEngine
+from core.agents.fault_codes import load_fault_code_index, seed_hypotheses, first_test
+from core.agents.speculation import Speculator
+from core.agents.turn_cache import TurnCache
 from core.agents.communications import CommunicationsAgent
-from core.llm import LLMClient
+from core.agents.maintainence import MaintainenceAgent
+from core.llm import LLMClient, LLMPriority, generation_owner
 from core.schemas import InboundMessage
+from core import metrics
+
+
+# streamed while a generation runs and superseded by the result: numbered, but not kept for replay
+TRANSIENT_EVENTS = {"llm.thinking"}
 
 
 class IssueProgress(Enum):
@@ -14,8 +27,69 @@ class IssueProgress(Enum):
     CLOSED = "closed"
 
 
+
+"""
+RecentIds
+Time- and size-bounded window of recently seen event ids, for idempotent ingest. A retried message arrives within
+seconds of the original, so remembering ids for `ttl_seconds` (and at most `max_size` of them) dedupes just as
+well as a set that grows for the lifetime of the issue.
+"""
+class RecentIds:
+    def __init__(self, max_size: int = 512, ttl_seconds: float = 600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._ids: "OrderedDict[str, float]" = OrderedDict() # id -> first seen (monotonic), oldest first
+
+    def seen(self, eid: str) -> bool:
+        """True if `eid` was seen within the window; otherwise remember it and return False."""
+        now = time.monotonic()
+        while self._ids and now - next(iter(self._ids.values())) > self.ttl_seconds:
+            self._ids.popitem(last=False)
+        if eid in self._ids:
+            return True
+        self._ids[eid] = now
+        if len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+        return False
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+# never followed when sizing an issue: code, and the event loop every asyncio primitive points at
+_UNSIZED = (type, ModuleType, FunctionType, MethodType, asyncio.AbstractEventLoop, asyncio.Future)
+
+
+def _deep_sizeof(obj: Any, seen: Set[int]) -> int:
+    """
+    Approximate bytes held by `obj` and everything reachable from it (containers and object attributes) whose id is
+    not in `seen`; adds what it visits to `seen`, so shared objects can be excluded up front and parts don't overlap.
+    """
+    total, stack = 0, [obj]
+    while stack:
+        o = stack.pop()
+        if o is None or id(o) in seen or isinstance(o, _UNSIZED):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o, 0) # numpy arrays include their buffer
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            stack.extend(o)
+        elif not isinstance(o, (str, bytes, bytearray)) and hasattr(o, "__dict__"):
+            stack.extend(vars(o).values())
+    return total
+
+
 class IssueContext:
-    def __init__(self, llm_client: LLMClient):
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        turn_cache: Optional[TurnCache] = None,
+        plan_library: Optional[Any] = None,
+        issue_params: Optional[Dict[str, Any]] = None, # overrides of the defaults below, applied before anything is sized by them
+    ):
         self.id: str = str(uuid.uuid4())
         self.created_at: str = datetime.datetime.utcnow().isoformat()
         self.progress: IssueProgress = IssueProgress.ACTIVE
@@ -24,7 +98,11 @@ class IssueContext:
         self._q: asyncio.Queue[Dict[str, Any]] = asyncio.Queue()
         self._state_lock: asyncio.Lock = asyncio.Lock()
         self._result_event = asyncio.Event()
-        self._seen_event_ids: Set[str] = set()
+        self._seen_event_ids = RecentIds() # bounded: the backend runs for weeks
+        self.last_activity: float = time.monotonic() # last inbound message or (re)connection
+        self.closed_at: Optional[str] = None
+        self.close_reason: Optional[str] = None
+        self.on_close: Optional[Callable[["IssueContext", str], Awaitable[None]]] = None # set by the IssueManager
 
         self._handlers = self.register_handlers()
 
@@ -34,19 +112,44 @@ class IssueContext:
         # Manage connection
         self.connection: Optional[WebSocket] = None
         self._send_lock: asyncio.Lock = asyncio.Lock()
+        self._disconnect_task: Optional[asyncio.Task] = None
+        self._disconnected: bool = False # set once the disconnect grace period expired; pauses LLM work
 
 
         # Manage agents & agent loop
         self.issue_params = { # parameters for the issue
             "probability_threshold": 0.9,
+            "speculation": True, # precompute the next turn for likely outcomes while a test is performed
+            "fault_code_fast_path": True, # seed hypotheses and the first test from dashboard fault codes in the description
+            "maintenance_prefetch_threshold": 0.6, # start preparing the repair plan once the leader is this likely
+            "disconnect_grace_seconds": 30, # cancel in-flight generations if the client stays away this long
+            "idle_timeout_seconds": 1800, # close (and archive) the issue after this long without a message from the technician
+            "resolved_timeout_seconds": 600, # ...or this long once the repair plan has been delivered
+            "event_buffer_size": 500, # recent events kept for replay when a client reattaches (older gaps get a snapshot)
         }
+        self.issue_params.update(issue_params or {})
+
+        # Outbound event log: every envelope is numbered, the recent ones are kept so a reattaching client can catch up
+        self._seq: int = 0
+        self._events: deque = deque(maxlen=self.issue_params["event_buffer_size"])
+        self._evicted_seq: int = 0 # seq of the newest event that fell out of the buffer
+        self._last_test_event: Optional[Dict[str, Any]] = None # the diagnostics.test envelope for the pending test
         self.run_status: "pending" | "diagnostics" | "maintenance" | "resolved" = "pending"
 
+        self.llm_client = llm_client
+
         # Diagnostics Attributes
-        self.diagnostics_agent = LLMDiagnosticsAgent(llm_client)
+        self.diagnostics_agent = LLMDiagnosticsAgent(llm_client, turn_cache=turn_cache)
         self.active_diagnosis: DiagnosisProbability | None = None # stores the current diagnosis if one is set (none if still diagnosing)
-        self.diagnosis_probabilities: List[DiagnosisProbability] = [] # stores the list of diagnosis probabilities
+        self.probability_engine = ProbabilityEngine() # owns the hypothesis vector and all probability arithmetic
+        self.diagnosis_probabilities: List[DiagnosisProbability] = [] # snapshot of the engine's hypotheses (most likely first)
         self.tests_log: List[Test] = [] # stores ordered list/history of tests run
+        self.speculator = Speculator() # speculative next turns for the pending test
+
+        # Maintenance Attributes
+        self.maintenance_agent = MaintainenceAgent(llm_client, plan_library=plan_library)
+        self.maintenance_plan: Dict[str, Any] | None = None # the repair plan for the active diagnosis
+        self._maintenance_prefetch: Dict[str, Any] | None = None # {"hypothesis_id", "diagnosis", "task"} for the current leader
 
         # Communications Attributes
         self.communications_agent = CommunicationsAgent(llm_client, self.id, self.emit)
@@ -55,18 +158,24 @@ class IssueContext:
         """
         Send a JSON message to the connected client, if any.
         """
+        async with self._send_lock:
+            await self._deliver(message)
+
+    async def _deliver(self, message: Dict[str, Any]) -> None:
+        # caller holds _send_lock
         if self.connection is None:
             return
-        async with self._send_lock:
-            try:
-                await self.connection.send_json(message)
-            except Exception:
-                # If send fails, drop the connection reference
-                self.connection = None
+        try:
+            await self.connection.send_json(message)
+        except Exception:
+            # If send fails, drop the connection reference
+            self.connection = None
+            self.connection_lost()
 
     async def emit(self, type: str, payload: Dict[str, Any]) -> None:
         """
         Construct and send a simple event envelope to the client.
+        Envelopes are numbered (`seq`) and kept in the replay buffer even while no client is connected.
         """
         envelope: Dict[str, Any] = {
             "type": type,
@@ -77,7 +186,64 @@ class IssueContext:
                 "timestamp": datetime.datetime.utcnow().isoformat(),
             },
         }
-        await self.send(envelope)
+        async with self._send_lock: # numbering, buffering and sending in one step keeps the wire in seq order
+            self._seq += 1
+            envelope["seq"] = self._seq
+            if type not in TRANSIENT_EVENTS:
+                if len(self._events) == self._events.maxlen:
+                    self._evicted_seq = self._events[0]["seq"]
+                self._events.append(envelope)
+            if type == "diagnostics.test":
+                self._last_test_event = envelope
+            await self._deliver(envelope)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Compact current state for a client that missed more events than the replay buffer holds: enough to redraw
+        the hypotheses, the tests so far and the test (or repair plan) the technician should be looking at.
+        """
+        engine = self.probability_engine
+        pending = self.tests_log[-1] if self.tests_log and self.tests_log[-1].get("result") is None else None
+        pending_event = self._last_test_event
+        if pending is None or pending_event is None or pending_event["payload"].get("id") != pending.get("id"):
+            pending_event = None
+        return {
+            "issue_id": self.id,
+            "seq": self._seq,
+            "created_at": self.created_at,
+            "progress": self.progress.value,
+            "run_status": self.run_status,
+            "tests": [
+                {"id": t.get("id"), "text": t.get("test_text") or t.get("name") or t.get("description"), "result": t.get("result")}
+                for t in self.tests_log
+            ],
+            "probabilities": self.diagnosis_probabilities,
+            "entropy": engine.entropy() if engine is not None and self.diagnosis_probabilities else None,
+            "active_diagnosis": self.active_diagnosis,
+            "pending_test": pending_event["payload"] if pending_event else None,
+            "maintenance_plan": self.maintenance_plan,
+        }
+
+    async def attach(self, connection: WebSocket, last_seq: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Resume a client on a new connection. Sends issue.attached, then every buffered event after `last_seq`, or an
+        issue.snapshot when the client has no position or some of what it missed already left the buffer. Nothing
+        else is sent in between, so the client sees one gap-free sequence. Returns the issue.attached payload.
+        """
+        async with self._send_lock:
+            resync = last_seq is None or last_seq < self._evicted_seq or last_seq > self._seq
+            missed = [] if resync else [e for e in self._events if e["seq"] > last_seq]
+            self.connection = connection
+            attached = {"issue_id": self.id, "seq": self._seq, "replayed": len(missed), "snapshot": resync}
+            await self._deliver({"type": "issue.attached", "v": 1, "issue_id": self.id, "payload": attached})
+            if resync:
+                await self._deliver({"type": "issue.snapshot", "v": 1, "issue_id": self.id, "seq": self._seq, "payload": self.snapshot()})
+            for envelope in missed:
+                await self._deliver(envelope)
+        if self.connection is connection:
+            self.connection_restored()
+        print(f"Client reattached at seq {last_seq}: replayed {len(missed)} event(s){', sent snapshot' if resync else ''}", flush=True)
+        return attached
 
 
     async def _run_issue_loop(self) -> None:
@@ -93,20 +259,25 @@ class IssueContext:
                         await asyncio.sleep(0.05)
                         continue
 
-                    if self.tests_log[-1].get("result") is None:
-                        # Waiting for the most recent test result; yield control
+                    if self.tests_log[-1].get("result") is None or self._disconnected:
+                        # Waiting for the most recent test result (or for the client to come back); yield control
                         await asyncio.sleep(0.05)
                         continue
 
                     # Run the diagnostics agent to update probabilities and obtain next test
                     # notify UI that diagnostics step is in progress
                     await self.emit("diagnostics.loading", {"status": "started"})
+                    turn_started = time.perf_counter()
+                    self._turn_task = asyncio.create_task(self._run_diagnostics_turn(), name=f"turn-{self.id}")
                     try:
-                        self.diagnosis_probabilities, next_test = await self.diagnostics_agent.run(
-                            self.diagnosis_probabilities,
-                            self.tests_log,
-                            on_thinking=lambda text: self.emit("llm.thinking", {"text": text}),
-                        )
+                        self.diagnosis_probabilities, next_test = await self._turn_task
+                    except asyncio.CancelledError:
+                        if asyncio.current_task().cancelling():
+                            self._turn_task.cancel()
+                            raise
+                        # turn was superseded by a newer result or cancelled on disconnect; re-evaluate
+                        await self.emit("diagnostics.loading", {"status": "completed"})
+                        continue
                     except Exception as e:
                         await self.emit("diagnostics.loading", {"status": "completed"})
                         await self.emit("diagnostics.error", {"message": str(e)})
@@ -114,23 +285,46 @@ class IssueContext:
                         await asyncio.sleep(0.1)
                         continue
                     await self.emit("diagnostics.loading", {"status": "completed"})
+                    turn_finished = time.perf_counter()
+                    last_turn = self.diagnostics_agent.last_turn
+                    await self.emit("diagnostics.probabilities", {
+                        "probabilities": self.diagnosis_probabilities,
+                        "entropy": self.probability_engine.entropy(),
+                        "source": last_turn.get("source"),
+                        "cached": last_turn.get("source") == "cache",
+                    })
                     print(f"Probabilities Updated: {self.diagnosis_probabilities}", flush=True)
                     print(f"Next Test: {next_test}", flush=True)
 
-                    # Monitor probabilities to see if any are above the probability threshold
-                    for potential_diagnosis in self.diagnosis_probabilities:
-                        if potential_diagnosis.get("probability") > self.issue_params.get("probability_threshold"):
-                            self.active_diagnosis = potential_diagnosis
-                            self.run_status = "maintenance"
-                            break
+                    # Check whether the leading hypothesis is above the probability threshold
+                    leader = self.probability_engine.above_threshold(self.issue_params.get("probability_threshold"))
+                    if leader is not None:
+                        self.active_diagnosis = leader
+                        self.run_status = "maintenance"
+                        await self._report_turn_latency(last_turn, turn_started, turn_finished)
+                        continue
+
+                    # Start (or drop) the background repair plan for the current leader
+                    self._update_maintenance_prefetch()
 
                     # Prepare the next test and notify UI
                     self.tests_log.append(next_test)  # add the next test to the tests_log
-                    await self.communications_agent.communicate_test(next_test)
+                    await self.communications_agent.communicate_test(
+                        next_test,
+                        cached=last_turn.get("source") == "cache",
+                        cache_similarity=last_turn.get("similarity"),
+                    )
+                    await self._report_turn_latency(last_turn, turn_started, turn_finished, time.perf_counter())
+
+                    # Fold older tests into the running summary while the technician is busy
+                    self.diagnostics_agent.compactor.maybe_fold(self.tests_log[:-1], self.probability_engine)
+
+                    # Use the technician's time on the test to precompute likely next turns
+                    if self.run_status == "diagnostics" and self.issue_params.get("speculation"):
+                        self.speculator.start(self.diagnostics_agent, self.probability_engine, self.tests_log, next_test)
 
                 elif self.run_status == "maintenance":
-                    # Placeholder: implement maintenance behavior; yield meanwhile
-                    await asyncio.sleep(0.05)
+                    await self._run_maintenance()
 
                 elif self.run_status == "resolved":
                     # Nothing more to do, but keep loop alive until stop()
@@ -142,19 +336,150 @@ class IssueContext:
         except asyncio.CancelledError:
             # Graceful task cancellation on stop()
             pass
+        finally:
+            self.speculator.cancel()
+            self.diagnostics_agent.compactor.cancel()
+            self._discard_maintenance_prefetch()
+
+    async def _run_diagnostics_turn(self) -> Tuple[List[DiagnosisProbability], Test]:
+        """
+        Produce the next diagnostics turn, adopting a speculative result when one matches the submitted outcome.
+        """
+        branch = await self.speculator.take(self.tests_log[-1])
+        if self.issue_params.get("speculation"):
+            await self.emit("diagnostics.speculation", {"hit": branch is not None, **self.speculator.report()})
+        if branch is not None:
+            self.probability_engine = branch.engine
+            self.diagnostics_agent.adopt(branch.agent)
+            self.diagnostics_agent.last_turn = {**self.diagnostics_agent.last_turn, "speculated": True}
+            await self.diagnostics_agent.commit_turn() # only adopted branches reach the shared turn cache
+            return branch.task.result()
+
+        # run against a copy so a cancelled turn leaves the hypotheses untouched
+        engine = self.probability_engine.copy()
+        result = await self.diagnostics_agent.run(
+            engine,
+            self.tests_log,
+            on_thinking=lambda text: self.emit("llm.thinking", {"text": text}),
+            on_partial=self.communications_agent.communicate_partial,
+        )
+        self.probability_engine = engine
+        return result
+
+
+    async def _report_turn_latency(
+        self, last_turn: Dict[str, Any], started: float, finished: float, communicated: Optional[float] = None,
+    ) -> None:
+        """
+        Record the turn in the /metrics histograms and send its latency breakdown to the client.
+        A speculated turn only cost the wait for the speculation; its LLM timings were spent while the test was performed.
+        """
+        source = "speculation" if last_turn.get("speculated") else (last_turn.get("source") or "unknown")
+        end = communicated if communicated is not None else finished
+        metrics.TURNS.inc(source=source)
+        metrics.TURN_DURATION.observe(end - started, source=source)
+        metrics.TURN_STAGE.observe(finished - started, stage="turn")
+        if communicated is not None:
+            metrics.TURN_STAGE.observe(communicated - finished, stage="communicate")
+
+        llm = last_turn.get("metrics") if last_turn.get("source") == "llm" else None
+        await self.emit("diagnostics.latency", {
+            "source": source,
+            "turn_seconds": round(finished - started, 3),
+            "communicate_seconds": round(communicated - finished, 3) if communicated is not None else None,
+            "total_seconds": round(end - started, 3),
+            "llm": {
+                key: llm.get(key) for key in (
+                    "model", "queue_wait_seconds", "ttft_seconds", "load_seconds", "prompt_eval_seconds",
+                    "eval_seconds", "prompt_eval_count", "eval_count", "tokens_per_second", "prefix_shared", "cached",
+                )
+            } if llm else None,
+        })
+
+    def _update_maintenance_prefetch(self) -> None:
+        """
+        Prepare the repair plan in the background once the leading hypothesis is likely enough.
+        The plan is keyed by hypothesis and discarded whenever the leader changes or drops below the threshold.
+        """
+        leader = self.probability_engine.leader()
+        if leader is None or leader["probability"] < self.issue_params.get("maintenance_prefetch_threshold"):
+            self._discard_maintenance_prefetch()
+            return
+
+        current = self._maintenance_prefetch
+        if current is not None and current["hypothesis_id"] == leader["id"] and not current["task"].cancelled():
+            return # already prepared (or preparing) for this leader
+
+        # new leader, or the previous attempt was preempted by a foreground request: (re)start
+        self._discard_maintenance_prefetch()
+        print(f"Prefetching maintenance plan for: {leader['diagnosis']}", flush=True)
+        task = asyncio.create_task(
+            self.maintenance_agent.run(
+                self.tests_log[:1],
+                leader,
+                self.tests_log[1:],
+                priority=LLMPriority.PREFETCH,
+            ),
+            name=f"maintenance-prefetch-{self.id}",
+        )
+        self._maintenance_prefetch = {"hypothesis_id": leader["id"], "diagnosis": leader["diagnosis"], "task": task}
+
+    def _discard_maintenance_prefetch(self) -> None:
+        prefetch, self._maintenance_prefetch = self._maintenance_prefetch, None
+        if prefetch is None:
+            return
+        task = prefetch["task"]
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled():
+            task.exception() # retrieve so a failed prefetch is not reported as never retrieved
+
+    async def _run_maintenance(self) -> None:
+        """
+        Produce the repair plan for the active diagnosis, reusing the prefetched plan when it matches.
+        """
+        diagnosis = self.active_diagnosis
+        await self.emit("maintenance.loading", {"status": "started"})
+        try:
+            plan = None
+            prefetch = self._maintenance_prefetch
+            if prefetch is not None and prefetch["hypothesis_id"] == diagnosis.get("id") and not prefetch["task"].cancelled():
+                self.llm_client.scheduler.promote(prefetch["task"], LLMPriority.FOREGROUND)
+                try:
+                    plan = await prefetch["task"]
+                    print("Using prefetched maintenance plan", flush=True)
+                except asyncio.CancelledError:
+                    if asyncio.current_task().cancelling():
+                        raise
+                    plan = None # prefetch was preempted; generate it now
+                except Exception as e:
+                    print(f"Maintenance prefetch failed: {e}", flush=True)
+                    plan = None
+            self._discard_maintenance_prefetch()
+
+            if plan is None:
+                plan = await self.maintenance_agent.run(self.tests_log[:1], diagnosis, self.tests_log[1:])
+        except Exception as e:
+            await self.emit("maintenance.loading", {"status": "completed"})
+            await self.emit("maintenance.error", {"message": str(e)})
+            self.run_status = "resolved"
+            return
 
+        self.maintenance_plan = plan
+        await self.emit("maintenance.loading", {"status": "completed"})
+        await self.communications_agent.talk(f"Diagnosis: {diagnosis.get('diagnosis')}")
+        await self.emit("maintenance.plan", {"diagnosis": diagnosis, "plan": plan})
+        self.run_status = "resolved"
 
     async def _run_events_loop(self) -> None:
         while self.progress == IssueProgress.ACTIVE:
             msg = await self._q.get()  # you enqueued dicts via ingest()
 
             try:
-                # Idempotency: skip if we've seen this id before
+                # Idempotency: skip if we've seen this id recently
                 eid = msg.get("id")
-                if eid and eid in self._seen_event_ids:
+                if eid and self._seen_event_ids.seen(eid):
                     continue
-                if eid:
-                    self._seen_event_ids.add(eid)
 
                 etype = msg.get("type")
                 payload = msg.get("payload", {})
@@ -175,12 +500,20 @@ class IssueContext:
         self.progress = IssueProgress.CLOSED
 
     def start(self) -> None:
-        self._issue_task = asyncio.create_task(self._run_issue_loop(), name=f"issue-{self.id}")
-        self._events_task = asyncio.create_task(self._run_events_loop(), name=f"events-{self.id}")
+        # tag every generation started from these tasks (and the tasks they spawn) with this issue
+        token = generation_owner.set(self.id)
+        try:
+            self._issue_task = asyncio.create_task(self._run_issue_loop(), name=f"issue-{self.id}")
+            self._events_task = asyncio.create_task(self._run_events_loop(), name=f"events-{self.id}")
+        finally:
+            generation_owner.reset(token)
 
     async def stop(self) -> None:
         if self.progress == IssueProgress.ACTIVE:
             self.progress = IssueProgress.CLOSING
+        self.llm_client.cancel(owner=self.id, reason="issue_stopped")
+        if self._disconnect_task is not None:
+            self._disconnect_task.cancel()
         self._q.put_nowait({"type": "resolve_issue", "payload": {}, "id": str(uuid.uuid4()), "ts": datetime.datetime.utcnow().isoformat(), "source": "system"})
         for t in (getattr(self, "_issue_task", None), getattr(self, "_events_task", None)):
             if t:
@@ -190,6 +523,85 @@ class IssueContext:
                 except asyncio.CancelledError:
                     pass
         self.progress = IssueProgress.CLOSED
+        self.llm_client.usage.pop(self.id, None)
+
+    def release(self) -> None:
+        """
+        Drop everything a closed issue holds (agents and their histories, hypotheses, the tests log, queued events)
+        so nothing lingers while the route or client still references the context. Call after stop().
+        """
+        if self._disconnect_task is not None:
+            self._disconnect_task.cancel()
+            self._disconnect_task = None
+        self.speculator.cancel()
+        self.diagnostics_agent.compactor.cancel()
+        self._discard_maintenance_prefetch()
+        self._handlers = {}
+        self._q = asyncio.Queue()
+        self._seen_event_ids = RecentIds()
+        self._events.clear()
+        self._last_test_event = None
+        self._turn_task = self._issue_task = self._events_task = None
+        self.diagnostics_agent = self.maintenance_agent = self.communications_agent = None
+        self.probability_engine = self.speculator = None
+        self.tests_log, self.diagnosis_probabilities = [], []
+        self.active_diagnosis = self.maintenance_plan = None
+
+    def request_close(self, reason: str) -> None:
+        """Ask the IssueManager to close, archive and release this issue (without waiting for it)."""
+        if self.progress == IssueProgress.ACTIVE and self.on_close is not None:
+            self._close_task = asyncio.create_task(self.on_close(self, reason), name=f"close-{self.id}")
+
+    def idle_reason(self) -> Optional[str]:
+        """Why the issue should be closed for inactivity ("idle" or "resolved"), or None."""
+        idle = time.monotonic() - self.last_activity
+        if self.run_status == "resolved" and idle > self.issue_params.get("resolved_timeout_seconds"):
+            return "resolved"
+        if idle > self.issue_params.get("idle_timeout_seconds"):
+            return "idle"
+        return None
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Approximate bytes held by this issue, by part. State shared with other issues (LLM client, turn cache,
+        connection) is excluded.
+        """
+        shared = (self.llm_client, self.connection, getattr(self.diagnostics_agent, "turn_cache", None), getattr(self.maintenance_agent, "plan_library", None))
+        seen = {id(o) for o in (self, *shared)}
+        parts = {
+            "tests_log": [self.tests_log],
+            "hypotheses": [self.probability_engine, self.diagnosis_probabilities, self.active_diagnosis],
+            "diagnostics_agent": [self.diagnostics_agent],
+            "speculation": [self.speculator],
+            "maintenance": [self.maintenance_agent, self.maintenance_plan, self._maintenance_prefetch],
+            "events": [self._q, self._seen_event_ids, self._events, self._last_test_event],
+        }
+        usage = {part: sum(_deep_sizeof(o, seen) for o in objs) for part, objs in parts.items()}
+        usage["total"] = sum(usage.values())
+        return usage
+
+    def archive_record(self) -> Dict[str, Any]:
+        """Compact summary of the issue for the on-disk archive: what was asked, answered and concluded."""
+        engine = self.probability_engine
+        return {
+            "id": self.id,
+            "created_at": self.created_at,
+            "closed_at": self.closed_at,
+            "close_reason": self.close_reason,
+            "run_status": self.run_status,
+            "tests": [
+                {"id": t.get("id"), "text": t.get("test_text") or t.get("name") or t.get("description"), "result": t.get("result")}
+                for t in self.tests_log
+            ],
+            "hypotheses": [
+                {"diagnosis": h.get("diagnosis"), "probability": round(float(h.get("probability") or 0), 4)}
+                for h in (self.diagnosis_probabilities or [])[:5]
+            ],
+            "entropy": round(engine.entropy(), 4) if engine is not None and self.diagnosis_probabilities else None,
+            "diagnosis": self.active_diagnosis.get("diagnosis") if self.active_diagnosis else None,
+            "maintenance_plan": self.maintenance_plan,
+            "llm_usage": self.llm_client.usage.get(self.id),
+        }
 
     
     #---- HANDLERS ----#
@@ -201,6 +613,7 @@ class IssueContext:
             "diagnostics.start": self._handle_diagnostics_start,
             "diagnostics.test_result": self._handle_diagnostics_test_result,
             "issue.begin": self._handle_issue_begin,
+            "issue.close": self._handle_issue_close,
         }
     
     async def _handle_diagnostics_test_result(self, payload: Dict[str, Any]) -> None:
@@ -209,6 +622,51 @@ class IssueContext:
     async def _handle_issue_begin(self, payload: Dict[str, Any]) -> None:
         self.run_status = "diagnostics"
         self.tests_log.append(payload)
+        if self.issue_params.get("fault_code_fast_path") and len(self.probability_engine) == 0:
+            await self._fault_code_fast_path(payload)
+
+    async def _fault_code_fast_path(self, payload: Dict[str, Any]) -> bool:
+        """
+        Seed the hypotheses from dashboard fault codes in the technician's description and send a first test taken
+        straight from the fault table, so the first instruction needs no LLM round. The LLM takes over with the
+        result of that test (and speculates on its outcomes while the technician performs it).
+        Returns False, leaving the first turn to the LLM, when the description has no known fault code.
+        """
+        started = time.perf_counter()
+        text = " ".join(str(payload.get(k) or "") for k in ("fault_code", "result"))
+        try:
+            faults = load_fault_code_index().match(text)
+        except (OSError, ValueError) as e:
+            print(f"Fault code table unavailable: {e}", flush=True)
+            return False
+        if not faults:
+            return False
+
+        # no await until the test is logged: the issue loop must not start an LLM turn on the description meanwhile
+        ids = self.probability_engine.seed(seed_hypotheses(faults))
+        test = first_test(faults, ids)
+        self.diagnosis_probabilities = self.probability_engine.as_list()
+        self.tests_log.append(test)
+        self.diagnostics_agent.last_turn = last_turn = {"source": "fault_codes"}
+        finished = time.perf_counter()
+
+        await self.emit("diagnostics.probabilities", {
+            "probabilities": self.diagnosis_probabilities,
+            "entropy": self.probability_engine.entropy(),
+            "source": "fault_codes",
+            "cached": False,
+            "fault_codes": [f"{f['system']} {f['code']}" for f in faults],
+        })
+        self._update_maintenance_prefetch()
+        await self.communications_agent.communicate_test(test)
+        await self._report_turn_latency(last_turn, started, finished, time.perf_counter())
+        if self.issue_params.get("speculation"):
+            self.speculator.start(self.diagnostics_agent, self.probability_engine, self.tests_log, test)
+        print(f"Fault code fast path: {len(faults)} fault(s), {len(ids)} hypotheses, first test in {(time.perf_counter() - started) * 1000:.1f} ms", flush=True)
+        return True
+
+    async def _handle_issue_close(self, payload: Dict[str, Any]) -> None:
+        self.request_close(payload.get("reason") or "client")
 
     async def _handle_diagnostics_start(self, payload: Dict[str, Any]) -> None:
         await self.communications_agent.talk("Hello, could you please describe the problem you are experiencing?")
@@ -224,6 +682,11 @@ class IssueContext:
         async with self._state_lock:
             for test in self.tests_log:
                 if test.get("id") == test_id:
+                    # a new answer for the test currently being processed supersedes the in-flight turn
+                    turn = getattr(self, "_turn_task", None)
+                    if test is self.tests_log[-1] and test.get("result") is not None and turn is not None and not turn.done():
+                        self.llm_client.cancel(task=turn, reason="superseded")
+                        turn.cancel()
                     test["result"] = result
                     # Wake the diagnostics loop to re-run agent logic
                     self._result_event.set()
@@ -245,6 +708,34 @@ class IssueContext:
 
         
 
+    def connection_lost(self) -> None:
+        """
+        Start the disconnect grace period; if the client does not come back in time, in-flight generations
+        for this issue are cancelled and LLM work pauses until it reconnects. A no-op once the issue is closing:
+        stop() already cancelled its generations and release() may have dropped the speculator.
+        """
+        if self.progress != IssueProgress.ACTIVE:
+            return
+        if self._disconnect_task is not None and not self._disconnect_task.done():
+            return
+        self._disconnect_task = asyncio.create_task(self._disconnect_timeout(), name=f"disconnect-{self.id}")
+
+    def connection_restored(self) -> None:
+        self.last_activity = time.monotonic()
+        if self._disconnect_task is not None:
+            self._disconnect_task.cancel()
+            self._disconnect_task = None
+        self._disconnected = False
+
+    async def _disconnect_timeout(self) -> None:
+        await asyncio.sleep(self.issue_params.get("disconnect_grace_seconds"))
+        if self.progress != IssueProgress.ACTIVE:
+            return
+        self._disconnected = True
+        self.speculator.cancel()
+        cancelled = self.llm_client.cancel(owner=self.id, reason="disconnect_timeout")
+        print(f"Client disconnected; cancelled {cancelled} in-flight generation(s)", flush=True)
+
     def ingest(self, msg: Union[InboundMessage, Dict[str, Any]]) -> None:
         """
         Source-agnostic enqueue.
@@ -252,15 +743,38 @@ class IssueContext:
         """
         ev = InboundMessage.ensure_envelope(msg)
         print(f"Ingesting message: {ev}", flush=True)
+        self.last_activity = time.monotonic()
         # If your queue expects dicts, push dicts; otherwise store the model.
         self._q.put_nowait(ev.model_dump())  # or put_nowait(ev) if you want models downstream
 
 
 
+"""
+IssueManager
+Owns the current issue and its lifecycle. Issues close when the technician asks (issue.close), after an idle
+timeout, or at shutdown; closing stops the issue's tasks, appends a compact record to the archive (one JSON line
+per issue in <archive_dir>/issues-YYYY-MM.jsonl, when a directory is configured) and releases its state, so a
+backend running for weeks holds one issue at most.
+"""
 class IssueManager:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        turn_cache: Optional[TurnCache] = None,
+        plan_library: Optional[Any] = None, # PlanLibrary of precomputed maintenance plans, shared by every issue
+        archive_dir: Optional[str | Path] = None,
+        issue_params: Optional[Dict[str, Any]] = None, # overrides of IssueContext.issue_params (e.g. idle_timeout_seconds)
+        reap_interval: float = 30,
+    ) -> None:
         self._lock = asyncio.Lock()
         self.current: Optional[IssueContext] = None
+        self.turn_cache = turn_cache # shared by every issue
+        self.plan_library = plan_library
+        self.issue_params = issue_params or {}
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        self.reap_interval = reap_interval
+        self.closed: deque = deque(maxlen=20) # summaries of recently closed issues
+        self._reaper: Optional[asyncio.Task] = None
+        self._memory: Optional[Tuple[str, Dict[str, int]]] = None # (issue id, memory_usage()) as of the last reap
         print("IssueManager initialized", flush=True)
 
     async def get_current(self) -> Optional[IssueContext]:
@@ -275,34 +789,149 @@ class IssueManager:
         Returns the issue context and a boolean indicating if a new one was created.
         """
         async with self._lock:
+            if self._reaper is None or self._reaper.done():
+                self._reaper = asyncio.create_task(self._reap(), name="issue-reaper")
             if self.current is None:
-                self.current = IssueContext(llm_client)
+                self.current = IssueContext(llm_client, turn_cache=self.turn_cache, plan_library=self.plan_library, issue_params=self.issue_params)
+                self.current.on_close = self.close_issue
                 print("Issue created", flush=True)
                 return self.current
             else:
                 print("Issue already exists", flush=True)
                 return self.current
 
-    async def set_connection(self, issue: IssueContext, connection: WebSocket):
+    async def close_issue(self, issue: IssueContext, reason: str) -> None:
         """
-        Set the connection for the issue.
+        Close an issue: notify and disconnect the client, stop its tasks, archive it and release its state.
+        """
+        async with self._lock:
+            if issue.progress != IssueProgress.ACTIVE:
+                return
+            issue.closed_at = datetime.datetime.utcnow().isoformat()
+            issue.close_reason = reason
+            memory = issue.memory_usage()["total"]
+            record = issue.archive_record() # before stop(), which drops the LLM usage
+            await issue.emit("issue.closed", {"issue_id": issue.id, "reason": reason})
+            await issue.stop()
+            connection, issue.connection = issue.connection, None
+            if connection is not None:
+                try:
+                    await connection.close(code=1000, reason="issue_closed")
+                except Exception:
+                    pass
+            issue.release()
+            if self.current is issue:
+                self.current = None
+            metrics.ISSUES_CLOSED.inc(reason=reason)
+            metrics.ISSUE_MEMORY.set(0)
+
+            archived = None
+            if self.archive_dir is not None:
+                try:
+                    archived = await asyncio.to_thread(self._archive, record)
+                except (OSError, TypeError, ValueError) as e:
+                    print(f"Failed to archive issue {issue.id}: {e}", flush=True)
+            self.closed.append({
+                "id": issue.id, "reason": reason, "closed_at": issue.closed_at, "memory_bytes": memory,
+                "tests": len(record["tests"]), "diagnosis": record["diagnosis"], "archive": str(archived) if archived else None,
+            })
+            print(f"Issue closed ({reason}): {issue.id}, released ~{memory / 1024:.0f} KiB", flush=True)
+
+    def _archive(self, record: Dict[str, Any]) -> Path:
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        path = self.archive_dir / f"issues-{(record['closed_at'] or '')[:7]}.jsonl"
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str, separators=(",", ":")) + "\n")
+        return path
+
+    async def _reap(self) -> None:
+        """Close idle issues and keep the per-issue memory gauge current."""
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            issue = self.current
+            if issue is None or issue.progress != IssueProgress.ACTIVE:
+                continue
+            reason = issue.idle_reason()
+            if reason is not None:
+                await self.close_issue(issue, reason)
+            else:
+                self._measure(issue)
+
+    async def stop(self) -> None:
+        """Shutdown: archive and release the current issue."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+        if self.current is not None:
+            await self.close_issue(self.current, "shutdown")
+
+    def _measure(self, issue: IssueContext) -> Dict[str, int]:
+        usage = issue.memory_usage()
+        self._memory = (issue.id, usage)
+        metrics.ISSUE_MEMORY.set(usage["total"])
+        return usage
+
+    def status(self, fresh_memory: bool = False) -> Dict[str, Any]:
+        """
+        Sizing an issue walks all of its state, so memory is reported as of the last reap (at most `reap_interval`
+        old) and only measured here for a new issue or when `fresh_memory` is asked for.
         """
+        issue = self.current
+        if issue is not None and (fresh_memory or self._memory is None or self._memory[0] != issue.id):
+            self._measure(issue)
+        return {
+            "current": None if issue is None else {
+                "id": issue.id,
+                "created_at": issue.created_at,
+                "progress": issue.progress.value,
+                "run_status": issue.run_status,
+                "connected": issue.connection is not None,
+                "idle_seconds": round(time.monotonic() - issue.last_activity, 1),
+                "tests": len(issue.tests_log),
+                "memory_bytes": self._memory[1],
+            },
+            "closed": list(self.closed),
+            "archive_dir": str(self.archive_dir) if self.archive_dir else None,
+            "plan_library": self.plan_library.status() if self.plan_library is not None else None,
+        }
+
+    async def _replace_connection(self, issue: IssueContext, connection: WebSocket) -> None:
         old = issue.connection
         if old is not None and old is not connection:
             try:
                 await old.close(code=1000)
             except Exception:
                 pass
+
+    async def set_connection(self, issue: IssueContext, connection: WebSocket):
+        """
+        Set the connection for the issue.
+        """
+        await self._replace_connection(issue, connection)
         issue.connection = connection
+        issue.connection_restored()
 
-    async def clear_connection(self, issue: IssueContext):
+    async def attach(self, issue_id: str, connection: WebSocket, last_seq: Optional[int] = None) -> Tuple[Optional[IssueContext], Optional[str]]:
         """
-        Clear the connection for the issue.
+        Reattach a client to the current issue after a dropped connection (see IssueContext.attach).
+        Returns (issue, None), or (None, reason) when there is nothing to reattach to.
         """
+        issue = self.current
+        if issue is None or issue.id != issue_id:
+            closed = next((c for c in self.closed if c["id"] == issue_id), None)
+            return None, f"closed:{closed['reason']}" if closed else "unknown_issue"
+        if issue.progress != IssueProgress.ACTIVE:
+            return None, "closing"
+        await self._replace_connection(issue, connection)
+        await issue.attach(connection, last_seq)
+        return issue, None
+
+    async def clear_connection(self, issue: IssueContext, connection: Optional[WebSocket] = None):
+        """
+        Clear the connection for the issue (only if it is still `connection`, when given: a reattached client may
+        already have replaced it).
+        """
+        if connection is not None and issue.connection is not connection:
+            return
         issue.connection = None
-
-
-
-
-
-
+        if issue.progress == IssueProgress.ACTIVE:
+            issue.connection_lost()
@@ -1,10 +1,15 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
-import asyncio
+from typing import Any, Dict, List, Optional, Tuple, TypedDict
+from enum import IntEnum
+from contextvars import ContextVar
+import asyncio, heapq, itertools, json, time, uuid
+from collections import deque
 import httpx
 from fastapi import FastAPI
 from ollama import AsyncClient
 from ollama import chat
+from core.cache import ResponseCache, CacheMiss
+from core import metrics as m
 
 
 # llm parameters (shared across agents)
@@ -19,6 +24,281 @@ _default_chat_params: Dict[str, Any] = {
 }
 
 
+# ----- GENERATION PROFILES -----
+class GenerationProfile(TypedDict, total=False):
+    temperature: float
+    num_predict: int     # hard cap on output tokens (also the expected output used to size num_ctx)
+    num_ctx: int         # fixed context size; sized from the prompt when omitted
+    stop: List[str]      # stop sequences
+    think: bool          # reasoning on/off
+    timeout: float       # seconds allowed for the whole generation
+
+
+GENERATION_PROFILES: Dict[str, GenerationProfile] = {
+    "default": {"temperature": 0.3, "num_predict": 2048, "think": True, "timeout": 300},
+    "diagnostics": {"temperature": 0.3, "num_predict": 1536, "think": False, "timeout": 180},
+    "communications": {"temperature": 0.5, "num_predict": 512, "think": False, "timeout": 60},
+    "maintenance": {"temperature": 0.2, "num_predict": 4096, "think": True, "timeout": 600},
+    "summary": {"temperature": 0.2, "num_predict": 384, "think": False, "timeout": 120},
+    # warmup loads the model with the context size diagnostics usually lands in, so the first real call doesn't reload it
+    "warmup": {"temperature": 0.0, "num_predict": 1, "num_ctx": 8192, "think": False, "timeout": 60},
+}
+
+# num_ctx is rounded up to one of these; every distinct value forces Ollama to reload the model
+NUM_CTX_BUCKETS: List[int] = [2048, 4096, 8192, 16384, 32768]
+
+
+# ----- MODEL ROUTING -----
+MODEL_TIERS: Dict[str, str] = {
+    "small": "llama3.2:3b",  # light, latency-sensitive calls
+    "large": _model,         # diagnosis and repair reasoning
+}
+
+# call class (generation profile) -> model tier; unlisted profiles go to the large model
+CALL_CLASSES: Dict[str, str] = {
+    "communications": "small",
+    "summary": "small",
+    "diagnostics": "large",
+    "maintenance": "large",
+    "default": "large",
+}
+
+
+def _keep_alive_seconds(keep_alive: Optional[str | int | float]) -> float:
+    # Ollama keep_alive: seconds, or a duration string like "30m"; negative keeps the model loaded forever
+    if keep_alive is None:
+        return 300.0 # Ollama's default
+    if isinstance(keep_alive, (int, float)):
+        return float("inf") if keep_alive < 0 else float(keep_alive)
+    text = str(keep_alive).strip().lower()
+    units = {"s": 1, "m": 60, "h": 3600}
+    if text and text[-1] in units:
+        value = float(text[:-1])
+        return float("inf") if value < 0 else value * units[text[-1]]
+    value = float(text)
+    return float("inf") if value < 0 else value
+
+
+
+"""
+ModelRouter picks the model for each call class (generation profile).
+Light classes go to the small model, everything else to the large one. A small-model answer that fails
+validation (empty, truncated, not matching the JSON schema, or reporting low confidence) is escalated
+to the large model. Routing is residency-aware: with room for only `max_resident` models (by default both
+tiers, or one when they name the same model), a light call is sent to the large model rather than evicting it
+when only the large model is loaded.
+Decisions and latency are recorded per call class.
+"""
+class ModelRouter:
+    def __init__(
+        self,
+        models: Optional[Dict[str, str]] = None,
+        classes: Optional[Dict[str, str]] = None,
+        max_resident: Optional[int] = None,
+        min_confidence: float = 0.5,
+        unavailable_seconds: float = 600,
+    ):
+        self.models = {**MODEL_TIERS, **(models or {})}
+        self.classes = {**CALL_CLASSES, **(classes or {})}
+        # both tiers stay loaded unless told otherwise; with room for one, light calls would never reach the small model
+        self.max_resident = max_resident if max_resident is not None else len(set(self.models.values()))
+        self.min_confidence = min_confidence # answers with a lower "confidence" field are escalated
+        self.unavailable_seconds = unavailable_seconds
+        self.resident: Dict[str, float] = {} # model -> monotonic time its keep-alive expires
+        self._unavailable: Dict[str, float] = {} # model -> monotonic time until it is not routed to
+        self.stats: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def large(self) -> str:
+        return self.models["large"]
+
+    def route(self, profile: str) -> Tuple[str, str]:
+        """Return (model, reason) for a call of class `profile`."""
+        model = self.models.get(self.classes.get(profile, "large"), self.large)
+        if model == self.large:
+            return model, "class"
+        if self._unavailable.get(model, 0) > time.monotonic():
+            return self.large, "small_unavailable"
+        if not self.is_resident(model) and self.is_resident(self.large) and len(self._resident_now()) >= self.max_resident:
+            return self.large, "avoid_swap"
+        return model, "class"
+
+    def can_escalate(self, model: str) -> bool:
+        return model != self.large
+
+    def acceptable(self, text: str, format: Optional[Dict[str, Any] | str], done_reason: Optional[str]) -> bool:
+        """Whether a small-model answer can be used as is."""
+        if not text.strip() or done_reason == "length":
+            return False
+        if not format:
+            return True
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            return False
+        if not isinstance(parsed, dict):
+            return False
+        if isinstance(format, dict) and any(key not in parsed for key in format.get("required") or []):
+            return False
+        confidence = parsed.get("confidence")
+        if isinstance(confidence, (int, float)) and confidence < self.min_confidence:
+            return False
+        return True
+
+    # ---- residency ----
+    def _resident_now(self) -> List[str]:
+        now = time.monotonic()
+        return [m for m, expires in self.resident.items() if expires > now]
+
+    def is_resident(self, model: str) -> bool:
+        return self.resident.get(model, 0) > time.monotonic()
+
+    def mark_resident(self, model: str, keep_alive: Optional[str | int] = None) -> None:
+        """Record that `model` just served a request; loading it evicts the least recently used beyond max_resident."""
+        self._unavailable.pop(model, None)
+        self.resident.pop(model, None)
+        self.resident[model] = time.monotonic() + _keep_alive_seconds(keep_alive)
+        while len(self.resident) > self.max_resident:
+            self.resident.pop(next(iter(self.resident)))
+
+    def set_resident(self, expiries: Dict[str, float]) -> None:
+        """Replace the residency view with Ollama's (model -> seconds until unload), e.g. from /api/ps."""
+        now = time.monotonic()
+        self.resident = {m: now + seconds for m, seconds in sorted(expiries.items(), key=lambda kv: kv[1])}
+
+    def mark_unavailable(self, model: str) -> None:
+        self._unavailable[model] = time.monotonic() + self.unavailable_seconds
+
+    def warm_models(self) -> List[str]:
+        """Models worth loading ahead of time: the large one, plus the small one when both fit."""
+        models = [self.large]
+        if self.max_resident > 1:
+            models += [m for m in dict.fromkeys(self.models.values()) if m != self.large]
+        return models[: max(1, self.max_resident)]
+
+    # ---- accounting ----
+    def record(self, profile: str, model: str, reason: str, seconds: float, escalated: bool = False) -> None:
+        stats = self.stats.setdefault(profile, {
+            "calls": 0, "escalations": 0, "by_model": {}, "reasons": {}, "seconds_total": 0.0,
+            "latencies": deque(maxlen=256),
+        })
+        stats["calls"] += 1
+        stats["escalations"] += int(escalated)
+        stats["by_model"][model] = stats["by_model"].get(model, 0) + 1
+        stats["reasons"][reason] = stats["reasons"].get(reason, 0) + 1
+        stats["seconds_total"] += seconds
+        stats["latencies"].append(seconds)
+
+    def report(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for profile, stats in self.stats.items():
+            latencies = sorted(stats["latencies"])
+            out[profile] = {
+                **{k: v for k, v in stats.items() if k != "latencies"},
+                "mean_seconds": stats["seconds_total"] / stats["calls"] if stats["calls"] else None,
+                "p50_seconds": latencies[len(latencies) // 2] if latencies else None,
+                "p95_seconds": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+            }
+        return out
+
+
+# Owner (e.g. issue id) of generations started from the current task; inherited by tasks it creates
+generation_owner: ContextVar[Optional[str]] = ContextVar("generation_owner", default=None)
+
+
+class LLMPriority(IntEnum):
+    FOREGROUND = 0   # a user is waiting on this generation
+    PREFETCH = 1     # likely to be needed soon
+    SPECULATIVE = 2  # may be thrown away
+
+
+"""
+LLMScheduler serialises generations on the (single) inference box.
+Requests are granted in priority order, and a request preempts any running generation of lower priority
+by cancelling the task that holds the slot. Background (prefetch/speculative) generations must therefore
+always run in their own asyncio task.
+"""
+class LLMScheduler:
+    def __init__(self, concurrency: int = 1):
+        self.concurrency = concurrency
+        self._active: Dict[asyncio.Task, LLMPriority] = {}
+        self._waiters: List[List[Any]] = []  # heap of [priority, seq, future, task]
+        self._seq = itertools.count()
+        self.preemptions = 0
+        self.on_preempt = None # optional callback(task) invoked before a task is preempted
+
+    async def acquire(self, priority: LLMPriority = LLMPriority.FOREGROUND) -> None:
+        task = asyncio.current_task()
+        if len(self._active) < self.concurrency and not self._waiters:
+            self._active[task] = priority
+            return
+
+        self._preempt(priority)
+        fut = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), fut, task]
+        heapq.heappush(self._waiters, entry)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # the slot was handed over just as we were cancelled; pass it on
+                self.release(task)
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self, task: Optional[asyncio.Task] = None) -> None:
+        self._active.pop(task or asyncio.current_task(), None)
+        while self._waiters and len(self._active) < self.concurrency:
+            priority, _, fut, waiter = heapq.heappop(self._waiters)
+            if fut.done():
+                continue
+            self._active[waiter] = priority
+            fut.set_result(None)
+
+    def promote(self, task: asyncio.Task, priority: LLMPriority) -> None:
+        """Raise the priority of a task's running or queued request (e.g. a speculation that became real)."""
+        if task in self._active:
+            self._active[task] = min(self._active[task], priority)
+        for entry in self._waiters:
+            if entry[3] is task:
+                entry[0] = min(entry[0], priority)
+        heapq.heapify(self._waiters)
+
+    def _preempt(self, priority: LLMPriority) -> None:
+        for task, held in list(self._active.items()):
+            if held > priority and not task.done():
+                print(f"Preempting {held.name.lower()} generation for {priority.name.lower()} request", flush=True)
+                self.preemptions += 1
+                if self.on_preempt is not None:
+                    self.on_preempt(task)
+                task.cancel()
+
+
+"""
+Generation is a handle on a single in-flight streamed generation.
+Cancelling it cancels the task consuming the stream; LLMClient.chat then closes the underlying HTTP stream
+so Ollama stops generating, and asyncio.CancelledError propagates up through the calling agent.
+"""
+class Generation:
+    def __init__(self, owner: Optional[str], priority: LLMPriority, task: Optional[asyncio.Task]):
+        self.id: str = str(uuid.uuid4())
+        self.owner = owner
+        self.priority = priority
+        self.task = task
+        self.tokens: int = 0 # streamed chunks so far (Ollama streams roughly one token per chunk)
+        self.done: bool = False
+        self.cancel_reason: Optional[str] = None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if self.done or self.task is None or self.task.done():
+            return
+        if self.cancel_reason is None:
+            self.cancel_reason = reason
+        self.task.cancel()
+
+
 """
 LLMClient is the interface for interacting with the LLM.
 It can be used to chat with the LLM, warm up the model, and close the connection.
@@ -29,51 +309,418 @@ class LLMClient:
         base_url: str = _base_url, # ollama base url
         model: str = _model,
         keep_alive: Optional[str | int] = _default_keep_alive,
-        timeout: httpx.Timeout | None = None
+        timeout: httpx.Timeout | None = None,
+        cache: Optional[ResponseCache] = None,
+        router: Optional[ModelRouter] = None,
     ):
         # store basic llm config
         self.base_url = base_url
-        self.model = model
+        self.router = router # optional per-call-class model routing; without it every call uses `model`
+        self.model = router.large if router is not None else model
         self.keep_alive = keep_alive
 
-        # create ollama client
-        self.client = AsyncClient(host=base_url)
+        # create ollama client (timeout applies to the underlying HTTP requests)
+        self.client = AsyncClient(host=base_url, timeout=timeout)
+        self.profiles: Dict[str, GenerationProfile] = {k: dict(v) for k, v in GENERATION_PROFILES.items()}
+        self._chars_per_token: float = 4.0 # calibrated from Ollama's prompt_eval_count (only ever lowered)
+        self._num_ctx: Dict[str, int] = {} # last num_ctx used per model
+        self.scheduler = LLMScheduler()
+        self.cache = cache # optional exact-match response cache (see core/cache.py for the record/replay modes)
+        self.scheduler.on_preempt = lambda task: self._mark_cancelled(task, "preempted")
+
+        # in-flight generations and cancellation accounting
+        self.generations: Dict[str, Generation] = {}
+        self._last_sequence: Dict[str, str] = {} # per model: previous prompt + answer as rendered for prefix comparison (Ollama keeps it in its KV cache)
+        self.prompt_stats: Dict[str, Dict[str, float]] = {} # per-profile prefill / decode totals from Ollama's final chunk
+        self.usage: Dict[str, Dict[str, float]] = {} # per-owner (issue) token and time totals of completed generations
+        self._mean_completion_tokens: Optional[float] = None
+        self.cancellation_stats: Dict[str, Any] = {
+            "cancelled": 0,
+            "tokens_before_cancel": 0, # tokens already generated when generations were cancelled
+            "tokens_saved_estimate": 0, # expected remaining tokens (from the mean completion length) never generated
+            "by_reason": {},
+        }
 
 
     async def chat(
         self,
         messages: List[Dict[str, str]],
         keep_alive: Optional[str | int] = _default_keep_alive,
-        think: bool = True,
-        chat_params: Dict[str, Any] = _default_chat_params,
+        think: Optional[bool] = None,
+        chat_params: Optional[Dict[str, Any]] = None,
+        priority: LLMPriority = LLMPriority.FOREGROUND,
+        profile: str = "default",
+        format: Optional[Dict[str, Any] | str] = None,
+        agent: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Send a chat request to the LLM.
+        `format` enables structured output: a JSON schema (or "json") the model's answer is constrained to.
+        Generation options come from the named profile (see GENERATION_PROFILES); `think` and `chat_params`
+        (temperature, max_tokens/num_predict, stop, num_ctx, timeout) override it per call.
+        Waits for a scheduler slot first; lower priority requests may be preempted (cancelled) by higher ones.
+        With a router, the model is picked per profile. Small-model answers are buffered and validated
+        before anything is yielded, so a failed answer can be escalated to the large model transparently.
+        `agent` labels the call's metrics (defaults to the profile name).
         """
+        agent = agent or profile
+        if self.router is None:
+            async for chunk in self._stream(self.model, messages, keep_alive, think, chat_params, priority, profile, format, agent):
+                yield chunk
+            return
 
-        async for part in await self.client.chat(
-            model=self.model,
-            messages=messages,
-            stream=True,
-            keep_alive=keep_alive,
-            think=think,
-        ):
-            yield {
-                "role": part["message"].get("role", "assistant"),
-                "thinking": part["message"].get("thinking"),   # <-- reasoning text (may be None)
-                "content": part["message"].get("content"),     # <-- final answer tokens
-                "done": part.get("done", False),
-            }
+        model, reason = self.router.route(profile)
+        started = time.perf_counter()
+        escalated = False
+        if self.router.can_escalate(model):
+            buffered: List[Dict[str, Any]] = []
+            try:
+                async for chunk in self._stream(model, messages, keep_alive, think, chat_params, priority, profile, format, agent):
+                    buffered.append(chunk)
+                failure = None
+                text = "".join(c["content"] or "" for c in buffered)
+                if not self.router.acceptable(text, format, buffered[-1].get("done_reason") if buffered else None):
+                    failure = "rejected"
+            except (TimeoutError, CacheMiss) as e:
+                failure = type(e).__name__
+            except Exception as e:
+                failure = "unavailable"
+                self.router.mark_unavailable(model) # e.g. the small model is not pulled
+                print(f"Small model {model} failed: {e}", flush=True)
+            if failure is None:
+                self.router.record(profile, model, reason, time.perf_counter() - started)
+                for chunk in buffered:
+                    yield chunk
+                return
+            print(f"Escalating {profile} from {model} to {self.router.large} ({failure})", flush=True)
+            model, reason, escalated = self.router.large, f"escalated_{failure}", True
+
+        async for chunk in self._stream(model, messages, keep_alive, think, chat_params, priority, profile, format, agent):
+            yield chunk
+        self.router.record(profile, model, reason, time.perf_counter() - started, escalated)
+
+    async def _stream(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        keep_alive: Optional[str | int],
+        think: Optional[bool],
+        chat_params: Optional[Dict[str, Any]],
+        priority: LLMPriority,
+        profile: str,
+        format: Optional[Dict[str, Any] | str],
+        agent: Optional[str] = None,
+    ):
+        """One streamed generation on `model` (cache, scheduling, timeouts, cancellation and accounting)."""
+        options, profile_think, timeout = self.build_options(messages, profile, chat_params, model)
+        think = profile_think if think is None else think
+        labels = {"agent": agent or profile, "model": model, "profile": profile}
+        requested_at = time.perf_counter()
+
+        # exact-match cache: replay a recorded stream without touching the model
+        cache_key = None
+        if self.cache is not None and self.cache.applies(profile):
+            cache_key = self.cache.key(model, messages, options, think, format)
+            entry = self.cache.get(cache_key)
+            if entry is not None:
+                m.LLM_REQUESTS.inc(outcome="cached", **labels)
+                async for chunk in self.cache.replay(entry):
+                    yield chunk
+                return
+            if self.cache.mode == "replay":
+                raise CacheMiss(f"No recorded response for this {profile} request (replay mode)")
+        recording: List[Tuple[float, Dict[str, Any]]] = []
+        last_chunk_at = time.perf_counter()
+
+        task = asyncio.current_task()
+        generation = Generation(generation_owner.get(), priority, task)
+        self.generations[generation.id] = generation
+        stream = None
+        answer: List[str] = []
+        first_token_at: Optional[float] = None
+        try:
+            await self.scheduler.acquire(priority)
+            acquired_at = time.perf_counter()
+            m.LLM_QUEUE_WAIT.observe(acquired_at - requested_at, **labels)
+            try:
+                # the deadline covers the whole generation, not just the HTTP connection
+                deadline = (asyncio.get_running_loop().time() + timeout) if timeout else None
+                async with asyncio.timeout_at(deadline):
+                    stream = await self.client.chat(
+                        model=model,
+                        messages=messages,
+                        stream=True,
+                        keep_alive=keep_alive,
+                        think=think,
+                        options=options,
+                        format=format,
+                    )
+                parts = stream.__aiter__()
+                while True:
+                    try:
+                        async with asyncio.timeout_at(deadline):
+                            part = await parts.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    generation.tokens += 1
+                    metrics = None
+                    if first_token_at is None and (part["message"].get("content") or part["message"].get("thinking")):
+                        first_token_at = time.perf_counter()
+                        m.LLM_TTFT.observe(first_token_at - requested_at, **labels)
+                    if part["message"].get("content"):
+                        answer.append(part["message"]["content"])
+                    if part.get("done", False):
+                        generation.done = True
+                        self._record_completion(part.get("eval_count") or generation.tokens)
+                        self._calibrate(messages, part.get("prompt_eval_count"))
+                        metrics = self._record_prompt_stats(profile, model, messages, "".join(answer), part)
+                        metrics.update({
+                            "queue_wait_seconds": acquired_at - requested_at,
+                            "ttft_seconds": (first_token_at - requested_at) if first_token_at is not None else None,
+                            "wall_seconds": time.perf_counter() - requested_at,
+                        })
+                        self._observe(labels, metrics)
+                        self._record_usage(generation.owner, metrics)
+                        if self.router is not None:
+                            self.router.mark_resident(model, keep_alive)
+                    chunk = {
+                        "role": part["message"].get("role", "assistant"),
+                        "thinking": part["message"].get("thinking"),   # <-- reasoning text (may be None)
+                        "content": part["message"].get("content"),     # <-- final answer tokens
+                        "done": part.get("done", False),
+                        "metrics": metrics,                            # <-- prefill/decode timings (final chunk only)
+                        "done_reason": part.get("done_reason"),        # <-- "stop" or "length" (truncated)
+                    }
+                    if cache_key is not None:
+                        now = time.perf_counter()
+                        recording.append((now - last_chunk_at, chunk))
+                        last_chunk_at = now
+                        if chunk["done"]:
+                            self.cache.put(cache_key, recording, model, profile)
+                    yield chunk
+            finally:
+                self.scheduler.release(task)
+        except TimeoutError:
+            generation.cancel_reason = generation.cancel_reason or "timeout"
+            self._record_cancellation(generation)
+            m.LLM_REQUESTS.inc(outcome="timeout", **labels)
+            raise TimeoutError(f"LLM generation ({profile}) exceeded {timeout}s") from None
+        except (asyncio.CancelledError, GeneratorExit):
+            if not generation.done:
+                m.LLM_REQUESTS.inc(outcome="cancelled", **labels)
+            self._record_cancellation(generation)
+            raise
+        except Exception:
+            m.LLM_REQUESTS.inc(outcome="error", **labels)
+            raise
+        finally:
+            self.generations.pop(generation.id, None)
+            if stream is not None:
+                # closing the stream closes the HTTP response, which makes Ollama abort the generation
+                try:
+                    await stream.aclose()
+                except BaseException:
+                    pass
+
+    def build_options(
+        self,
+        messages: List[Dict[str, str]],
+        profile: str = "default",
+        chat_params: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], bool, Optional[float]]:
+        """
+        Resolve a profile (plus per-call overrides) into Ollama `options`, the think flag and a timeout.
+        """
+        settings: Dict[str, Any] = dict(self.profiles.get(profile) or self.profiles["default"])
+        overrides = dict(chat_params or {})
+        if "max_tokens" in overrides:
+            overrides["num_predict"] = overrides.pop("max_tokens")
+        settings.update(overrides)
 
+        options: Dict[str, Any] = {}
+        for key in ("temperature", "num_predict", "stop"):
+            if settings.get(key) is not None:
+                options[key] = settings[key]
+        model = model or self.model
+        options["num_ctx"] = settings.get("num_ctx") or self.size_context(messages, settings.get("num_predict") or 0, model)
+        self._num_ctx[model] = options["num_ctx"]
+        return options, bool(settings.get("think", False)), settings.get("timeout")
+
+    def size_context(self, messages: List[Dict[str, str]], expected_output: int, model: Optional[str] = None) -> int:
+        """
+        Pick num_ctx for the prompt plus expected output, rounded up to a bucket.
+        The previous bucket is kept if it is big enough and at most two buckets too large, to avoid reloads.
+        """
+        chars = sum(len(m.get("content") or "") for m in messages)
+        needed = int(chars / self._chars_per_token * 1.1) + expected_output + 64 # 10% + template overhead
+        bucket = next((b for b in NUM_CTX_BUCKETS if b >= needed), NUM_CTX_BUCKETS[-1])
+        previous = self._num_ctx.get(model or self.model)
+        if previous is not None and previous >= needed and previous <= bucket * 4:
+            return previous
+        return bucket
 
-    async def warmup(self) -> None:  #ensures the model is pre-loaded
-        """Warm up the model"""
-        async for part in self.chat(messages=[{"role": "user", "content": "ping"}], keep_alive=self.keep_alive, think=False):
-            pass
+    def _calibrate(self, messages: List[Dict[str, str]], prompt_eval_count: Optional[int]) -> None:
+        # prompt_eval_count excludes KV-cache hits, so it can only under-count; keep the most conservative ratio
+        if not prompt_eval_count:
+            return
+        chars = sum(len(m.get("content") or "") for m in messages)
+        if chars > 0:
+            self._chars_per_token = max(1.5, min(self._chars_per_token, chars / prompt_eval_count))
+
+    @staticmethod
+    def _render(messages: List[Dict[str, str]]) -> str:
+        return "".join(f"<{m.get('role')}>{m.get('content') or ''}\n" for m in messages)
+
+    def _record_prompt_stats(self, profile: str, model: str, messages: List[Dict[str, str]], answer: str, part: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Collect prefill/decode counts and durations from Ollama's final chunk.
+        prompt_eval_count only counts tokens that were actually evaluated, so a stable prefix shows up as a
+        prompt_eval_count well below the estimated prompt size. `prefix_shared` is the fraction of this prompt
+        that matches the previous request's prompt + answer, i.e. what the server could serve from its KV cache.
+        """
+        rendered = self._render(messages)
+        shared = 0
+        for a, b in zip(rendered, self._last_sequence.get(model, "")):
+            if a != b:
+                break
+            shared += 1
+        self._last_sequence[model] = rendered + self._render([{"role": "assistant", "content": answer}])
+
+        ns = 1e-9
+        metrics = {
+            "profile": profile,
+            "model": model,
+            "prompt_chars": len(rendered),
+            "prompt_tokens_estimate": int(len(rendered) / self._chars_per_token),
+            "prefix_shared": (shared / len(rendered)) if rendered else 0.0,
+            "prompt_eval_count": part.get("prompt_eval_count") or 0,
+            "prompt_eval_seconds": (part.get("prompt_eval_duration") or 0) * ns,
+            "eval_count": part.get("eval_count") or 0,
+            "eval_seconds": (part.get("eval_duration") or 0) * ns,
+            "load_seconds": (part.get("load_duration") or 0) * ns,
+            "total_seconds": (part.get("total_duration") or 0) * ns,
+        }
+        totals = self.prompt_stats.setdefault(profile, {
+            "calls": 0, "prompt_chars": 0, "shared_chars": 0, "prompt_eval_count": 0,
+            "prompt_eval_seconds": 0.0, "eval_count": 0, "eval_seconds": 0.0,
+        })
+        totals["calls"] += 1
+        totals["prompt_chars"] += len(rendered)
+        totals["shared_chars"] += shared
+        for key in ("prompt_eval_count", "prompt_eval_seconds", "eval_count", "eval_seconds"):
+            totals[key] += metrics[key]
+        print(
+            f"LLM {profile} ({model}): prefill {metrics['prompt_eval_count']}/~{metrics['prompt_tokens_estimate']} tokens "
+            f"in {metrics['prompt_eval_seconds']:.2f}s ({metrics['prefix_shared']:.0%} prefix shared), "
+            f"decode {metrics['eval_count']} tokens in {metrics['eval_seconds']:.2f}s",
+            flush=True,
+        )
+        return metrics
+
+    @staticmethod
+    def _observe(labels: Dict[str, str], metrics: Dict[str, Any]) -> None:
+        """Export a finished generation's timings (see core/metrics.py)."""
+        m.LLM_REQUESTS.inc(outcome="ok", **labels)
+        m.LLM_DURATION.observe(metrics["wall_seconds"], **labels)
+        m.LLM_PROMPT_EVAL.observe(metrics["prompt_eval_seconds"], **labels)
+        m.LLM_EVAL.observe(metrics["eval_seconds"], **labels)
+        m.LLM_LOAD.observe(metrics["load_seconds"], **labels)
+        m.LLM_PROMPT_TOKENS.inc(metrics["prompt_eval_count"], **labels)
+        m.LLM_COMPLETION_TOKENS.inc(metrics["eval_count"], **labels)
+        metrics["tokens_per_second"] = (metrics["eval_count"] / metrics["eval_seconds"]) if metrics["eval_seconds"] else None
+        if metrics["tokens_per_second"] is not None:
+            m.LLM_TOKENS_PER_SECOND.observe(metrics["tokens_per_second"], **labels)
+
+    def _record_usage(self, owner: Optional[str], metrics: Dict[str, Any]) -> None:
+        if owner is None:
+            return
+        usage = self.usage.setdefault(owner, {"calls": 0, "prompt_eval_count": 0, "eval_count": 0, "wall_seconds": 0.0})
+        usage["calls"] += 1
+        usage["prompt_eval_count"] += metrics["prompt_eval_count"]
+        usage["eval_count"] += metrics["eval_count"]
+        usage["wall_seconds"] += metrics["wall_seconds"]
+
+    def cancel(self, owner: Optional[str] = None, task: Optional[asyncio.Task] = None, reason: str = "cancelled") -> int:
+        """
+        Cancel in-flight generations, optionally only those of `owner` and/or those consumed by `task`.
+        Returns the number of generations cancelled.
+        """
+        count = 0
+        for generation in list(self.generations.values()):
+            if owner is not None and generation.owner != owner:
+                continue
+            if task is not None and generation.task is not task:
+                continue
+            generation.cancel(reason)
+            count += 1
+        return count
+
+    def _mark_cancelled(self, task: asyncio.Task, reason: str) -> None:
+        for generation in self.generations.values():
+            if generation.task is task and generation.cancel_reason is None:
+                generation.cancel_reason = reason
+
+    def _record_completion(self, tokens: int) -> None:
+        if self._mean_completion_tokens is None:
+            self._mean_completion_tokens = float(tokens)
+        else:
+            self._mean_completion_tokens = 0.9 * self._mean_completion_tokens + 0.1 * tokens
+
+    def _record_cancellation(self, generation: Generation) -> None:
+        if generation.done:
+            return
+        reason = generation.cancel_reason or "task_cancelled"
+        saved = max(0, int((self._mean_completion_tokens or 0) - generation.tokens))
+        stats = self.cancellation_stats
+        stats["cancelled"] += 1
+        stats["tokens_before_cancel"] += generation.tokens
+        stats["tokens_saved_estimate"] += saved
+        stats["by_reason"][reason] = stats["by_reason"].get(reason, 0) + 1
+        print(f"Generation cancelled ({reason}) after {generation.tokens} tokens, ~{saved} tokens saved", flush=True)
+
+
+    async def embed(self, text: str, model: str = "nomic-embed-text") -> List[float]:
+        """Embedding of `text` (same model as the RAG store). Embeddings bypass the generation scheduler."""
+        response = await self.client.embeddings(model=model, prompt=text, keep_alive=self.keep_alive)
+        return list(response["embedding"])
+
+    async def pin(self, model: Optional[str] = None, priority: Optional[LLMPriority] = None, timeout: Optional[float] = None) -> None:
+        """
+        Load `model` (or refresh its keep-alive) without generating anything. With a `priority` the load takes a
+        scheduler slot first, so it waits for (and is preempted by) more urgent generations like any other request;
+        run it in its own task then. `timeout` covers the load itself, not the wait for the slot.
+        Uses the num_ctx the model last ran with, so pinning never triggers a reload with a different context size.
+        """
+        model = model or self.model
+        num_ctx = self._num_ctx.get(model) or self.profiles["warmup"].get("num_ctx")
+        if priority is not None:
+            await self.scheduler.acquire(priority)
+        try:
+            async with asyncio.timeout(timeout):
+                await self.client.generate(model=model, prompt="", keep_alive=self.keep_alive, options={"num_ctx": num_ctx})
+        finally:
+            if priority is not None:
+                self.scheduler.release()
+        if self.router is not None:
+            self.router.mark_resident(model, self.keep_alive)
+
+    async def warmup(self, models: Optional[List[str]] = None, priority: LLMPriority = LLMPriority.PREFETCH) -> None:  #ensures the model is pre-loaded
+        """Warm up the model (with a router: the models it wants resident, large first); real requests preempt it"""
+        models = models or (self.router.warm_models() if self.router is not None else [self.model])
+        for model in models:
+            async for part in self._stream(
+                model, [{"role": "user", "content": "ping"}], self.keep_alive, None, None, priority, "warmup", None, "warmup",
+            ):
+                pass
 
     async def close(self) -> None:
-        """Close the underlying HTTP client (call on app shutdown)."""
-        await self.client.aclose()
+        """Cancel in-flight generations and close the underlying HTTP client (call on app shutdown)."""
+        self.cancel(reason="shutdown")
+        # best effort: ollama's AsyncClient has no public close, so close its private httpx client (`_client`) if it has one
+        http = getattr(self.client, "_client", None)
+        if http is not None and hasattr(http, "aclose"):
+            await http.aclose()
 
     
 
@@ -81,26 +728,21 @@ class LLMClient:
 initialise the llm client
 """
 async def initialise_llm(app: FastAPI):
-    """Background task to initialise connection to LLM"""
+    """Background task to initialise connection to LLM (model tiers from app.state.model_tiers, see --small-model)"""
     try:
         print("Starting LLM initialization...", flush=True)
         app.state.llm_client = LLMClient(
             base_url="http://localhost:11434",
             model="gpt-oss:20b",
             keep_alive="30m",
-            timeout=None
+            timeout=None,
+            # small model for light calls (communications, summaries), gpt-oss:20b for diagnosis and maintenance
+            router=ModelRouter(models=getattr(app.state, "model_tiers", None)),
+            cache=getattr(app.state, "llm_cache", None), # set from the --llm-cache flags
         )
-        # Try to warmup but don't block if Ollama is not available
-        try:
-            await asyncio.wait_for(app.state.llm_client.warmup(), timeout=20)
-            app.state.llm_ready = True
-            print("LLM initialization completed", flush=True)
-        except asyncio.TimeoutError:
-            print("LLM warmup timed out - Ollama may not be running", flush=True)
-            app.state.llm_ready = False
-        except Exception as warmup_error:
-            print(f"LLM warmup failed: {warmup_error}", flush=True)
-            app.state.llm_ready = False
+        # models are loaded in the background by the ResidencyManager (core/residency.py), so startup never waits on Ollama
+        app.state.llm_ready = False
+        print("LLM client created", flush=True)
     except Exception as e:
         print(f"LLM initialization failed: {e}", flush=True)
         app.state.llm_ready = False
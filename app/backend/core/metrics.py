@@ -0,0 +1,195 @@
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import math, sys, threading
+
+
+# latency buckets in seconds, from sub-100ms parsing up to multi-minute maintenance plans
+LATENCY_BUCKETS: Tuple[float, ...] = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+RATE_BUCKETS: Tuple[float, ...] = (1, 2, 5, 10, 15, 20, 30, 40, 60, 80, 120)
+
+
+def _label_key(names: Sequence[str], labels: Dict[str, str]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in names)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+
+"""
+Minimal Prometheus-style metrics (counters, gauges, histograms with labels) rendered in the text exposition
+format by `render()`. Everything lives in one process-wide REGISTRY; updates are guarded by a lock because
+RAG searches and other blocking work run in worker threads.
+"""
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        return []
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = _label_key(self.labels, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}" for key, v in items]
+
+
+class CallbackCounter(Metric):
+    """Counter whose values are read from existing bookkeeping at render time: collect() -> {label values: count}."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], collect: Callable[[], Dict[Tuple[str, ...], float]]):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def _samples(self) -> List[str]:
+        items = sorted(self.collect().items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[_label_key(self.labels, labels)] = float(value)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], List[float]] = {} # key -> per-bucket counts + [sum, count]
+
+    def observe(self, value: float, **labels: str) -> None:
+        if value is None or math.isnan(value):
+            return
+        key = _label_key(self.labels, labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def _samples(self) -> List[str]:
+        lines: List[str] = []
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = "+Inf" if math.isinf(bound) else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, ('le', le))} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {_format_value(series[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        PROCESS_RSS.set(_max_rss_bytes())
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _max_rss_bytes() -> float:
+    try:
+        import resource
+    except ImportError: # Windows
+        return float("nan")
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return float(rss if sys.platform == "darwin" else rss * 1024)
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+
+# ----- METRICS -----
+_LLM_LABELS = ("agent", "model", "profile")
+
+LLM_REQUESTS = Counter("dashtech_llm_requests_total", "LLM generations by outcome (ok, cached, cancelled, timeout, error).", _LLM_LABELS + ("outcome",))
+LLM_QUEUE_WAIT = Histogram("dashtech_llm_queue_wait_seconds", "Time waiting for an LLM scheduler slot.", _LLM_LABELS)
+LLM_TTFT = Histogram("dashtech_llm_time_to_first_token_seconds", "Time from request to the first streamed token (including queue wait).", _LLM_LABELS)
+LLM_DURATION = Histogram("dashtech_llm_generation_seconds", "Wall time of a whole generation (including queue wait).", _LLM_LABELS)
+LLM_PROMPT_EVAL = Histogram("dashtech_llm_prompt_eval_seconds", "Prefill time reported by Ollama.", _LLM_LABELS)
+LLM_EVAL = Histogram("dashtech_llm_eval_seconds", "Decode time reported by Ollama.", _LLM_LABELS)
+LLM_LOAD = Histogram("dashtech_llm_load_seconds", "Model load time reported by Ollama.", _LLM_LABELS)
+LLM_TOKENS_PER_SECOND = Histogram("dashtech_llm_tokens_per_second", "Decode throughput.", _LLM_LABELS, buckets=RATE_BUCKETS)
+LLM_PROMPT_TOKENS = Counter("dashtech_llm_prompt_tokens_total", "Prompt tokens evaluated (KV-cache hits excluded).", _LLM_LABELS)
+LLM_COMPLETION_TOKENS = Counter("dashtech_llm_completion_tokens_total", "Tokens generated.", _LLM_LABELS)
+
+RAG_SEARCH = Histogram("dashtech_rag_search_seconds", "RAG search time by stage (embed, search, total).", ("stage",))
+
+TURN_DURATION = Histogram("dashtech_issue_turn_seconds", "Diagnostics turn time, from result submitted to next test sent.", ("source",))
+TURN_STAGE = Histogram("dashtech_issue_turn_stage_seconds", "Diagnostics turn time by stage.", ("stage",))
+TURNS = Counter("dashtech_issue_turns_total", "Diagnostics turns by how they were produced (llm, cache, queue, speculation, fault_codes).", ("source",))
+MAINTENANCE_PLANS = Counter("dashtech_maintenance_plans_total", "Maintenance plans by source (library, llm).", ("source",))
+
+ISSUES_CLOSED = Counter("dashtech_issues_closed_total", "Issues closed by reason (client, idle, resolved, shutdown).", ("reason",))
+ISSUE_MEMORY = Gauge("dashtech_issue_memory_bytes", "Approximate memory held by the current issue.")
+
+PROCESS_RSS = Gauge("dashtech_process_max_resident_memory_bytes", "Peak resident memory of the backend process.")
+
+SPEECH_REQUESTS = Counter("dashtech_speech_requests_total", "Speech transcriptions by outcome (ok, rejected, failed).", ("outcome",))
+SPEECH_DURATION = Histogram("dashtech_speech_seconds", "Speech-to-text time by stage (load, queue, inference).", ("stage",))
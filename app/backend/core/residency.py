@@ -0,0 +1,198 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio, datetime, time
+from core.llm import LLMClient, LLMPriority
+
+
+"""
+ResidencyManager
+Keeps the models the app needs loaded in Ollama, in the background, so startup never blocks on a model load:
+- loads them after startup, and again whenever they are needed but not resident,
+- polls /api/ps to see what is actually resident and until when (fed to the ModelRouter),
+- re-pins them shortly before keep-alive expiry during shop hours (outside them the keep-alive is allowed to lapse),
+- pre-warms when a client connects,
+- retries with exponential backoff while Ollama is unreachable.
+`status()` backs the readiness endpoint.
+"""
+class ResidencyManager:
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        poll_interval: float = 60,
+        repin_margin: float = 300,                  # re-pin when a model expires within this many seconds
+        shop_hours: Tuple[int, int] = (7, 19),      # local hours [start, end) in which models are kept loaded
+        shop_days: Tuple[int, ...] = (0, 1, 2, 3, 4, 5), # weekday() values (Mon-Sat)
+        demand_seconds: float = 1800,               # a client connection keeps models wanted this long
+        load_timeout: float = 180,
+        initial_backoff: float = 2,
+        max_backoff: float = 120,
+        on_ready: Optional[Callable[[bool], None]] = None,
+    ):
+        self.client = llm_client
+        self.poll_interval = poll_interval
+        self.repin_margin = repin_margin
+        self.shop_hours = shop_hours
+        self.shop_days = shop_days
+        self.demand_seconds = demand_seconds
+        self.load_timeout = load_timeout
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.on_ready = on_ready
+
+        self.reachable: bool = False
+        self.ready: bool = False
+        self.resident: Dict[str, float] = {} # model -> seconds until Ollama unloads it (as of last_poll)
+        self.last_poll: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.next_check: Optional[float] = None
+        self.loads: int = 0
+        self._failures = 0
+        self._demand_until = 0.0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # ---- lifecycle ----
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="llm-residency")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def on_client_connected(self) -> None:
+        """A technician opened the app: make sure the models are (or get) loaded now."""
+        self._demand_until = time.monotonic() + self.demand_seconds
+        self._wake.set()
+
+    # ---- loop ----
+    async def _run(self) -> None:
+        while True:
+            try:
+                delay = await self._check()
+                self._failures = 0
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                self.reachable = False
+                self._set_ready(False)
+                delay = min(self.max_backoff, self.initial_backoff * 2 ** (self._failures - 1))
+                print(f"LLM residency check failed ({self.last_error}); retrying in {delay:.0f}s", flush=True)
+
+            self.next_check = time.time() + delay
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _check(self) -> float:
+        """One poll / load / re-pin pass. Returns the delay until the next pass."""
+        await self._poll()
+        wanted = self.wanted_models()
+        if self.should_be_loaded():
+            for model in wanted:
+                remaining = self.resident.get(model)
+                if remaining is None or remaining < self.repin_margin:
+                    action = "Loading" if remaining is None else "Re-pinning"
+                    print(f"{action} {model}", flush=True)
+                    if not await self._pin(model, load=remaining is None):
+                        return self.initial_backoff # preempted by a real request, which loads the model itself
+                    self.loads += 1
+            await self._poll()
+
+        self._set_ready(all(model in self.resident for model in wanted))
+
+        # wake up in time to re-pin the first model that would expire
+        delay = self.poll_interval
+        for model in wanted:
+            if model in self.resident:
+                delay = min(delay, max(5.0, self.resident[model] - self.repin_margin))
+        return delay
+
+    async def _pin(self, model: str, load: bool) -> bool:
+        """
+        Load (at PREFETCH priority, so technicians' requests preempt it) or re-pin `model` in its own task, as
+        preemption cancels the task holding the scheduler slot. Returns False if the load was preempted.
+        """
+        task = asyncio.create_task(
+            self.client.pin(model, priority=LLMPriority.PREFETCH if load else None, timeout=self.load_timeout),
+            name=f"llm-pin-{model}",
+        )
+        try:
+            await task
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                task.cancel()
+                raise
+            print(f"Loading {model} preempted", flush=True)
+            return False
+        return True
+
+    async def _poll(self) -> None:
+        response = await self.client.client.ps()
+        now = datetime.datetime.now(datetime.timezone.utc)
+        resident: Dict[str, float] = {}
+        for entry in response.get("models") or []:
+            name = entry.get("model") or entry.get("name")
+            expires_at = entry.get("expires_at")
+            if isinstance(expires_at, datetime.datetime):
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=datetime.timezone.utc)
+                resident[name] = max(0.0, (expires_at - now).total_seconds())
+            else:
+                resident[name] = float("inf")
+        self.resident = resident
+        self.reachable = True
+        self.last_poll = time.time()
+        if self.client.router is not None:
+            self.client.router.set_resident(resident)
+
+    # ---- policy ----
+    def wanted_models(self) -> List[str]:
+        return self.client.router.warm_models() if self.client.router is not None else [self.client.model]
+
+    def in_shop_hours(self, now: Optional[datetime.datetime] = None) -> bool:
+        now = now or datetime.datetime.now()
+        start, end = self.shop_hours
+        return now.weekday() in self.shop_days and start <= now.hour < end
+
+    def should_be_loaded(self) -> bool:
+        return self.in_shop_hours() or time.monotonic() < self._demand_until
+
+    def _set_ready(self, ready: bool) -> None:
+        if ready != self.ready:
+            print(f"LLM {'ready' if ready else 'not ready'}", flush=True)
+        self.ready = ready
+        if self.on_ready is not None:
+            self.on_ready(ready)
+
+    def state(self) -> str:
+        """ready | loading | idle (models may unload: outside shop hours with no client) | unreachable"""
+        if self.ready:
+            return "ready"
+        if not self.reachable:
+            return "unreachable"
+        return "loading" if self.should_be_loaded() else "idle"
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "state": self.state(),
+            "ollama_reachable": self.reachable,
+            "wanted_models": self.wanted_models(),
+            "resident": {m: (None if s == float("inf") else round(s)) for m, s in self.resident.items()},
+            "shop_hours": self.in_shop_hours(),
+            "loads": self.loads,
+            "last_poll": self.last_poll,
+            "last_error": self.last_error,
+            "next_check_in": round(self.next_check - time.time(), 1) if self.next_check else None,
+        }
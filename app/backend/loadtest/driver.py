@@ -0,0 +1,414 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+import argparse, asyncio, json, random, shlex, subprocess, sys, time
+import httpx
+import websockets
+
+try:
+    import psutil # optional: only used to read the memory of spawned backends
+except ImportError:
+    psutil = None
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# scripted technician behaviour (override with --scenario, a JSON file with the same keys)
+DEFAULT_SCENARIO: Dict[str, Any] = {
+    "complaints": [
+        "Engine temperature warning light comes on after 20 minutes of driving",
+        "Truck struggles to start in the morning and the battery light flickers",
+        "Loss of power when accelerating uphill, fault code 12-34 on the dash",
+        "Brake pedal feels soft and the ABS light stays on",
+    ],
+    "yes_rate": 0.6,           # share of boolean tests answered yes
+    "think_seconds": [1, 4],   # technician time per test (uniform range)
+    "max_turns": 12,           # give up on a session after this many tests
+}
+
+
+def percentiles(values: List[float], points=(50, 90, 95, 99)) -> Dict[str, Optional[float]]:
+    if not values:
+        return {f"p{p}": None for p in points} | {"max": None, "n": 0}
+    ordered = sorted(values)
+    out: Dict[str, Optional[float]] = {}
+    for p in points:
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+        out[f"p{p}"] = round(ordered[index], 3)
+    return out | {"max": round(ordered[-1], 3), "n": len(ordered)}
+
+
+
+"""
+Backend
+One backend under test: an existing URL, or a `python -m api` process the driver spawned. A backend serves a single
+issue at a time; sessions close theirs when they end (issue.close), and a spawned backend that still rejects a new
+session is restarted.
+"""
+class Backend:
+    def __init__(self, port: int, host: str = "127.0.0.1", spawn: bool = False, args: Optional[List[str]] = None, log_dir: Optional[Path] = None):
+        self.host = host
+        self.port = port
+        self.spawn = spawn
+        self.args = args or []
+        self.log_dir = log_dir
+        self.process: Optional[subprocess.Popen] = None
+        self.restarts = 0
+        self.rss_samples: List[float] = []
+        self.lag_samples: List[float] = []
+
+    @property
+    def http(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws(self) -> str:
+        return f"ws://{self.host}:{self.port}/issue/create"
+
+    async def start(self, ready_timeout: float = 60) -> None:
+        if self.spawn:
+            log = open(self.log_dir / f"backend-{self.port}.log", "ab") if self.log_dir else subprocess.DEVNULL
+            self.process = subprocess.Popen(
+                [sys.executable, "-m", "api", "--port", str(self.port), *self.args],
+                cwd=BACKEND_DIR, stdout=log, stderr=subprocess.STDOUT,
+            )
+        deadline = time.monotonic() + ready_timeout
+        async with httpx.AsyncClient() as client:
+            while True:
+                try:
+                    if (await client.get(f"{self.http}/test", timeout=2)).status_code == 200:
+                        return
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Backend on port {self.port} did not come up in {ready_timeout}s")
+                await asyncio.sleep(0.25)
+
+    async def stop(self) -> None:
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                await asyncio.to_thread(self.process.wait, 10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+    async def restart(self) -> None:
+        await self.stop()
+        self.restarts += 1
+        await self.start()
+
+    def rss(self) -> Optional[float]:
+        """Current resident memory of the spawned process in bytes."""
+        if self.process is None:
+            return None
+        if psutil is not None:
+            try:
+                return float(psutil.Process(self.process.pid).memory_info().rss)
+            except psutil.Error:
+                return None
+        try:
+            with open(f"/proc/{self.process.pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return float(line.split()[1]) * 1024
+        except OSError:
+            return None
+        return None
+
+    async def max_rss_reported(self) -> Optional[float]:
+        """Peak RSS the backend reports on /metrics (works for backends the driver did not spawn)."""
+        try:
+            async with httpx.AsyncClient() as client:
+                text = (await client.get(f"{self.http}/metrics", timeout=5)).text
+        except httpx.HTTPError:
+            return None
+        for line in text.splitlines():
+            if line.startswith("dashtech_process_max_resident_memory_bytes "):
+                return float(line.split()[1])
+        return None
+
+
+
+"""
+LoadTest
+Plays scripted technician sessions over /issue/create WebSockets (issue.begin, then a diagnostics.test_result for every
+diagnostics.test) and records:
+- turn latency: result sent -> next diagnostics.test (or maintenance.plan), by how the backend produced the turn
+- first partial: result sent -> first provisional diagnostics.test_partial
+- backend event-loop lag: round trip of GET /test while sessions run (the route does no work, so it measures the loop)
+- memory: RSS of spawned backends (or the peak reported on /metrics), and of the driver
+"""
+class LoadTest:
+    def __init__(self, backends: List[Backend], scenario: Dict[str, Any], sessions: int, turn_timeout: float = 300, seed: Optional[int] = None):
+        self.backends = backends
+        self.scenario = scenario
+        self.sessions = sessions
+        self.turn_timeout = turn_timeout
+        self.random = random.Random(seed)
+        self.turns: List[Dict[str, Any]] = []
+        self.first_partials: List[float] = []
+        self.plans: List[float] = []
+        self.outcomes: Dict[str, int] = {}
+        self.errors: List[str] = []
+        self.driver_lag: List[float] = []
+        self._remaining = sessions
+
+    async def run(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        samplers = [asyncio.create_task(self._sample_backend(b)) for b in self.backends]
+        samplers.append(asyncio.create_task(self._sample_driver()))
+        try:
+            await asyncio.gather(*(self._worker(b) for b in self.backends))
+        finally:
+            for task in samplers:
+                task.cancel()
+            await asyncio.gather(*samplers, return_exceptions=True)
+        return await self.report(time.perf_counter() - started)
+
+    async def _worker(self, backend: Backend) -> None:
+        while self._remaining > 0:
+            self._remaining -= 1
+            outcome = await self._session(backend)
+            if outcome == "rejected" and backend.spawn:
+                # the backend still holds the previous issue: restart it and retry this session
+                await backend.restart()
+                outcome = await self._session(backend)
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    async def _session(self, backend: Backend) -> str:
+        rng = random.Random(self.random.random())
+        try:
+            async with websockets.connect(backend.ws, max_size=None, open_timeout=30) as ws:
+                first = json.loads(await asyncio.wait_for(ws.recv(), timeout=30))
+                if first.get("type") == "issue.create_rejected":
+                    return "rejected"
+
+                await ws.send(json.dumps({"type": "diagnostics.start"}))
+                await ws.send(json.dumps({"type": "issue.begin", "payload": {
+                    "id": "issue_description", "name": "Issue Description",
+                    "description": "Initial description provided by the user", "rationale": "", "outcomes": {},
+                    "result": rng.choice(self.scenario["complaints"]),
+                }}))
+                sent_at, partial_seen, turns = time.perf_counter(), False, 0
+                last_turn: Optional[Dict[str, Any]] = None
+                try:
+                    while True:
+                        try:
+                            event = json.loads(await asyncio.wait_for(ws.recv(), timeout=self.turn_timeout))
+                        except asyncio.TimeoutError:
+                            return "timeout"
+                        kind, payload = event.get("type"), event.get("payload") or {}
+                        now = time.perf_counter()
+
+                        if kind == "diagnostics.test_partial" and not partial_seen:
+                            partial_seen = True
+                            self.first_partials.append(now - sent_at)
+                        elif kind == "diagnostics.latency" and last_turn is not None:
+                            last_turn["source"] = payload.get("source")
+                            last_turn["server"] = payload
+                        elif kind == "diagnostics.test":
+                            last_turn = {"seconds": now - sent_at, "source": "cache" if payload.get("cached") else None}
+                            self.turns.append(last_turn)
+                            turns += 1
+                            if turns > self.scenario["max_turns"]:
+                                return "max_turns"
+                            await asyncio.sleep(rng.uniform(*self.scenario["think_seconds"]))
+                            await ws.send(json.dumps({"type": "diagnostics.test_result", "payload": {
+                                "test_id": payload.get("test_id") or payload.get("id"), "result": self._answer(payload, rng),
+                            }}))
+                            sent_at, partial_seen = time.perf_counter(), False
+                        elif kind == "maintenance.plan":
+                            self.plans.append(now - sent_at)
+                            return "resolved"
+                        elif kind == "maintenance.error":
+                            self.errors.append(f"maintenance: {payload.get('message')}")
+                            return "maintenance_error"
+                        elif kind in ("diagnostics.error", "issue.error"):
+                            self.errors.append(f"{kind}: {payload.get('message')}")
+                finally:
+                    # free the backend for the next session (it disconnects once the issue is archived)
+                    try:
+                        await ws.send(json.dumps({"type": "issue.close", "payload": {"reason": "loadtest"}}))
+                        async with asyncio.timeout(10):
+                            async for _ in ws:
+                                pass
+                    except (websockets.WebSocketException, asyncio.TimeoutError):
+                        pass
+        except (OSError, websockets.WebSocketException, asyncio.TimeoutError) as e:
+            self.errors.append(f"connection: {type(e).__name__}: {e}")
+            return "connection_error"
+
+    def _answer(self, test: Dict[str, Any], rng: random.Random) -> Any:
+        kind = test.get("test_result_field_type")
+        options = test.get("test_result_field_options") or []
+        if kind == "boolean" or not kind:
+            return rng.random() < self.scenario["yes_rate"]
+        if kind == "array" and options:
+            return rng.choice(options)
+        if kind == "number":
+            return round(rng.uniform(0, 100), 1)
+        return "Checked, nothing unusual"
+
+    # ---- sampling ----
+    async def _sample_backend(self, backend: Backend, interval: float = 0.5) -> None:
+        async with httpx.AsyncClient() as client:
+            baseline: Optional[float] = None
+            while True:
+                started = time.perf_counter()
+                try:
+                    await client.get(f"{backend.http}/test", timeout=30)
+                    rtt = time.perf_counter() - started
+                    baseline = rtt if baseline is None else min(baseline, rtt)
+                    backend.lag_samples.append(rtt - baseline)
+                except httpx.HTTPError:
+                    pass # restarting
+                rss = backend.rss()
+                if rss is not None:
+                    backend.rss_samples.append(rss)
+                await asyncio.sleep(interval)
+
+    async def _sample_driver(self, interval: float = 0.1) -> None:
+        # if the driver itself lags, its latency numbers are not trustworthy
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.driver_lag.append(time.perf_counter() - started - interval)
+
+    # ---- report ----
+    async def report(self, elapsed: float) -> Dict[str, Any]:
+        by_source: Dict[str, List[float]] = {}
+        for turn in self.turns:
+            by_source.setdefault(turn.get("source") or "unknown", []).append(turn["seconds"])
+        server_llm = [t["server"]["llm"] for t in self.turns if t.get("server") and t["server"].get("llm")]
+        backends = []
+        for backend in self.backends:
+            backends.append({
+                "url": backend.http,
+                "restarts": backend.restarts,
+                "loop_lag_seconds": percentiles(backend.lag_samples),
+                "rss_mb_peak": round(max(backend.rss_samples) / 2**20, 1) if backend.rss_samples else None,
+                "rss_mb_last": round(backend.rss_samples[-1] / 2**20, 1) if backend.rss_samples else None,
+                "max_rss_mb_reported": round(r / 2**20, 1) if (r := await backend.max_rss_reported()) else None,
+            })
+        return {
+            "elapsed_seconds": round(elapsed, 1),
+            "sessions": self.outcomes,
+            "turn_latency_seconds": percentiles([t["seconds"] for t in self.turns]),
+            "turn_latency_by_source": {source: percentiles(values) for source, values in sorted(by_source.items())},
+            "first_partial_seconds": percentiles(self.first_partials),
+            "plan_latency_seconds": percentiles(self.plans),
+            "llm_ttft_seconds": percentiles([l["ttft_seconds"] for l in server_llm if l.get("ttft_seconds") is not None]),
+            "llm_queue_wait_seconds": percentiles([l["queue_wait_seconds"] for l in server_llm if l.get("queue_wait_seconds") is not None]),
+            "backends": backends,
+            "driver_loop_lag_seconds": percentiles(self.driver_lag),
+            "driver_rss_mb": round(_own_rss() / 2**20, 1),
+            "errors": self.errors[:20],
+            "error_count": len(self.errors),
+        }
+
+
+def _own_rss() -> float:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return float(rss if sys.platform == "darwin" else rss * 1024)
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    def row(label: str, stats: Dict[str, Any]) -> None:
+        if not stats.get("n"):
+            print(f"  {label:<24} -")
+            return
+        print(f"  {label:<24} n={stats['n']:<5} " + "  ".join(f"{k}={v:.3f}s" for k, v in stats.items() if k not in ("n",)))
+
+    print(f"\nLoad test finished in {report['elapsed_seconds']}s")
+    print("Sessions: " + ", ".join(f"{k}={v}" for k, v in sorted(report["sessions"].items())))
+    print("Latency:")
+    row("turn (all)", report["turn_latency_seconds"])
+    for source, stats in report["turn_latency_by_source"].items():
+        row(f"turn ({source})", stats)
+    row("first partial", report["first_partial_seconds"])
+    row("maintenance plan", report["plan_latency_seconds"])
+    row("llm ttft (server)", report["llm_ttft_seconds"])
+    row("llm queue wait (server)", report["llm_queue_wait_seconds"])
+    print("Backends:")
+    for backend in report["backends"]:
+        print(f"  {backend['url']}  restarts={backend['restarts']}  rss peak={backend['rss_mb_peak']}MB "
+              f"last={backend['rss_mb_last']}MB  reported max={backend['max_rss_mb_reported']}MB")
+        row("  event-loop lag", backend["loop_lag_seconds"])
+    row("driver event-loop lag", report["driver_loop_lag_seconds"])
+    print(f"  driver rss              {report['driver_rss_mb']}MB")
+    if report["error_count"]:
+        print(f"Errors ({report['error_count']}):")
+        for error in report["errors"]:
+            print(f"  {error}")
+
+
+async def _main(args) -> None:
+    scenario = dict(DEFAULT_SCENARIO)
+    if args.scenario:
+        scenario.update(json.loads(Path(args.scenario).read_text(encoding="utf-8")))
+
+    log_dir = Path(args.log_dir) if args.log_dir else None
+    if log_dir is not None:
+        log_dir.mkdir(parents=True, exist_ok=True)
+
+    fake = None
+    if args.fake_ollama is not None:
+        log = open(log_dir / "fake-ollama.log", "ab") if log_dir else subprocess.DEVNULL
+        fake = subprocess.Popen([sys.executable, "-m", "loadtest.fake_ollama", *shlex.split(args.fake_ollama)], cwd=BACKEND_DIR, stdout=log, stderr=subprocess.STDOUT)
+
+    if args.spawn:
+        backend_args = shlex.split(args.backend_args or "")
+        backends = [Backend(args.base_port + i, spawn=True, args=backend_args, log_dir=log_dir) for i in range(args.spawn)]
+    else:
+        backends = []
+        for url in args.url or ["http://127.0.0.1:8000"]:
+            parsed = httpx.URL(url)
+            backends.append(Backend(parsed.port or 80, host=parsed.host))
+
+    try:
+        await asyncio.gather(*(b.start() for b in backends))
+        if args.wait_ready:
+            async with httpx.AsyncClient() as client:
+                for backend in backends:
+                    while (await client.get(f"{backend.http}/ready", timeout=5)).status_code != 200:
+                        await asyncio.sleep(1)
+        print(f"Running {args.sessions} session(s) on {len(backends)} backend(s)", flush=True)
+        report = await LoadTest(backends, scenario, args.sessions, turn_timeout=args.turn_timeout, seed=args.seed).run()
+        if fake is not None:
+            try:
+                async with httpx.AsyncClient() as client:
+                    report["fake_ollama"] = (await client.get("http://127.0.0.1:11434/stats", timeout=5)).json()
+            except httpx.HTTPError:
+                pass
+    finally:
+        await asyncio.gather(*(b.stop() for b in backends))
+        if fake is not None:
+            fake.terminate()
+
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Report written to {args.json}")
+
+
+def main():
+    p = argparse.ArgumentParser(description="WebSocket load test for the diagnostics backend")
+    p.add_argument("--url", action="append", help="Backend base URL (repeatable; default http://127.0.0.1:8000)")
+    p.add_argument("--spawn", type=int, default=0, help="Spawn this many `python -m api` backends instead of using --url")
+    p.add_argument("--base-port", type=int, default=8100, help="First port for spawned backends")
+    p.add_argument("--backend-args", type=str, help='Extra arguments for spawned backends, e.g. "--turn-cache"')
+    p.add_argument("--fake-ollama", type=str, nargs="?", const="", help='Also start loadtest.fake_ollama (optionally with arguments, e.g. "--ttft 1")')
+    p.add_argument("--sessions", type=int, default=10, help="Total technician sessions to play")
+    p.add_argument("--scenario", type=str, help="JSON file overriding the scripted technician behaviour")
+    p.add_argument("--turn-timeout", type=float, default=300, help="Seconds to wait for the next event before a session times out")
+    p.add_argument("--wait-ready", action="store_true", help="Wait for /ready (models resident) before starting")
+    p.add_argument("--seed", type=int, help="Random seed for the technician behaviour")
+    p.add_argument("--log-dir", type=str, help="Write the output of spawned processes here")
+    p.add_argument("--json", type=str, help="Also write the report to this JSON file")
+    asyncio.run(_main(p.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+from __future__ import annotations
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from pathlib import Path
+import argparse, asyncio, datetime, hashlib, json, random, re, time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+
+"""
+Fake Ollama
+Stand-in for the Ollama server so the backend can be run and load-tested without a GPU. It implements the endpoints
+the backend uses (/api/chat, /api/generate, /api/embeddings, /api/embed, /api/ps, plus /api/tags and /api/version)
+with Ollama's wire format, so `python -m api` runs against it unchanged (it listens on Ollama's port by default):
+    python -m loadtest.fake_ollama --ttft 0.8 --tokens-per-second 40 --fail-rate 0.02
+
+Responses are scripted (first matching rule of --script) or templated from the request: diagnostics turns that
+converge on a diagnosis over a few tests, maintenance plans, summaries. Timing follows the configured model load
+time, prefill rate (time to first token) and decode rate; --parallel bounds concurrent generations like a single GPU.
+"""
+class FakeOllama:
+    def __init__(
+        self,
+        ttft: float = 0.5,                  # seconds before the first token (on top of prefill)
+        tokens_per_second: float = 40.0,    # decode rate
+        prefill_tokens_per_second: float = 2000.0,
+        load_seconds: float = 5.0,          # first use of a model (and after its keep-alive lapsed)
+        parallel: int = 1,                  # concurrent generations (OLLAMA_NUM_PARALLEL)
+        fail_rate: float = 0.0,             # HTTP 500 before streaming
+        stall_rate: float = 0.0,            # stop sending mid-stream until the client gives up
+        drop_rate: float = 0.0,             # close the stream mid-response
+        jitter: float = 0.2,                # relative random variation of every delay
+        models: Optional[List[str]] = None, # models that "exist" (None: any)
+        script: Optional[List[Dict[str, Any]]] = None,
+        embedding_dim: int = 768,
+        seed: Optional[int] = None,
+    ):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        self.load_seconds = load_seconds
+        self.fail_rate = fail_rate
+        self.stall_rate = stall_rate
+        self.drop_rate = drop_rate
+        self.jitter = jitter
+        self.models = set(models) if models else None
+        self.script = [(re.compile(rule["match"], re.S), rule) for rule in (script or [])]
+        self.embedding_dim = embedding_dim
+        self.random = random.Random(seed)
+        self.slots = asyncio.Semaphore(parallel)
+        self.resident: Dict[str, float] = {} # model -> unload time (epoch seconds)
+        self.stats: Dict[str, int] = {"chat": 0, "generate": 0, "embeddings": 0, "failed": 0, "stalled": 0, "dropped": 0, "loads": 0}
+
+    # ---- timing ----
+    def _delay(self, seconds: float) -> float:
+        return max(0.0, seconds * (1 + self.random.uniform(-self.jitter, self.jitter)))
+
+    async def _load(self, model: str, keep_alive: Any) -> float:
+        """Simulate loading `model` if it is not resident; returns the load time."""
+        now = time.time()
+        loaded = self.resident.get(model, 0) > now
+        self.resident[model] = now + _keep_alive_seconds(keep_alive)
+        if loaded:
+            return 0.0
+        self.stats["loads"] += 1
+        seconds = self._delay(self.load_seconds)
+        await asyncio.sleep(seconds)
+        return seconds
+
+    def _exists(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+    # ---- responses ----
+    def respond(self, messages: List[Dict[str, Any]], format: Any) -> str:
+        prompt = "\n".join(str(m.get("content") or "") for m in messages)
+        for pattern, rule in self.script:
+            if pattern.search(prompt):
+                return rule["response"] if isinstance(rule["response"], str) else json.dumps(rule["response"])
+        system = str(messages[0].get("content") or "") if messages else ""
+        if "vehicle diagnostics agent" in system or _schema_has(format, "candidate_tests"):
+            return json.dumps(self._diagnostics_turn(str(messages[-1].get("content") or "")))
+        if "maintainence agent" in system or _schema_has(format, "steps"):
+            return json.dumps(self._maintenance_plan())
+        if "summar" in system.lower():
+            return "The technician has confirmed the complaint; the tests so far point at the leading hypothesis."
+        if format is not None:
+            return "{}"
+        return "OK"
+
+    def _diagnostics_turn(self, user_message: str) -> Dict[str, Any]:
+        hypotheses = _hypotheses(user_message)
+        rng = random.Random(hashlib.sha256(user_message.encode("utf-8")).hexdigest())
+        evidence: Dict[str, str] = {}
+        new_hypotheses: List[Dict[str, Any]] = []
+        if not hypotheses:
+            for diagnosis, prior in zip(rng.sample(DIAGNOSES, 3), (0.5, 0.3, 0.2)):
+                new_hypotheses.append({"diagnosis": diagnosis, "prior": prior})
+        else:
+            # the leader gains on every result, so sessions converge on a diagnosis in a few turns
+            leader = hypotheses[0][0]
+            for hid, _, _ in hypotheses:
+                evidence[hid] = "++" if hid == leader else rng.choice(["-", "--", "-"])
+
+        next_id = 1 + max((int(h[0][1:]) for h in hypotheses if re.fullmatch(r"h\d+", str(h[0]))), default=0)
+        ids = [h[0] for h in hypotheses] + [f"h{next_id + i}" for i in range(len(new_hypotheses))]
+        candidates = []
+        for n, test in enumerate(rng.sample(TESTS, 3)):
+            candidates.append({
+                "test_text": test,
+                "test_instructions": [{"step_number": str(i + 1), "step_text": step} for i, step in enumerate(STEPS)],
+                "test_result_field_label": "Result",
+                "test_result_field_type": "boolean",
+                "test_result_field_options": ["yes", "no"],
+                "safety_and_warnings": ["Apply the parking brake and stop the engine before starting."],
+                "effort": n + 1,
+                "likelihoods": {hid: ([0.9, 0.1] if i == 0 else [0.25, 0.75]) for i, hid in enumerate(ids)},
+            })
+        return {"evidence": evidence, "new_hypotheses": new_hypotheses, "candidate_tests": candidates}
+
+    def _maintenance_plan(self) -> Dict[str, Any]:
+        return {
+            "tools": ["Socket set", "Multimeter", "Torque wrench"],
+            "parts": ["Replacement sensor", "Connector seal"],
+            "steps": [f"Step {i + 1}: {step}" for i, step in enumerate(STEPS + ["Replace the faulty part", "Clear fault codes and road test"])],
+            "difficulty": 4,
+        }
+
+    def embed(self, text: str) -> List[float]:
+        """Deterministic hashed bag-of-words vector: similar texts get similar embeddings (useful for the turn cache)."""
+        vector = [0.0] * self.embedding_dim
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.embedding_dim] += 1.0 if digest[4] & 1 else -1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    # ---- streaming ----
+    async def generate(
+        self, model: str, messages: List[Dict[str, Any]], format: Any, keep_alive: Any, field: str,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Chunks of one generation in Ollama's format (`field` is "message" for chat, "response" for generate)."""
+        async with self.slots:
+            started = time.perf_counter()
+            load = await self._load(model, keep_alive)
+            text = self.respond(messages, format) if messages else ""
+            prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages) // 4
+            prefill = self._delay(self.ttft + prompt_tokens / self.prefill_tokens_per_second) if messages else 0.0
+            await asyncio.sleep(prefill)
+
+            tokens = _tokens(text)
+            stall_at = self.random.randrange(len(tokens)) if tokens and self.random.random() < self.stall_rate else None
+            drop_at = self.random.randrange(len(tokens)) if tokens and self.random.random() < self.drop_rate else None
+            decode_started = time.perf_counter()
+            for i, token in enumerate(tokens):
+                if i == stall_at:
+                    self.stats["stalled"] += 1
+                    await asyncio.sleep(3600)
+                if i == drop_at:
+                    self.stats["dropped"] += 1
+                    raise ConnectionResetError("injected drop")
+                await asyncio.sleep(self._delay(1 / self.tokens_per_second))
+                yield _chunk(model, field, token, False)
+
+            final = _chunk(model, field, "", True)
+            ns = 1e9
+            final.update({
+                "done_reason": "stop" if messages else "load",
+                "total_duration": int((time.perf_counter() - started) * ns),
+                "load_duration": int(load * ns),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prefill * ns),
+                "eval_count": len(tokens),
+                "eval_duration": int((time.perf_counter() - decode_started) * ns),
+            })
+            yield final
+
+    def ps(self) -> Dict[str, Any]:
+        now = time.time()
+        models = []
+        for model, until in sorted(self.resident.items()):
+            if until <= now:
+                continue
+            expires = datetime.datetime.fromtimestamp(until, datetime.timezone.utc)
+            models.append({
+                "name": model, "model": model, "size": 13_000_000_000, "size_vram": 13_000_000_000,
+                "digest": hashlib.sha256(model.encode()).hexdigest(), "expires_at": expires.isoformat(),
+                "details": {"format": "gguf", "family": "fake", "parameter_size": "fake", "quantization_level": "fake"},
+            })
+        return {"models": models}
+
+
+
+# ----- HELPERS -----
+DIAGNOSES = [
+    "Faulty coolant temperature sensor", "Failed thermostat stuck closed", "Low coolant level from a leaking hose",
+    "Weak starter battery", "Corroded ground strap", "Failing alternator", "Blocked fuel filter",
+    "Air leak in the intake", "Worn brake pads", "Sticking brake caliper", "Defective ABS wheel speed sensor",
+]
+TESTS = [
+    "Is the coolant level below the MIN mark?", "Does the warning light come on with the ignition only?",
+    "Is the battery voltage below 12.4 V with the engine off?", "Is there visible corrosion on the ground strap?",
+    "Does the fault return after clearing the codes?", "Is the fuel filter water separator full?",
+    "Does the brake pedal feel spongy?", "Is there a hissing sound from the intake at idle?",
+    "Is the upper radiator hose cold when the engine is hot?", "Does the ABS light stay on above 10 km/h?",
+]
+STEPS = ["Park on level ground and stop the engine", "Locate the component described", "Inspect it and note what you see"]
+
+
+def _keep_alive_seconds(keep_alive: Any) -> float:
+    if keep_alive is None:
+        return 300.0
+    if isinstance(keep_alive, (int, float)):
+        return float(keep_alive) if keep_alive >= 0 else float("inf")
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?)([smh]?)", str(keep_alive).strip())
+    if not match:
+        return 300.0
+    value = float(match.group(1))
+    return float("inf") if value < 0 else value * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+
+def _schema_has(format: Any, field: str) -> bool:
+    return isinstance(format, dict) and field in (format.get("properties") or {})
+
+
+def _hypotheses(user_message: str) -> List[Tuple[str, str, float]]:
+    match = re.search(r"Current hypotheses: (\[.*\])", user_message)
+    if not match:
+        return []
+    try:
+        return [tuple(h) for h in json.loads(match.group(1))]
+    except ValueError:
+        return []
+
+
+def _tokens(text: str) -> List[str]:
+    # roughly 4 characters per token, split so that concatenating them gives back the text
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+def _chunk(model: str, field: str, text: str, done: bool) -> Dict[str, Any]:
+    body = {"role": "assistant", "content": text} if field == "message" else text
+    return {"model": model, "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(), field: body, "done": done}
+
+
+
+# ----- APP -----
+def create_app(fake: FakeOllama) -> FastAPI:
+    app = FastAPI()
+
+    async def _generation(body: Dict[str, Any], messages: List[Dict[str, Any]], field: str):
+        model = body.get("model") or ""
+        if not fake._exists(model):
+            return JSONResponse({"error": f"model '{model}' not found"}, status_code=404)
+        if messages and fake.random.random() < fake.fail_rate:
+            fake.stats["failed"] += 1
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+        stream = fake.generate(model, messages, body.get("format"), body.get("keep_alive"), field)
+        if body.get("stream", True) is False:
+            text, last = [], None
+            async for chunk in stream:
+                text.append(chunk["message"]["content"] if field == "message" else chunk["response"])
+                last = chunk
+            last[field] = {"role": "assistant", "content": "".join(text)} if field == "message" else "".join(text)
+            return JSONResponse(last)
+
+        async def lines():
+            try:
+                async for chunk in stream:
+                    yield json.dumps(chunk) + "\n"
+            except ConnectionResetError:
+                return
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        fake.stats["chat"] += 1
+        return await _generation(body, body.get("messages") or [], "message")
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        fake.stats["generate"] += 1
+        prompt = body.get("prompt") or ""
+        return await _generation(body, [{"role": "user", "content": prompt}] if prompt else [], "response")
+
+    @app.post("/api/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        fake.stats["embeddings"] += 1
+        return {"embedding": fake.embed(body.get("prompt") or "")}
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        inputs = body.get("input") or ""
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+        fake.stats["embeddings"] += len(inputs)
+        return {"model": body.get("model"), "embeddings": [fake.embed(text) for text in inputs]}
+
+    @app.get("/api/ps")
+    async def ps():
+        return fake.ps()
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": m, "model": m} for m in sorted(fake.models or fake.resident)]}
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "0.0.0-fake"}
+
+    @app.get("/stats")
+    async def stats():
+        return fake.stats
+
+    return app
+
+
+def main():
+    p = argparse.ArgumentParser(description="Fake Ollama server for load tests")
+    p.add_argument("--host", type=str, default="127.0.0.1")
+    p.add_argument("--port", type=int, default=11434, help="Port (Ollama's by default, so the backend needs no changes)")
+    p.add_argument("--ttft", type=float, default=0.5, help="Seconds before the first token, on top of prefill")
+    p.add_argument("--tokens-per-second", type=float, default=40.0, help="Decode rate")
+    p.add_argument("--prefill-tokens-per-second", type=float, default=2000.0, help="Prefill rate")
+    p.add_argument("--load-seconds", type=float, default=5.0, help="Model load time on first use")
+    p.add_argument("--parallel", type=int, default=1, help="Concurrent generations")
+    p.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of generations answered with HTTP 500")
+    p.add_argument("--stall-rate", type=float, default=0.0, help="Fraction of generations that stop mid-stream")
+    p.add_argument("--drop-rate", type=float, default=0.0, help="Fraction of generations whose stream is closed mid-response")
+    p.add_argument("--jitter", type=float, default=0.2, help="Relative random variation of every delay")
+    p.add_argument("--models", nargs="*", help="Models that exist (default: any)")
+    p.add_argument("--script", type=str, help='JSON file of [{"match": regex, "response": text or JSON}] rules, tried first')
+    p.add_argument("--seed", type=int, help="Random seed for timing and failure injection")
+    args = p.parse_args()
+
+    script = json.loads(Path(args.script).read_text(encoding="utf-8")) if args.script else None
+    fake = FakeOllama(
+        ttft=args.ttft, tokens_per_second=args.tokens_per_second, prefill_tokens_per_second=args.prefill_tokens_per_second,
+        load_seconds=args.load_seconds, parallel=args.parallel, fail_rate=args.fail_rate, stall_rate=args.stall_rate,
+        drop_rate=args.drop_rate, jitter=args.jitter, models=args.models, script=script, seed=args.seed,
+    )
+    print(f"Fake Ollama on http://{args.host}:{args.port} (ttft {args.ttft}s, {args.tokens_per_second} tok/s)", flush=True)
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
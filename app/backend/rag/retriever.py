@@ -1,9 +1,45 @@
 from __future__ import annotations
 from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
-import json
+import hashlib, json, time
 import numpy as np
 from ollama import Client
+try:
+    from core.metrics import RAG_SEARCH
+except ImportError: # imported standalone from rag/ (build scripts, quick checks), without the backend packages
+    class _NoMetric:
+        def observe(self, value: float, **labels: str) -> None:
+            pass
+    RAG_SEARCH = _NoMetric()
+
+
+STORE_DIR = Path(__file__).resolve().parent / "store"
+STORE_FILES = ("manifest.json", "meta.jsonl", "index.npy")
+
+
+def store_signature(store_dir: Path = STORE_DIR) -> Tuple[Tuple[int, int], ...]:
+    """(size, mtime) of the store's files: a cheap check for whether build.py has rewritten it."""
+    signature = []
+    for name in STORE_FILES:
+        try:
+            stat = (store_dir / name).stat()
+            signature.append((stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            signature.append((-1, 0))
+    return tuple(signature)
+
+
+def store_fingerprint(store_dir: Path = STORE_DIR) -> Optional[str]:
+    """Content hash of the store (vectors, metadata and manifest), or None if it has not been built."""
+    digest = hashlib.sha1()
+    try:
+        for name in STORE_FILES:
+            with open(store_dir / name, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()[:16]
 
 
 class RagRetriever:
@@ -22,8 +58,7 @@ class RagRetriever:
         base_url: str = "http://localhost:11434",
         embed_model: str = "nomic-embed-text",
     ) -> None:
-        here = Path(__file__).resolve().parent  # .../rag
-        self.store_dir = Path(store_dir) if store_dir is not None else (here / "store")
+        self.store_dir = Path(store_dir) if store_dir is not None else STORE_DIR
         self.index_path = self.store_dir / "index.npy"
         self.meta_path = self.store_dir / "meta.jsonl"
         self.client = Client(host=base_url)
@@ -49,6 +84,9 @@ class RagRetriever:
         self._vecs = vecs
         self._meta = meta
 
+    def fingerprint(self) -> Optional[str]:
+        return store_fingerprint(self.store_dir)
+
     def embed(self, text: str) -> np.ndarray:
         res = self.client.embeddings(model=self.embed_model, prompt=text)
         return np.array(res["embedding"], dtype=np.float32)
@@ -86,10 +124,14 @@ class RagRetriever:
         """
         Returns list of results with fields: score, type, text, image_path?, meta
         """
+        started = time.perf_counter()
         self.ensure_loaded()
         assert self._vecs is not None and self._meta is not None
 
+        loaded = time.perf_counter() # the first search also loads the store
         q = self.embed(query)
+        embedded = time.perf_counter()
+        RAG_SEARCH.observe(embedded - loaded, stage="embed")
         mask = self._build_mask(namespaces=namespaces, systems=systems, types=types)
         if not mask.any():
             return []
@@ -130,6 +172,9 @@ class RagRetriever:
                 item["linked_images"] = m.get("images", [])
             results.append(item)
 
+        done = time.perf_counter()
+        RAG_SEARCH.observe(done - embedded, stage="search")
+        RAG_SEARCH.observe(done - started, stage="total")
         return results
 
 
@@ -0,0 +1,131 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Set, TypedDict
+from pathlib import Path
+import json, random, re
+
+
+FAULT_CODES_PATH = Path(__file__).resolve().parents[3] / "data" / "daf-lf45-lf55" / "fault_codes.json"
+
+_STOPWORDS: Set[str] = {
+    "the", "and", "for", "with", "from", "that", "this", "than", "then", "there", "when", "into", "onto", "over",
+    "does", "have", "will", "your", "you", "are", "not", "any", "all", "due", "see", "also", "been", "were",
+    "check", "inspect", "fault", "faults", "code", "codes", "test", "value", "signal", "vehicle", "truck", "system",
+    "possible", "cause", "causes", "description", "ecu", "unit", "pin", "pins", "circuit", "engine", "light",
+}
+
+
+# ----- TYPES -----
+class AnswerRule(TypedDict):
+    match: str  # regex tried against the test's text and instructions
+    answer: Any
+
+
+class Session(TypedDict, total=False):
+    id: str
+    fault: Dict[str, Any]         # ground truth: an entry of fault_codes.json
+    complaint: str                # the technician's initial description
+    answers: List[AnswerRule]     # scripted answers, tried first
+    default_answer: Any           # used when no rule matches and the oracle is off
+    oracle: bool                  # answer unmatched tests from the ground-truth fault's keywords
+
+
+
+# ----- CORPUS -----
+def load_fault_codes(path: Path = FAULT_CODES_PATH) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_corpus(path: Path) -> List[Session]:
+    """Sessions from a JSONL file (one Session per line), e.g. one written by --write-corpus or recorded by hand."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_corpus(sessions: List[Session], path: Path) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for session in sessions:
+            f.write(json.dumps(session, ensure_ascii=False) + "\n")
+
+
+def synthetic_corpus(
+    faults: List[Dict[str, Any]],
+    count: int,
+    fault_types: Optional[List[str]] = None,
+    code_rate: float = 0.5,
+    seed: int = 0,
+) -> List[Session]:
+    """
+    Sample `count` faults (optionally of the given fault types) and describe each as a technician would:
+    the system and a symptom, plus the dashboard fault code in a `code_rate` share of sessions.
+    Answers come from the keyword oracle (see oracle_answer).
+    """
+    rng = random.Random(seed)
+    pool = [f for f in faults if f.get("fault_name") and (not fault_types or f.get("fault-type") in fault_types)]
+    sessions: List[Session] = []
+    for i, fault in enumerate(rng.sample(pool, min(count, len(pool)))):
+        symptom = _first_clause(fault.get("symptoms")) or _first_clause(fault.get("fault_description")) or fault["fault_name"]
+        complaint = f"Problem with the {fault.get('fault-type')} system: {symptom}."
+        if rng.random() < code_rate:
+            complaint += f" The dashboard shows fault code {fault['fault code']}."
+        sessions.append({
+            "id": f"synthetic-{i:04d}-{fault['fault code']}",
+            "fault": fault,
+            "complaint": complaint,
+            "answers": [],
+            "oracle": True,
+        })
+    return sessions
+
+
+def _first_clause(text: Optional[str]) -> str:
+    text = (text or "").strip()
+    return re.split(r"[;\-]\s|\. ", text, maxsplit=1)[0].strip().rstrip(".") if text else ""
+
+
+
+# ----- ANSWERS -----
+def keywords(text: str) -> Set[str]:
+    return {w for w in re.findall(r"[a-z][a-z0-9]{2,}", (text or "").lower()) if w not in _STOPWORDS}
+
+
+def fault_keywords(fault: Dict[str, Any]) -> Set[str]:
+    fields = ("fault_name", "fault_description", "possible_causes", "symptoms", "fault-type")
+    return keywords(" ".join(str(fault.get(k) or "") for k in fields))
+
+
+def test_text(test: Dict[str, Any]) -> str:
+    steps = " ".join(str(s.get("step_text") or "") for s in test.get("test_instructions") or [] if isinstance(s, dict))
+    return " ".join(str(test.get(k) or "") for k in ("test_text", "name", "description")) + " " + steps
+
+
+def oracle_answer(test: Dict[str, Any], fault: Dict[str, Any], min_overlap: int = 2) -> Any:
+    """
+    Answer as a technician looking at a vehicle with `fault` would, approximated by keyword overlap between the test
+    and the fault: a test about the fault's component or symptoms comes out positive, anything else negative.
+    """
+    fault_words = fault_keywords(fault)
+    kind = test.get("test_result_field_type")
+    options = [o for o in test.get("test_result_field_options") or [] if isinstance(o, str)]
+    if kind == "array" and options:
+        # the option that best describes the fault, else the last (usually "normal"/"no")
+        scored = [(len(keywords(o) & fault_words), -i, o) for i, o in enumerate(options)]
+        best = max(scored)
+        return best[2] if best[0] > 0 else options[-1]
+    positive = len(keywords(test_text(test)) & fault_words) >= min_overlap
+    if kind == "number":
+        return 0 if positive else 100 # e.g. a reading that is out of range
+    if kind == "text":
+        return (fault.get("symptoms") or fault.get("fault_description")) if positive else "Nothing unusual"
+    return positive
+
+
+def answer(session: Session, test: Dict[str, Any]) -> Any:
+    """The scripted answer for `test`: first matching rule, else the oracle, else the session's default."""
+    text = test_text(test)
+    for rule in session.get("answers") or []:
+        if re.search(rule["match"], text, re.I):
+            return rule["answer"]
+    if session.get("oracle", True) and session.get("fault"):
+        return oracle_answer(test, session["fault"])
+    return session.get("default_answer", False)
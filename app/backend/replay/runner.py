@@ -0,0 +1,298 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+import argparse, asyncio, json, statistics, time
+import numpy as np
+from core.issue import IssueContext
+from core.llm import LLMClient, ModelRouter
+from core.agents.turn_cache import TurnCache
+from replay.corpus import Session, answer, fault_keywords, keywords, load_corpus, load_fault_codes, save_corpus, synthetic_corpus
+
+
+"""
+SessionConnection
+Stands in for the client WebSocket of one replayed issue: IssueContext.send() hands it every outbound event,
+which is queued for the session runner.
+"""
+class SessionConnection:
+    def __init__(self):
+        self.events: asyncio.Queue[Dict[str, Any]] = asyncio.Queue()
+
+    async def send_json(self, message: Dict[str, Any]) -> None:
+        self.events.put_nowait(message)
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+
+"""
+Judge
+Decides whether a final diagnosis names the ground-truth fault: cosine similarity of embeddings when the endpoint
+serves them, keyword overlap with the fault otherwise.
+"""
+class Judge:
+    def __init__(self, llm_client: LLMClient, threshold: Optional[float] = None, use_embeddings: bool = True):
+        self.client = llm_client
+        self.use_embeddings = use_embeddings
+        self.threshold = threshold
+        self.method = "embedding" if use_embeddings else "overlap"
+
+    async def score(self, diagnosis: str, fault: Dict[str, Any]) -> float:
+        truth = f"{fault.get('fault_name')}. {fault.get('fault_description') or ''}"
+        if self.use_embeddings:
+            try:
+                a = np.asarray(await self.client.embed(diagnosis), dtype=np.float32)
+                b = np.asarray(await self.client.embed(truth), dtype=np.float32)
+                return float(a @ b / ((np.linalg.norm(a) * np.linalg.norm(b)) + 1e-8))
+            except Exception as e:
+                print(f"Embedding judge unavailable ({e}); falling back to keyword overlap", flush=True)
+                self.use_embeddings, self.method = False, "overlap"
+        words = keywords(diagnosis)
+        return len(words & fault_keywords(fault)) / len(words) if words else 0.0
+
+    def matches(self, score: float) -> bool:
+        threshold = self.threshold if self.threshold is not None else (0.75 if self.method == "embedding" else 0.5)
+        return score >= threshold
+
+
+
+"""
+ReplayRunner
+Runs corpus sessions through the real IssueContext and agent stack (concurrently, sharing one LLMClient as the
+backend does) and records per session: steps to diagnosis, tokens, wall time per turn and whether the diagnosis
+(or one of the top hypotheses, if none was reached) matches the ground-truth fault.
+"""
+class ReplayRunner:
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        judge: Judge,
+        concurrency: int = 4,
+        max_turns: int = 15,
+        turn_timeout: float = 600,
+        speculation: bool = False,
+        with_plan: bool = False,
+        turn_cache: Optional[TurnCache] = None,
+    ):
+        self.client = llm_client
+        self.judge = judge
+        self.slots = asyncio.Semaphore(concurrency)
+        self.max_turns = max_turns
+        self.turn_timeout = turn_timeout
+        self.speculation = speculation
+        self.with_plan = with_plan
+        self.turn_cache = turn_cache
+
+    async def run(self, sessions: List[Session]) -> List[Dict[str, Any]]:
+        return await asyncio.gather(*(self._run_slot(s) for s in sessions))
+
+    async def _run_slot(self, session: Session) -> Dict[str, Any]:
+        async with self.slots:
+            result = await self.run_session(session)
+            print(
+                f"{session['id']}: {result['outcome']} in {result['steps']} steps, "
+                f"{'correct' if result['correct'] else 'wrong'} ({result['diagnosis']!r})",
+                flush=True,
+            )
+            return result
+
+    @staticmethod
+    def _send(issue: IssueContext, type: str, payload: Dict[str, Any]) -> None:
+        # what the WebSocket route adds to inbound messages
+        issue.ingest({"type": type, "payload": payload, "issue_id": issue.id, "v": 1, "source": "test"})
+
+    async def run_session(self, session: Session) -> Dict[str, Any]:
+        issue = IssueContext(self.client, turn_cache=self.turn_cache, issue_params={"speculation": self.speculation})
+        connection = SessionConnection()
+        issue.connection = connection
+        issue.start()
+
+        started = sent_at = time.perf_counter()
+        turns: List[Dict[str, Any]] = []
+        errors: List[str] = []
+        outcome, plan_seconds, answered = "timeout", None, 0
+        self._send(issue, "issue.begin", {
+            "id": "issue_description", "name": "Issue Description",
+            "description": "Initial description provided by the user", "rationale": "", "outcomes": {},
+            "result": session["complaint"],
+        })
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(connection.events.get(), timeout=self.turn_timeout)
+                except asyncio.TimeoutError:
+                    break
+                kind, payload = event.get("type"), event.get("payload") or {}
+                now = time.perf_counter()
+                if kind == "diagnostics.test":
+                    turns.append({"seconds": now - sent_at, "source": None})
+                    if len(turns) > self.max_turns:
+                        outcome = "max_turns"
+                        break
+                    self._send(issue, "diagnostics.test_result", {"test_id": payload.get("test_id"), "result": answer(session, payload)})
+                    sent_at, answered = time.perf_counter(), answered + 1
+                elif kind == "diagnostics.latency" and turns:
+                    turns[-1]["source"] = payload.get("source")
+                elif kind == "maintenance.loading" and payload.get("status") == "started":
+                    turns.append({"seconds": now - sent_at, "source": "diagnosis"}) # the turn that reached the threshold
+                    outcome = "diagnosed"
+                    if not self.with_plan:
+                        break
+                elif kind == "maintenance.plan":
+                    plan_seconds = now - sent_at
+                    break
+                elif kind in ("diagnostics.error", "maintenance.error"):
+                    errors.append(f"{kind}: {payload.get('message')}")
+                    if kind == "maintenance.error" or len(errors) >= 3:
+                        outcome = "diagnosed" if kind == "maintenance.error" else "error"
+                        break
+        finally:
+            usage = dict(self.client.usage.get(issue.id) or {})
+            hypotheses = issue.probability_engine.as_list()
+            diagnosis = issue.active_diagnosis
+            await issue.stop()
+
+        # accuracy: the diagnosis reached, else the hypotheses ranked at the end
+        fault = session.get("fault") or {}
+        ranked = [diagnosis] if diagnosis is not None else hypotheses[:3]
+        scores = [await self.judge.score(h["diagnosis"], fault) for h in ranked] if fault else []
+        return {
+            "id": session["id"],
+            "fault_code": fault.get("fault code"),
+            "fault_type": fault.get("fault-type"),
+            "fault_name": fault.get("fault_name"),
+            "outcome": outcome,
+            "steps": answered, # tests the technician carried out
+            "diagnosis": (ranked[0]["diagnosis"] if ranked else None),
+            "probability": (ranked[0]["probability"] if ranked else None),
+            "score": scores[0] if scores else None,
+            "correct": bool(diagnosis is not None and scores and self.judge.matches(scores[0])),
+            "top3": bool(scores and any(self.judge.matches(s) for s in scores)),
+            "turn_seconds": [round(t["seconds"], 3) for t in turns],
+            "turn_sources": [t["source"] for t in turns],
+            "wall_seconds": round(time.perf_counter() - started, 3),
+            "plan_seconds": round(plan_seconds, 3) if plan_seconds is not None else None,
+            "llm_calls": usage.get("calls", 0),
+            "prompt_tokens": usage.get("prompt_eval_count", 0),
+            "completion_tokens": usage.get("eval_count", 0),
+            "errors": errors,
+        }
+
+
+
+# ----- REPORT -----
+def summarise(results: List[Dict[str, Any]], judge: Judge) -> Dict[str, Any]:
+    def dist(values: List[float]) -> Dict[str, Optional[float]]:
+        if not values:
+            return {"mean": None, "p50": None, "p90": None, "max": None}
+        ordered = sorted(values)
+        return {
+            "mean": round(statistics.fmean(ordered), 3),
+            "p50": round(ordered[len(ordered) // 2], 3),
+            "p90": round(ordered[min(len(ordered) - 1, int(0.9 * len(ordered)))], 3),
+            "max": round(ordered[-1], 3),
+        }
+
+    diagnosed = [r for r in results if r["outcome"] == "diagnosed"]
+    outcomes: Dict[str, int] = {}
+    for r in results:
+        outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+    by_type: Dict[str, Dict[str, Any]] = {}
+    for r in results:
+        entry = by_type.setdefault(r["fault_type"] or "unknown", {"sessions": 0, "correct": 0})
+        entry["sessions"] += 1
+        entry["correct"] += int(r["correct"])
+    n = len(results) or 1
+    return {
+        "sessions": len(results),
+        "outcomes": outcomes,
+        "judge": judge.method,
+        "accuracy": round(sum(r["correct"] for r in results) / n, 3),
+        "top3_accuracy": round(sum(r["top3"] for r in results) / n, 3),
+        "accuracy_when_diagnosed": round(sum(r["correct"] for r in diagnosed) / len(diagnosed), 3) if diagnosed else None,
+        "steps_to_diagnosis": dist([r["steps"] for r in diagnosed]),
+        "tokens_per_session": dist([r["prompt_tokens"] + r["completion_tokens"] for r in results]),
+        "completion_tokens_per_session": dist([r["completion_tokens"] for r in results]),
+        "llm_calls_per_session": dist([r["llm_calls"] for r in results]),
+        "turn_seconds": dist([s for r in results for s in r["turn_seconds"]]),
+        "session_seconds": dist([r["wall_seconds"] for r in results]),
+        "accuracy_by_fault_type": {k: round(v["correct"] / v["sessions"], 3) for k, v in sorted(by_type.items())},
+    }
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    print(f"\n{summary['sessions']} sessions: " + ", ".join(f"{k}={v}" for k, v in sorted(summary["outcomes"].items())))
+    print(f"accuracy {summary['accuracy']:.1%} (top-3 {summary['top3_accuracy']:.1%}, judged by {summary['judge']})")
+    for key in ("steps_to_diagnosis", "tokens_per_session", "completion_tokens_per_session", "llm_calls_per_session", "turn_seconds", "session_seconds"):
+        stats = summary[key]
+        print(f"  {key:<30} " + "  ".join(f"{k}={v}" for k, v in stats.items()))
+    print("accuracy by fault type:")
+    for fault_type, accuracy in summary["accuracy_by_fault_type"].items():
+        print(f"  {fault_type:<30} {accuracy:.1%}")
+
+
+async def _main(args) -> None:
+    if args.corpus:
+        sessions = load_corpus(Path(args.corpus))
+    else:
+        sessions = synthetic_corpus(load_fault_codes(), args.synthetic, fault_types=args.fault_types, code_rate=args.code_rate, seed=args.seed)
+    if args.write_corpus:
+        save_corpus(sessions, Path(args.write_corpus))
+        print(f"Corpus of {len(sessions)} sessions written to {args.write_corpus}", flush=True)
+
+    router = None if args.no_router else ModelRouter(models={"large": args.model, **({"small": args.small_model} if args.small_model else {})})
+    client = LLMClient(base_url=args.base_url, model=args.model, keep_alive="30m", router=router)
+    client.scheduler.concurrency = args.llm_concurrency
+    turn_cache = TurnCache(client.embed, directory=args.turn_cache_dir) if args.turn_cache_dir else None
+    judge = Judge(client, threshold=args.match_threshold, use_embeddings=not args.no_embedding_judge)
+    runner = ReplayRunner(
+        client, judge, concurrency=args.concurrency, max_turns=args.max_turns, turn_timeout=args.turn_timeout,
+        speculation=args.speculation, with_plan=args.with_plan, turn_cache=turn_cache,
+    )
+    print(f"Replaying {len(sessions)} sessions against {args.base_url} ({args.concurrency} at a time)", flush=True)
+    try:
+        results = await runner.run(sessions)
+    finally:
+        await client.close()
+
+    summary = summarise(results, judge)
+    print_summary(summary)
+    if args.out:
+        out = Path(args.out)
+        out.mkdir(parents=True, exist_ok=True)
+        with open(out / "sessions.jsonl", "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        (out / "summary.json").write_text(json.dumps({"args": vars(args), **summary}, indent=2), encoding="utf-8")
+        print(f"Results written to {out}")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Replay diagnostics sessions through IssueContext and evaluate speed and accuracy")
+    source = p.add_mutually_exclusive_group()
+    source.add_argument("--corpus", type=str, help="JSONL corpus of sessions (see replay/corpus.py)")
+    source.add_argument("--synthetic", type=int, default=20, help="Number of synthetic sessions sampled from fault_codes.json")
+    p.add_argument("--fault-types", nargs="*", help="Restrict synthetic sessions to these fault types")
+    p.add_argument("--code-rate", type=float, default=0.5, help="Share of synthetic complaints that include the fault code")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--write-corpus", type=str, help="Save the sessions played (e.g. the synthetic corpus) to this JSONL file")
+    p.add_argument("--base-url", type=str, default="http://localhost:11434", help="Ollama endpoint")
+    p.add_argument("--model", type=str, default="gpt-oss:20b", help="Large model")
+    p.add_argument("--small-model", type=str, help="Small model for light calls (default: the router's)")
+    p.add_argument("--no-router", action="store_true", help="Send every call to --model")
+    p.add_argument("--concurrency", type=int, default=4, help="Sessions run at once")
+    p.add_argument("--llm-concurrency", type=int, default=1, help="Generations run at once (the scheduler's slots)")
+    p.add_argument("--max-turns", type=int, default=15, help="Give up on a session after this many tests")
+    p.add_argument("--turn-timeout", type=float, default=600, help="Seconds to wait for the next event")
+    p.add_argument("--speculation", action="store_true", help="Keep speculative turns on (they run while the scripted answer is instant)")
+    p.add_argument("--with-plan", action="store_true", help="Also generate the maintenance plan after the diagnosis")
+    p.add_argument("--turn-cache-dir", type=str, help="Use (and fill) the semantic turn cache in this directory")
+    p.add_argument("--match-threshold", type=float, help="Judge score needed for a correct diagnosis (default 0.75 embedding / 0.5 overlap)")
+    p.add_argument("--no-embedding-judge", action="store_true", help="Judge diagnoses by keyword overlap only")
+    p.add_argument("--out", type=str, help="Directory for sessions.jsonl and summary.json")
+    asyncio.run(_main(p.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+from __future__ import annotations
+import io, wave
+import numpy as np
+
+
+SAMPLE_RATE = 16000 # what Whisper expects
+AUDIO_FORMATS = ("wav", "pcm_s16le", "pcm_f32le")
+
+
+def decode_audio(data: bytes, format: str = "wav", sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode uploaded audio into mono float32 samples at 16 kHz, without ffmpeg.
+    `format` is a WAV file (16/32-bit PCM; its header gives the rate) or raw little-endian PCM at `sample_rate`.
+    Raises ValueError for anything else.
+    """
+    if format not in AUDIO_FORMATS:
+        raise ValueError(f"Unsupported audio format '{format}' (expected one of {', '.join(AUDIO_FORMATS)})")
+    if not data:
+        raise ValueError("No audio received")
+
+    channels = 1
+    if format == "wav":
+        try:
+            with wave.open(io.BytesIO(data), "rb") as wav:
+                channels, width, sample_rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+                frames = wav.readframes(wav.getnframes())
+        except (wave.Error, EOFError) as e:
+            raise ValueError(f"Invalid WAV file: {e}") from None
+        if width == 2:
+            samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+        elif width == 4:
+            samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648.0
+        else:
+            raise ValueError(f"Unsupported WAV sample width: {width * 8} bits")
+    elif format == "pcm_s16le":
+        samples = np.frombuffer(data[: len(data) // 2 * 2], dtype="<i2").astype(np.float32) / 32768.0
+    else:
+        samples = np.frombuffer(data[: len(data) // 4 * 4], dtype="<f4").astype(np.float32)
+
+    if channels > 1:
+        samples = samples[: len(samples) // channels * channels].reshape(-1, channels).mean(axis=1)
+    return resample(samples, sample_rate)
+
+
+def resample(samples: np.ndarray, sample_rate: int, target_rate: int = SAMPLE_RATE) -> np.ndarray:
+    # linear interpolation is plenty for speech recognition input
+    if sample_rate == target_rate or len(samples) == 0:
+        return samples.astype(np.float32, copy=False)
+    duration = len(samples) / sample_rate
+    target = np.linspace(0, duration, int(round(duration * target_rate)), endpoint=False)
+    source = np.arange(len(samples)) / sample_rate
+    return np.interp(target, source, samples).astype(np.float32)
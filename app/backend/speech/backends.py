@@ -0,0 +1,136 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Dict, Optional, Type
+import importlib.util, os, time
+
+if TYPE_CHECKING:
+    import numpy as np # kept out of module import: the API reads BACKEND_CHOICES before numpy is warm
+
+
+class SpeechUnavailable(RuntimeError):
+    """The speech model could not be loaded (e.g. whisper is not installed)."""
+
+
+
+# ----- DEFAULTS -----
+def default_threads() -> int:
+    # inference is compute bound: physical cores beat hyperthreads, and leave one core for capture and the app
+    logical = os.cpu_count() or 1
+    return max(1, logical // 2 - 1) if logical > 2 else 1
+
+
+def default_device() -> str:
+    try:
+        import torch
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    except ImportError:
+        return "cpu"
+
+
+def default_compute_type(device: str) -> str:
+    # int8 weights are ~4x smaller and 2-4x faster than fp32 on CPU for a small accuracy cost
+    return "float16" if device.startswith("cuda") else "int8"
+
+
+
+"""
+SpeechBackend
+A speech-to-text engine behind one interface: load() once (slow), then transcribe() mono float32 16 kHz samples
+as often as needed. Backends import their library in load(), so picking one never costs the others' imports.
+"""
+class SpeechBackend:
+    name = "base"
+
+    def __init__(self, model_size: str = "base", device: Optional[str] = None, threads: Optional[int] = None, compute_type: Optional[str] = None):
+        self.model_size = model_size
+        self.device = device
+        self.threads = threads or default_threads()
+        self.compute_type = compute_type
+        self.model: Any = None
+        self.load_seconds: Optional[float] = None
+
+    def load(self) -> None:
+        started = time.perf_counter()
+        self._load()
+        self.load_seconds = time.perf_counter() - started
+
+    def _load(self) -> None:
+        raise NotImplementedError
+
+    def transcribe(self, audio: np.ndarray, language: Optional[str] = None) -> Dict[str, Any]:
+        """Returns {"text", "language"}."""
+        raise NotImplementedError
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": self.name, "model": self.model_size, "device": self.device, "threads": self.threads, "compute_type": self.compute_type}
+
+
+class WhisperBackend(SpeechBackend):
+    """openai-whisper (PyTorch); fp32 on CPU, fp16 on GPU."""
+    name = "whisper"
+
+    def _load(self) -> None:
+        try:
+            import torch, whisper
+        except ImportError:
+            raise SpeechUnavailable("openai-whisper is not installed (pip install openai-whisper)") from None
+        self.device = self.device or default_device()
+        self.compute_type = "float16" if self.device.startswith("cuda") else "float32"
+        if self.device == "cpu":
+            torch.set_num_threads(self.threads)
+        self.model = whisper.load_model(self.model_size, device=self.device)
+
+    def transcribe(self, audio: np.ndarray, language: Optional[str] = None) -> Dict[str, Any]:
+        # passing samples (not a path) skips whisper's ffmpeg decoding
+        result = self.model.transcribe(audio.astype("float32", copy=False), fp16=self.compute_type == "float16", language=language)
+        return {"text": (result.get("text") or "").strip(), "language": result.get("language")}
+
+
+class FasterWhisperBackend(SpeechBackend):
+    """faster-whisper (CTranslate2); int8 on CPU by default."""
+    name = "faster-whisper"
+
+    def _load(self) -> None:
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise SpeechUnavailable("faster-whisper is not installed (pip install faster-whisper)") from None
+        self.device = self.device or default_device()
+        self.compute_type = self.compute_type or default_compute_type(self.device)
+        self.model = WhisperModel(self.model_size, device=self.device, compute_type=self.compute_type, cpu_threads=self.threads)
+
+    def transcribe(self, audio: np.ndarray, language: Optional[str] = None) -> Dict[str, Any]:
+        segments, info = self.model.transcribe(audio.astype("float32", copy=False), language=language, beam_size=5)
+        text = "".join(segment.text for segment in segments) # segments is lazy: decoding happens here
+        return {"text": text.strip(), "language": info.language}
+
+
+class StubBackend(SpeechBackend):
+    """No model: returns `text` (or a description of the audio) instantly, for tests and load tests."""
+    name = "stub"
+
+    def __init__(self, *args, text: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.text = text
+
+    def _load(self) -> None:
+        self.device, self.compute_type, self.model = "cpu", "none", "stub"
+
+    def transcribe(self, audio: np.ndarray, language: Optional[str] = None) -> Dict[str, Any]:
+        text = self.text if self.text is not None else f"{len(audio) / 16000:.1f} seconds of audio"
+        return {"text": text, "language": language or "en"}
+
+
+BACKENDS: Dict[str, Type[SpeechBackend]] = {b.name: b for b in (WhisperBackend, FasterWhisperBackend, StubBackend)}
+BACKEND_CHOICES = ("auto",) + tuple(BACKENDS)
+
+
+def create_backend(name: str = "auto", model_size: str = "base", **kwargs) -> SpeechBackend:
+    """
+    Backend by name; "auto" prefers faster-whisper (int8 on CPU) when installed and falls back to openai-whisper.
+    The model is not loaded yet (see SpeechBackend.load).
+    """
+    if name == "auto":
+        name = "faster-whisper" if importlib.util.find_spec("faster_whisper") else "whisper"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown speech backend '{name}' (expected one of {', '.join(BACKEND_CHOICES)})")
+    return BACKENDS[name](model_size, **kwargs)
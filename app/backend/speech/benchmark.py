@@ -0,0 +1,157 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+import argparse, json, re, subprocess, sys, time
+from speech.audio import SAMPLE_RATE, decode_audio
+from speech.backends import BACKENDS, SpeechUnavailable, create_backend
+
+
+"""
+Speech benchmark
+Runs a folder of WAV recordings through each backend x model size and reports load time, real-time factor
+(inference seconds per audio second; below 1 is faster than real time), peak RSS and word error rate against
+reference transcripts (`<name>.txt` next to each `<name>.wav`, or --references, a JSON object of file name -> text).
+Every combination runs in its own process so load time and peak memory are not skewed by the previous one.
+
+    python -m speech.benchmark recordings/ --backends whisper faster-whisper --models tiny base small
+"""
+
+
+# ----- WORD ERROR RATE -----
+def normalise(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9']+", (text or "").lower())
+
+
+def word_errors(reference: str, hypothesis: str) -> Tuple[int, int]:
+    """(substitutions + deletions + insertions, reference words): word-level Levenshtein distance."""
+    ref, hyp = normalise(reference), normalise(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i]
+        for j, h in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h)))
+        previous = current
+    return previous[-1], len(ref)
+
+
+
+# ----- WORKER (one backend x model per process) -----
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError: # Windows
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / 2**20, 1)
+        except (ImportError, AttributeError):
+            return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round((rss if sys.platform == "darwin" else rss * 1024) / 2**20, 1)
+
+
+def load_recordings(directory: Path, references: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+    recordings = []
+    for path in sorted(directory.glob("*.wav")):
+        reference = (references or {}).get(path.name)
+        if reference is None and path.with_suffix(".txt").exists():
+            reference = path.with_suffix(".txt").read_text(encoding="utf-8").strip()
+        recordings.append({"file": path.name, "audio": decode_audio(path.read_bytes(), format="wav"), "reference": reference})
+    return recordings
+
+
+def run_one(backend: str, model: str, directory: Path, references: Optional[Dict[str, str]] = None,
+            threads: Optional[int] = None, compute_type: Optional[str] = None) -> Dict[str, Any]:
+    recordings = load_recordings(directory, references)
+    engine = create_backend(backend, model, threads=threads, compute_type=compute_type)
+    result: Dict[str, Any] = {**engine.describe(), "baseline_rss_mb": _peak_rss_mb()}
+    try:
+        engine.load()
+    except SpeechUnavailable as e:
+        return {**result, "error": str(e)}
+    result.update(engine.describe())
+    result["load_seconds"] = round(engine.load_seconds, 3)
+
+    files, errors, words, audio_total, inference_total = [], 0, 0, 0.0, 0.0
+    for recording in recordings:
+        started = time.perf_counter()
+        text = engine.transcribe(recording["audio"])["text"]
+        seconds = time.perf_counter() - started
+        audio_seconds = len(recording["audio"]) / SAMPLE_RATE
+        audio_total += audio_seconds
+        inference_total += seconds
+        entry = {"file": recording["file"], "audio_seconds": round(audio_seconds, 2), "seconds": round(seconds, 3), "text": text}
+        if recording["reference"] is not None:
+            e, n = word_errors(recording["reference"], text)
+            errors, words = errors + e, words + n
+            entry["wer"] = round(e / n, 4) if n else None
+        files.append(entry)
+
+    result.update({
+        "files": files,
+        "audio_seconds": round(audio_total, 2),
+        "inference_seconds": round(inference_total, 3),
+        "realtime_factor": round(inference_total / audio_total, 3) if audio_total else None,
+        "wer": round(errors / words, 4) if words else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    })
+    return result
+
+
+
+# ----- DRIVER -----
+def run_isolated(backend: str, model: str, args) -> Dict[str, Any]:
+    command = [sys.executable, "-m", "speech.benchmark", str(args.directory), "--worker", "--backends", backend, "--models", model]
+    for flag in ("references", "threads", "compute_type"):
+        if getattr(args, flag) is not None:
+            command += [f"--{flag.replace('_', '-')}", str(getattr(args, flag))]
+    print(f"Benchmarking {backend} '{model}'...", flush=True)
+    process = subprocess.run(command, cwd=Path(__file__).resolve().parent.parent, capture_output=True, text=True)
+    try:
+        return json.loads(process.stdout.strip().splitlines()[-1])
+    except (IndexError, json.JSONDecodeError):
+        return {"backend": backend, "model": model, "error": (process.stderr.strip().splitlines() or ["no output"])[-1]}
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    def cell(value: Any, suffix: str = "") -> str:
+        return "-" if value is None else f"{value}{suffix}"
+
+    print(f"\n{'backend':<16}{'model':<10}{'compute':<10}{'threads':>8}{'load':>9}{'rtf':>8}{'wer':>8}{'peak rss':>11}")
+    for r in results:
+        if r.get("error"):
+            print(f"{r['backend']:<16}{r['model']:<10}{r['error']}")
+            continue
+        wer = None if r.get("wer") is None else f"{r['wer'] * 100:.1f}%"
+        print(f"{r['backend']:<16}{r['model']:<10}{cell(r.get('compute_type')):<10}{cell(r.get('threads')):>8}"
+              f"{cell(r.get('load_seconds'), 's'):>9}{cell(r.get('realtime_factor')):>8}{cell(wer):>8}{cell(r.get('peak_rss_mb'), 'MB'):>11}")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark speech-to-text backends on a folder of WAV recordings")
+    p.add_argument("directory", type=Path, help="Folder of .wav files (with optional .txt reference transcripts)")
+    p.add_argument("--backends", nargs="+", default=["whisper", "faster-whisper"], choices=list(BACKENDS))
+    p.add_argument("--models", nargs="+", default=["tiny", "base", "small"], help="Model sizes to try")
+    p.add_argument("--references", type=str, help="JSON file mapping file name -> reference transcript")
+    p.add_argument("--threads", type=int, help="CPU threads (default: physical cores - 1)")
+    p.add_argument("--compute-type", type=str, help="faster-whisper compute type (default: int8 on CPU)")
+    p.add_argument("--json", type=str, help="Also write the results to this JSON file")
+    p.add_argument("--worker", action="store_true", help=argparse.SUPPRESS) # run a single combination in this process
+    args = p.parse_args()
+
+    if args.worker:
+        references = json.loads(Path(args.references).read_text(encoding="utf-8")) if args.references else None
+        result = run_one(args.backends[0], args.models[0], args.directory, references, args.threads, args.compute_type)
+        print(json.dumps(result))
+        return
+
+    if not any(args.directory.glob("*.wav")):
+        p.error(f"no .wav files in {args.directory}")
+    results = [run_isolated(backend, model, args) for backend in args.backends for model in args.models]
+    print_table(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
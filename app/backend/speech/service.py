@@ -0,0 +1,180 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio, time
+import numpy as np
+from core import metrics
+from speech.audio import SAMPLE_RATE
+from speech.backends import SpeechUnavailable, create_backend
+
+
+class SpeechBusy(RuntimeError):
+    """The transcription queue is full."""
+
+
+
+"""
+TranscriptionService
+Speech-to-text inside the backend with a resident Whisper model (see speech/backends.py), instead of a fresh process (and model load) per
+voice input. The model is loaded once, lazily or in the background at startup, on a dedicated worker thread that
+also runs every inference, so transcriptions are serialised and never block the event loop. Requests wait in a
+bounded queue; when it is full, transcribe() raises SpeechBusy instead of piling up work.
+"""
+class TranscriptionService:
+    def __init__(
+        self,
+        model_size: str = "base",
+        max_queue: int = 4,                 # requests waiting for the model (beyond the one running)
+        backend: str = "auto",              # whisper, faster-whisper, stub or auto (faster-whisper when installed)
+        device: Optional[str] = None,       # None: cuda when available
+        threads: Optional[int] = None,      # CPU inference threads (None: physical cores - 1)
+        compute_type: Optional[str] = None, # faster-whisper only (None: int8 on CPU, float16 on GPU)
+        language: Optional[str] = None,     # default language (None: detected per request)
+    ):
+        self.model_size = model_size
+        self.backend = create_backend(backend, model_size, device=device, threads=threads, compute_type=compute_type)
+        self.language = language
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speech")
+        self._queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue(maxsize=max_queue)
+        self._load: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        self.load_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.stats: Dict[str, Any] = {"transcribed": 0, "rejected": 0, "failed": 0, "audio_seconds": 0.0, "inference_seconds": 0.0}
+
+    # ---- lifecycle ----
+    def start(self, preload: bool = True) -> None:
+        """Start the worker; with `preload` the model starts loading now, in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._worker(), name="speech-worker")
+        if preload:
+            self.ensure_loaded()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            if not job["future"].done():
+                job["future"].set_exception(SpeechUnavailable("Speech service stopped"))
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def ensure_loaded(self) -> asyncio.Future:
+        """Load the model on the worker thread (once); returns the pending or finished load."""
+        if self._load is None:
+            self._load = asyncio.get_running_loop().run_in_executor(self._executor, self._load_model)
+            self._load.add_done_callback(self._loaded)
+        return self._load
+
+    def _load_model(self) -> None:
+        # the backend imports its (heavy) library here, on the worker thread, the first time it is needed
+        self.backend.load()
+        self.load_seconds = self.backend.load_seconds
+        self.last_error = None
+        metrics.SPEECH_DURATION.observe(self.load_seconds, stage="load")
+        config = self.backend.describe()
+        print(f"Speech model loaded in {self.load_seconds:.1f}s: {config['backend']} '{self.model_size}' on {config['device']} "
+              f"({config['compute_type']}, {config['threads']} threads)", flush=True)
+
+    def _loaded(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            self._load = None
+            return
+        error = future.exception()
+        if error is not None:
+            self.last_error = f"{type(error).__name__}: {error}"
+            self._load = None # retried by the next request
+            print(f"Whisper model failed to load: {self.last_error}", flush=True)
+
+    @property
+    def loaded(self) -> bool:
+        return self.backend.model is not None
+
+    # ---- transcription ----
+    async def transcribe(self, audio: np.ndarray, language: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Transcribe mono float32 16 kHz samples (see speech.audio.decode_audio).
+        Returns {"text", "language", "timing": {queue_seconds, load_seconds, inference_seconds, total_seconds,
+        audio_seconds, realtime_factor}}.
+        """
+        if self._task is None:
+            self.start(preload=False)
+        job = {
+            "audio": audio,
+            "language": language or self.language,
+            "future": asyncio.get_running_loop().create_future(),
+            "queued_at": time.perf_counter(),
+        }
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            metrics.SPEECH_REQUESTS.inc(outcome="rejected")
+            raise SpeechBusy(f"{self._queue.qsize()} transcriptions already waiting") from None
+        return await job["future"]
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            future: asyncio.Future = job["future"]
+            if future.done():
+                continue # the caller went away while queued
+            started = time.perf_counter()
+            try:
+                was_loaded = self.loaded
+                try:
+                    await self.ensure_loaded()
+                except SpeechUnavailable:
+                    raise
+                except Exception as e:
+                    raise SpeechUnavailable(f"Whisper model failed to load: {e}") from e
+                loaded_at = time.perf_counter()
+                result = await loop.run_in_executor(self._executor, self._infer, job["audio"], job["language"])
+            except Exception as e:
+                self.stats["failed"] += 1
+                metrics.SPEECH_REQUESTS.inc(outcome="failed")
+                if not future.done():
+                    future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            audio_seconds = len(job["audio"]) / SAMPLE_RATE
+            inference = finished - loaded_at
+            timing = {
+                "queue_seconds": round(started - job["queued_at"], 3),
+                "load_seconds": round(loaded_at - started, 3) if not was_loaded else 0.0,
+                "inference_seconds": round(inference, 3),
+                "total_seconds": round(finished - job["queued_at"], 3),
+                "audio_seconds": round(audio_seconds, 3),
+                "realtime_factor": round(inference / audio_seconds, 3) if audio_seconds else None,
+            }
+            self.stats["transcribed"] += 1
+            self.stats["audio_seconds"] += audio_seconds
+            self.stats["inference_seconds"] += inference
+            metrics.SPEECH_REQUESTS.inc(outcome="ok")
+            metrics.SPEECH_DURATION.observe(started - job["queued_at"], stage="queue")
+            metrics.SPEECH_DURATION.observe(inference, stage="inference")
+            if not future.done():
+                future.set_result({**result, "timing": timing})
+
+    def _infer(self, audio: np.ndarray, language: Optional[str]) -> Dict[str, Any]:
+        return self.backend.transcribe(audio, language=language)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self.backend.describe(),
+            "loaded": self.loaded,
+            "loading": self._load is not None and not self._load.done(),
+            "load_seconds": round(self.load_seconds, 2) if self.load_seconds is not None else None,
+            "queued": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "last_error": self.last_error,
+            **self.stats,
+        }
@@ -0,0 +1,100 @@
+from __future__ import annotations
+from typing import Optional
+import threading
+import numpy as np
+
+
+"""
+RingBuffer
+Fixed-capacity float32 sample buffer written from the audio callback thread and read by absolute sample position,
+so the capture side never allocates and memory stays bounded however long the microphone is open.
+"""
+class RingBuffer:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self._lock = threading.Lock()
+        self._written = threading.Condition(self._lock)
+        self.total = 0 # samples written since creation (absolute position of the next sample)
+
+    def write(self, samples: np.ndarray) -> None:
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)[-self.capacity:]
+        with self._lock:
+            start = self.total % self.capacity
+            first = min(len(samples), self.capacity - start)
+            self._data[start : start + first] = samples[:first]
+            self._data[: len(samples) - first] = samples[first:]
+            self.total += len(samples)
+            self._written.notify_all()
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """Samples [start, end) by absolute position; anything already overwritten is dropped from the front."""
+        with self._lock:
+            start = max(start, self.total - self.capacity, 0)
+            end = min(end, self.total)
+            if end <= start:
+                return np.zeros(0, dtype=np.float32)
+            a, b = start % self.capacity, end % self.capacity
+            if a < b:
+                return self._data[a:b].copy()
+            return np.concatenate((self._data[a:], self._data[:b]))
+
+    def wait_for(self, position: int, timeout: float) -> bool:
+        """Block until `position` samples have been written (or the timeout passes)."""
+        with self._lock:
+            return self._written.wait_for(lambda: self.total >= position, timeout=timeout)
+
+
+
+"""
+EnergyVAD
+Frame-level voice-activity detection on signal energy, with an adaptive noise floor so it works in a quiet office
+and next to an idling truck alike. Speech starts after `start_ms` of frames well above the noise floor and the
+utterance ends after `silence_ms` of frames back near it. Feed it fixed-size frames (e.g. 30 ms) with update().
+"""
+class EnergyVAD:
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 30,
+        start_ms: int = 90,         # speech needed before the utterance counts as started
+        silence_ms: int = 800,      # trailing silence that ends the utterance
+        ratio: float = 3.0,         # speech = frame RMS above ratio x noise floor...
+        min_rms: float = 0.005,     # ...and above this absolute level (about -46 dBFS)
+    ):
+        self.frame_length = int(sample_rate * frame_ms / 1000)
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.silence_frames = max(1, silence_ms // frame_ms)
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.noise_floor: Optional[float] = None
+        self.in_speech = False
+        self.ended = False
+        self._speech_run = 0
+        self._silence_run = 0
+
+    def is_speech(self, frame: np.ndarray) -> bool:
+        rms = float(np.sqrt(np.mean(np.square(frame)))) if len(frame) else 0.0
+        if self.noise_floor is None:
+            self.noise_floor = rms
+        speech = rms > max(self.noise_floor * self.ratio, self.min_rms)
+        if not speech:
+            # track the background slowly; fall quickly so a loud start doesn't stick
+            alpha = 0.05 if rms > self.noise_floor else 0.3
+            self.noise_floor += alpha * (rms - self.noise_floor)
+        return speech
+
+    def update(self, frame: np.ndarray) -> Optional[str]:
+        """Process one frame; returns "start" or "end" when the utterance starts or ends, else None."""
+        speech = self.is_speech(frame)
+        if not self.in_speech:
+            self._speech_run = self._speech_run + 1 if speech else 0
+            if self._speech_run >= self.start_frames and not self.ended:
+                self.in_speech, self._silence_run = True, 0
+                return "start"
+            return None
+        self._silence_run = 0 if speech else self._silence_run + 1
+        if self._silence_run >= self.silence_frames:
+            self.in_speech, self.ended = False, True
+            return "end"
+        return None
@@ -0,0 +1,46 @@
+import asyncio
+from core.agents import compaction
+
+
+class StallingClient:
+    async def chat(self, messages, **kwargs):
+        await asyncio.sleep(3600)
+        yield {"thinking": None, "content": "summary", "done": True, "metrics": None}
+
+
+def _start_fold(compactor: compaction.TestsLogCompactor) -> asyncio.Task:
+    compactor._fold_task = asyncio.create_task(compactor._fold([["test", "ok", {}]], 1, []), name="tests-log-fold")
+    return compactor._fold_task
+
+
+def _generation() -> asyncio.Task:
+    return next(t for t in asyncio.all_tasks() if t.get_name() == "tests-log-fold-generate")
+
+
+def test_preempted_fold_ends_quietly():
+    async def scenario():
+        compactor = compaction.TestsLogCompactor(StallingClient())
+        fold = _start_fold(compactor)
+        await asyncio.sleep(0)
+        _generation().cancel() # what the scheduler does to the task holding the slot
+        await fold
+        assert not fold.cancelled() and compactor.folded == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_fold_propagates_cancellation():
+    async def scenario():
+        compactor = compaction.TestsLogCompactor(StallingClient())
+        fold = _start_fold(compactor)
+        await asyncio.sleep(0)
+        generation = _generation()
+        compactor.cancel()
+        try:
+            await fold
+        except asyncio.CancelledError:
+            pass
+        await asyncio.sleep(0)
+        assert fold.cancelled() and generation.cancelled()
+
+    asyncio.run(scenario())
@@ -0,0 +1,56 @@
+import asyncio
+import json
+from core.agents.diagnostics import LLMDiagnosticsAgent
+from core.agents.probability import ProbabilityEngine
+
+
+def _slate(turn: int) -> str:
+    # a realistically sized answer: four candidates with instructions, warnings and likelihood tables
+    candidates = [{
+        "test_text": f"Turn {turn} candidate {i}: check the wheel speed sensor wiring between the sensor and the ECU connector",
+        "test_instructions": [{"step_number": str(s), "step_text": f"Step {s}: disconnect, inspect and measure pin {s} against ground"} for s in range(1, 5)],
+        "test_result_field_label": "What did you find?",
+        "test_result_field_type": "boolean",
+        "test_result_field_options": [],
+        "safety_and_warnings": ["Switch off the ignition before disconnecting connectors."],
+        "effort": 2,
+        "likelihoods": {"h1": [0.8, 0.2], "h2": [0.3, 0.7], "h3": [0.5, 0.5]},
+    } for i in range(4)]
+    new = [{"diagnosis": d, "prior": 0.3} for d in ("Damaged sensor cable", "Loose pole ring", "Faulty ECU")] if turn == 0 else []
+    return json.dumps({"evidence": {"h1": "+"} if turn else {}, "new_hypotheses": new, "candidate_tests": candidates})
+
+
+class FakeClient:
+    def __init__(self):
+        self.prompts = []
+
+    async def chat(self, messages, **kwargs):
+        self.prompts.append(sum(len(m["content"]) for m in messages))
+        yield {"thinking": None, "content": _slate(len(self.prompts) - 1), "done": True, "metrics": None}
+
+
+def test_prompt_size_stays_bounded_over_many_turns():
+    client = FakeClient()
+    agent = LLMDiagnosticsAgent(client, max_history_turns=8)
+    engine = ProbabilityEngine()
+    tests_log = [{"id": "issue_description", "name": "Issue Description", "result": "ABS warning light on"}]
+
+    async def session(turns: int):
+        for _ in range(turns):
+            _, test = await agent.run(engine, tests_log)
+            # an unmatched free-text result, so every turn goes to the LLM
+            tests_log.append({**test, "result": "cable looks chafed near the axle"})
+
+    turns = 6 * agent.max_history_turns
+    asyncio.run(session(turns))
+    prompts = client.prompts
+    assert len(prompts) == turns
+    # each turn adds a short user delta and a compact answer, never a whole slate
+    answer = len(_slate(1))
+    assert max(b - a for a, b in zip(prompts, prompts[1:])) < answer / 4
+    # and the rebuilds (compacted log) keep it from growing with the session
+    window = 2 * agent.max_history_turns
+    assert max(prompts[-window:]) <= 1.05 * max(prompts[-2 * window:-window])
+    assistant = [m["content"] for m in agent.messages if m["role"] == "assistant"]
+    assert assistant and all(len(content) < 400 for content in assistant)
+    assert json.loads(assistant[-1])["next_test"].startswith(f"Turn {turns - 1} ")
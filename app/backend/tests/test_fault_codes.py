@@ -0,0 +1,53 @@
+import pytest
+from core.agents.fault_codes import FAULT_CODE_PATTERN, fault_causes, first_test, seed_hypotheses
+from core.agents.probability import ProbabilityEngine
+
+PREFETCH_THRESHOLD = 0.6 # IssueContext.issue_params["maintenance_prefetch_threshold"]
+PROBABILITY_THRESHOLD = 0.9 # IssueContext.issue_params["probability_threshold"]
+
+
+def _fault(causes):
+    return {"code": "1-10", "system": "ABS/ASR", "name": "Unacceptable wheel speed sensor signal", "description": "", "symptoms": "", "causes": causes}
+
+
+@pytest.mark.parametrize("text,codes", [
+    ("ABS light on, fault code 1-10", [("1", "10")]),
+    ("codes 12 - 34 and 2-1 on EBS", [("12", "34"), ("2", "1")]),
+    ("1-1 as well as 3-2", [("1", "1"), ("3", "2")]),
+    ("air gap should be 1-2 mm", []),
+    ("air gap 1-2mm, pressure 10 - 12 bar, 4-5 V on pin 3", []),
+    ("replaced on 12-03-2024, part 4.1-2", []),
+])
+def test_fault_code_pattern(text, codes):
+    assert FAULT_CODE_PATTERN.findall(text) == codes
+
+
+def test_fault_causes_drop_effect_clauses():
+    entry = {
+        "fault_description": "Unacceptable wheel speed sensor signal frequency (F512) on pins B12 and B15 of the ECU due to:",
+        "symptoms": "loose pole ring- wrong assessment by ECU- ABS on front axle, left deactivated; ASR brake/engine control deactivated",
+    }
+    assert fault_causes(entry) == ["loose pole ring"]
+
+
+def test_fault_causes_split_dashed_causes():
+    entry = {"symptoms": "short circuit to earth- interruption- Automatic mode not available; short circuit to supply - Automatic mode not available"}
+    assert fault_causes(entry) == ["short circuit to earth", "interruption"]
+
+
+@pytest.mark.parametrize("causes", [[], ["loose pole ring"], ["loose pole ring", "damaged sensor cable"]])
+def test_seeded_priors_stay_below_the_prefetch_threshold(causes):
+    hypotheses = seed_hypotheses([_fault(causes)])
+    assert sum(h["prior"] for h in hypotheses) == pytest.approx(1.0)
+    assert max(h["prior"] for h in hypotheses) < PREFETCH_THRESHOLD
+
+
+@pytest.mark.parametrize("causes", [[], ["loose pole ring"]])
+def test_one_confirming_test_does_not_settle_a_single_cause(causes):
+    faults = [_fault(causes)]
+    engine = ProbabilityEngine()
+    ids = engine.seed(seed_hypotheses(faults))
+    test = first_test(faults, ids)
+    engine.apply_likelihoods({hid: likelihood[0] for hid, likelihood in test["likelihoods"].items()}) # the listed cause / code active again
+    assert engine.leader()["id"] == ids[0]
+    assert engine.probability(ids[0]) < PROBABILITY_THRESHOLD
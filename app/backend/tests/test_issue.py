@@ -0,0 +1,157 @@
+import asyncio
+from core.issue import IssueContext, IssueManager, IssueProgress, RecentIds
+from core.llm import LLMClient
+
+
+def test_recent_ids_dedupes_within_the_window():
+    ids = RecentIds()
+    assert not ids.seen("a")
+    assert ids.seen("a")
+    assert not ids.seen("b")
+    assert len(ids) == 2
+
+
+def test_recent_ids_is_size_bounded():
+    ids = RecentIds(max_size=3)
+    for eid in "abcd":
+        ids.seen(eid)
+    assert len(ids) == 3
+    assert not ids.seen("a") # evicted as the oldest
+    assert ids.seen("d")
+
+
+def test_recent_ids_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("core.issue.time.monotonic", lambda: now[0])
+    ids = RecentIds(ttl_seconds=60)
+    ids.seen("a")
+    now[0] += 30
+    assert ids.seen("a")
+    now[0] += 31 # first seen 61s ago
+    assert not ids.seen("a")
+    assert len(ids) == 1
+
+
+def test_connection_lost_after_release_is_a_noop():
+    async def scenario():
+        manager = IssueManager(reap_interval=3600)
+        issue = await manager.create_issue(LLMClient(base_url="http://127.0.0.1:9"))
+        issue.issue_params["disconnect_grace_seconds"] = 0
+        issue.start()
+        issue.connection_lost() # grace period running when the issue closes
+        pending = issue._disconnect_task
+        await manager.close_issue(issue, "test")
+        await asyncio.sleep(0.01)
+        assert issue.progress == IssueProgress.CLOSED and issue.speculator is None
+        assert pending.cancelled() and issue._disconnect_task is None
+        issue.connection_lost()
+        assert issue._disconnect_task is None
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_status_reports_memory_from_the_last_measurement(monkeypatch):
+    async def scenario():
+        manager = IssueManager(reap_interval=3600)
+        issue = await manager.create_issue(LLMClient(base_url="http://127.0.0.1:9"))
+        calls = []
+        measure = IssueContext.memory_usage
+        monkeypatch.setattr(IssueContext, "memory_usage", lambda self: calls.append(1) or measure(self))
+        first = manager.status()["current"]["memory_bytes"]
+        for _ in range(5):
+            assert manager.status()["current"]["memory_bytes"] == first
+        assert len(calls) == 1
+        manager.status(fresh_memory=True)
+        assert len(calls) == 2
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+class FakeConnection:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+
+def _issue(**issue_params) -> IssueContext:
+    return IssueContext(LLMClient(base_url="http://127.0.0.1:9"), issue_params=issue_params)
+
+
+def test_attach_replays_the_missed_events_in_order():
+    async def scenario():
+        issue = _issue()
+        first = FakeConnection()
+        issue.connection = first
+        for i in range(3):
+            await issue.emit("chat.message", {"i": i})
+        issue.connection = None # dropped: events keep being numbered and buffered
+        await issue.emit("llm.thinking", {"text": "..."}) # transient, never replayed
+        for i in range(3, 6):
+            await issue.emit("chat.message", {"i": i})
+        assert [m["seq"] for m in first.sent] == [1, 2, 3]
+
+        second = FakeConnection()
+        attached = await issue.attach(second, last_seq=3)
+        assert attached == {"issue_id": issue.id, "seq": 7, "replayed": 3, "snapshot": False}
+        assert [m["type"] for m in second.sent] == ["issue.attached"] + ["chat.message"] * 3
+        assert [m["seq"] for m in second.sent[1:]] == [5, 6, 7]
+        assert [m["payload"]["i"] for m in second.sent[1:]] == [3, 4, 5]
+        await issue.emit("chat.message", {"i": 6})
+        assert second.sent[-1]["seq"] == 8
+
+    asyncio.run(scenario())
+
+
+def test_attach_sends_a_snapshot_for_gaps_the_buffer_no_longer_holds():
+    async def scenario():
+        issue = _issue(event_buffer_size=3)
+        for i in range(6):
+            await issue.emit("chat.message", {"i": i})
+        assert issue._evicted_seq == 3
+
+        up_to_date = FakeConnection()
+        assert (await issue.attach(up_to_date, last_seq=3))["replayed"] == 3 # 4..6 still buffered
+
+        for last_seq in (2, None, 99): # evicted, no position, ahead of the issue (another issue's seq)
+            conn = FakeConnection()
+            attached = await issue.attach(conn, last_seq=last_seq)
+            assert attached["snapshot"] and attached["replayed"] == 0
+            assert [m["type"] for m in conn.sent] == ["issue.attached", "issue.snapshot"]
+            assert conn.sent[1]["seq"] == 6 and conn.sent[1]["payload"]["seq"] == 6
+
+    asyncio.run(scenario())
+
+
+def test_manager_issue_params_size_the_replay_buffer():
+    async def scenario():
+        manager = IssueManager(issue_params={"event_buffer_size": 3}, reap_interval=3600)
+        issue = await manager.create_issue(LLMClient(base_url="http://127.0.0.1:9"))
+        for i in range(5):
+            await issue.emit("chat.message", {"i": i})
+        assert issue.issue_params["event_buffer_size"] == 3
+        assert [e["seq"] for e in issue._events] == [3, 4, 5]
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_manager_attach_rejects_other_issues():
+    async def scenario():
+        manager = IssueManager(reap_interval=3600)
+        issue = await manager.create_issue(LLMClient(base_url="http://127.0.0.1:9"))
+        assert await manager.attach("nope", FakeConnection()) == (None, "unknown_issue")
+        conn = FakeConnection()
+        assert await manager.attach(issue.id, conn, last_seq=0) == (issue, None)
+        assert issue.connection is conn
+        await manager.close_issue(issue, "resolved")
+        assert await manager.attach(issue.id, FakeConnection()) == (None, "closed:resolved")
+        await manager.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import pytest
+from core.agents import plan_library as plan_library_module
+from core.agents.plan_library import PLAN_LIBRARY_VERSION, PlanLibrary, plan_key
+from rag.retriever import STORE_FILES, store_fingerprint
+
+DIAGNOSIS = "Loose pole ring (ABS/ASR 1-10: Unacceptable wheel speed sensor signal)"
+
+
+def _write_store(store_dir, content: bytes) -> None:
+    store_dir.mkdir(exist_ok=True)
+    for name in STORE_FILES:
+        (store_dir / name).write_bytes(content + name.encode())
+
+
+def _library(tmp_path, check_interval: float = 30) -> PlanLibrary:
+    store_dir = tmp_path / "store"
+    _write_store(store_dir, b"manual v1")
+    record = {
+        "version": PLAN_LIBRARY_VERSION, "key": plan_key("lf", "ABS/ASR 1-10", DIAGNOSIS), "vehicle": "lf",
+        "fault_code": "ABS/ASR 1-10", "diagnosis": DIAGNOSIS, "plan": {"steps": ["Check the pole ring"]},
+        "rag_fingerprint": store_fingerprint(store_dir), "sources": [], "model": None, "generated_at": "", "seconds": 0.0,
+    }
+    (tmp_path / "plans").mkdir()
+    (tmp_path / "plans" / "plans.jsonl").write_text(json.dumps(record) + "\n")
+    return PlanLibrary(tmp_path / "plans", store_dir=store_dir, check_interval=check_interval)
+
+
+def test_rebuilt_store_makes_plans_invisible(tmp_path):
+    library = _library(tmp_path)
+    assert library.lookup("lf", ["ABS/ASR 1-10"], DIAGNOSIS)["plan"]["steps"] == ["Check the pole ring"]
+    assert not asyncio.run(library.check_store())
+
+    _write_store(tmp_path / "store", b"manual v2, rebuilt")
+    assert asyncio.run(library.check_store())
+    assert library.lookup("lf", ["ABS/ASR 1-10"], DIAGNOSIS) is None
+    assert library.stats["invalidations"] == 1 and library.stats["stale"] == 1 and library.stats["loaded"] == 0
+
+
+def test_lookup_does_not_touch_the_store(tmp_path, monkeypatch):
+    library = _library(tmp_path)
+    def no_io(*args):
+        pytest.fail("store read on lookup")
+    monkeypatch.setattr(plan_library_module, "store_signature", no_io)
+    monkeypatch.setattr(plan_library_module, "store_fingerprint", no_io)
+    assert library.lookup("lf", ["ABS/ASR 1-10"], DIAGNOSIS) is not None
+
+
+def test_periodic_check_picks_up_a_rebuilt_store(tmp_path):
+    async def scenario():
+        library = _library(tmp_path, check_interval=0.01)
+        library.start()
+        _write_store(tmp_path / "store", b"manual v2, rebuilt")
+        for _ in range(200):
+            if library.stats["invalidations"]:
+                break
+            await asyncio.sleep(0.01)
+        await library.stop()
+        assert library.lookup("lf", ["ABS/ASR 1-10"], DIAGNOSIS) is None
+
+    asyncio.run(scenario())
+
+
+def test_torn_line_is_skipped(tmp_path):
+    library = _library(tmp_path)
+    with library.path.open("a", encoding="utf-8") as f:
+        f.write('{"version": 1, "key": "lf|ABS/ASR 2-10|lo') # the build was interrupted mid-write
+    library.load()
+    assert library.lookup("lf", ["ABS/ASR 1-10"], DIAGNOSIS) is not None
+    assert library.stats["loaded"] == 1 and library.stats["stale"] == 1
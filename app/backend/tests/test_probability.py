@@ -0,0 +1,31 @@
+import pytest
+from core.agents.probability import MIN_PRIOR, ProbabilityEngine
+
+
+def test_zero_prior_is_floored_and_renormalised():
+    engine = ProbabilityEngine([{"diagnosis": "Worn brake pads", "prior": 0.7}, {"diagnosis": "Sticking caliper", "prior": 0.3}])
+    hid = engine.add_hypothesis("Air in the brake lines", prior=0.0)
+    assert engine.probability(hid) == pytest.approx(MIN_PRIOR)
+    assert float(engine.vector.sum()) == pytest.approx(1.0)
+
+
+def test_zero_prior_recovers_under_evidence():
+    engine = ProbabilityEngine(["Worn brake pads", "Sticking caliper"])
+    hid = engine.add_hypothesis("Air in the brake lines", prior=0.0)
+    for _ in range(12):
+        engine.apply_evidence({hid: "++", "h1": "--", "h2": "--"})
+    assert engine.leader()["id"] == hid
+
+
+def test_zero_weight_in_seed_is_floored():
+    engine = ProbabilityEngine([{"diagnosis": "A", "prior": 1.0}, {"diagnosis": "B", "prior": 0.0}])
+    assert engine.probability("h2") > 0
+    engine.apply_likelihoods({"h1": 0.01, "h2": 0.99})
+    engine.apply_likelihoods({"h1": 0.01, "h2": 0.99})
+    assert engine.leader()["id"] == "h2"
+
+
+def test_default_prior_is_uniform_share():
+    engine = ProbabilityEngine(["A", "B", "C"])
+    hid = engine.add_hypothesis("D")
+    assert engine.probability(hid) == pytest.approx(0.25)
@@ -0,0 +1,78 @@
+import asyncio
+import datetime
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from api.routes import router
+from core.llm import LLMClient, LLMPriority
+from core.residency import ResidencyManager
+
+
+class FakeOllama:
+    def __init__(self, load_seconds: float = 0.0):
+        self.load_seconds = load_seconds
+        self.models = {}
+
+    async def ps(self):
+        expires = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=30)
+        return {"models": [{"model": m, "expires_at": expires} for m in self.models]}
+
+    async def generate(self, model, **kwargs):
+        await asyncio.sleep(self.load_seconds)
+        self.models[model] = True
+
+
+def _manager(shop_hours):
+    client = LLMClient(base_url="http://127.0.0.1:9")
+    client.client = FakeOllama()
+    return ResidencyManager(client, shop_hours=shop_hours, shop_days=tuple(range(7)))
+
+
+def _ready(residency):
+    app = FastAPI()
+    app.include_router(router)
+    app.state.residency = residency
+    response = TestClient(app).get("/ready")
+    return response.status_code, response.json()
+
+
+def test_idle_outside_shop_hours_is_ready():
+    residency = _manager(shop_hours=(0, 0)) # never in shop hours
+    asyncio.run(residency._check())
+    assert residency.client.client.models == {} # nothing was loaded
+    status, body = _ready(residency)
+    assert status == 200
+    assert body["state"] == "idle" and body["ready"] is False
+
+
+def test_loaded_models_are_ready():
+    residency = _manager(shop_hours=(0, 24))
+    asyncio.run(residency._check())
+    status, body = _ready(residency)
+    assert status == 200 and body["state"] == "ready"
+
+
+def test_loading_or_unreachable_is_not_ready():
+    residency = _manager(shop_hours=(0, 24))
+    residency.reachable = True
+    assert _ready(residency)[0] == 503 # in shop hours, models not resident yet
+    residency.reachable = False
+    assert _ready(residency)[1]["state"] == "unreachable"
+
+
+def test_model_load_is_preempted_by_a_foreground_request():
+    async def scenario():
+        residency = _manager(shop_hours=(0, 24))
+        residency.client.client.load_seconds = 1.0
+        scheduler = residency.client.scheduler
+        load = asyncio.create_task(residency._pin("gpt-oss:20b", load=True))
+        await asyncio.sleep(0.05)
+
+        async def foreground():
+            await scheduler.acquire(LLMPriority.FOREGROUND)
+            scheduler.release()
+
+        await asyncio.wait_for(foreground(), timeout=0.5)
+        return await load, scheduler.preemptions
+
+    loaded, preemptions = asyncio.run(scenario())
+    assert loaded is False and preemptions == 1
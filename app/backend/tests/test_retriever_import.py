@@ -0,0 +1,13 @@
+import subprocess
+import sys
+from pathlib import Path
+
+RAG_DIR = Path(__file__).resolve().parents[1] / "rag"
+
+
+def test_retriever_imports_standalone_from_the_rag_directory():
+    result = subprocess.run(
+        [sys.executable, "-c", "import retriever; retriever.RAG_SEARCH.observe(0.1, stage='total')"],
+        cwd=RAG_DIR, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,36 @@
+from core.llm import ModelRouter
+
+
+def test_light_calls_go_to_the_small_model_while_the_large_one_is_resident():
+    router = ModelRouter(models={"large": "big", "small": "little"})
+    router.mark_resident("big", "30m")
+    assert router.max_resident == 2
+    assert router.route("summary") == ("little", "class")
+    assert router.route("communications") == ("little", "class")
+    assert router.route("diagnostics") == ("big", "class")
+    router.mark_resident("little", "30m")
+    assert router.is_resident("big") and router.is_resident("little")
+
+
+def test_single_slot_keeps_light_calls_on_the_resident_large_model():
+    router = ModelRouter(models={"large": "big", "small": "little"}, max_resident=1)
+    assert router.route("summary") == ("little", "class") # nothing loaded yet: no swap to avoid
+    router.mark_resident("big", "30m")
+    assert router.route("summary") == ("big", "avoid_swap")
+
+
+def test_unavailable_small_model_falls_back_to_large():
+    router = ModelRouter(models={"large": "big", "small": "little"})
+    router.mark_unavailable("little")
+    assert router.route("summary") == ("big", "small_unavailable")
+
+
+def test_one_model_for_both_tiers():
+    router = ModelRouter(models={"large": "big", "small": "big"})
+    assert router.max_resident == 1
+    assert router.route("summary") == ("big", "class")
+    assert router.warm_models() == ["big"]
+
+
+def test_both_tiers_are_warmed():
+    assert ModelRouter(models={"large": "big", "small": "little"}).warm_models() == ["big", "little"]
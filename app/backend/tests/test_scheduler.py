@@ -0,0 +1,84 @@
+import asyncio
+from core.llm import LLMClient, LLMPriority, LLMScheduler
+
+
+async def _hold(scheduler: LLMScheduler, priority: LLMPriority, log: list, name: str, seconds: float = 1.0) -> None:
+    await scheduler.acquire(priority)
+    try:
+        log.append(f"{name} acquired")
+        await asyncio.sleep(seconds)
+        log.append(f"{name} finished")
+    except asyncio.CancelledError:
+        log.append(f"{name} preempted")
+        raise
+    finally:
+        scheduler.release()
+
+
+def test_foreground_preempts_speculative():
+    async def scenario():
+        scheduler, log = LLMScheduler(), []
+        background = asyncio.create_task(_hold(scheduler, LLMPriority.SPECULATIVE, log, "speculative"))
+        await asyncio.sleep(0.01)
+        foreground = asyncio.create_task(_hold(scheduler, LLMPriority.FOREGROUND, log, "foreground", 0.01))
+        await foreground
+        await asyncio.gather(background, return_exceptions=True)
+        return scheduler, log, background
+
+    scheduler, log, background = asyncio.run(scenario())
+    assert log == ["speculative acquired", "speculative preempted", "foreground acquired", "foreground finished"]
+    assert background.cancelled()
+    assert scheduler.preemptions == 1
+
+
+def test_equal_priority_waits_instead_of_preempting():
+    async def scenario():
+        scheduler, log = LLMScheduler(), []
+        first = asyncio.create_task(_hold(scheduler, LLMPriority.PREFETCH, log, "first", 0.02))
+        await asyncio.sleep(0.005)
+        second = asyncio.create_task(_hold(scheduler, LLMPriority.PREFETCH, log, "second", 0.0))
+        await asyncio.gather(first, second)
+        return scheduler, log
+
+    scheduler, log = asyncio.run(scenario())
+    assert log == ["first acquired", "first finished", "second acquired", "second finished"]
+    assert scheduler.preemptions == 0
+
+
+def test_waiters_are_granted_in_priority_order():
+    async def scenario():
+        scheduler, log = LLMScheduler(), []
+        holder = asyncio.create_task(_hold(scheduler, LLMPriority.FOREGROUND, log, "holder", 0.02))
+        await asyncio.sleep(0.005)
+        speculative = asyncio.create_task(_hold(scheduler, LLMPriority.SPECULATIVE, log, "speculative", 0.0))
+        await asyncio.sleep(0)
+        prefetch = asyncio.create_task(_hold(scheduler, LLMPriority.PREFETCH, log, "prefetch", 0.0))
+        await asyncio.gather(holder, speculative, prefetch)
+        return log
+
+    log = asyncio.run(scenario())
+    assert [entry for entry in log if entry.endswith("acquired")] == ["holder acquired", "prefetch acquired", "speculative acquired"]
+
+
+def test_promoted_task_is_not_preempted():
+    async def scenario():
+        scheduler, log = LLMScheduler(), []
+        background = asyncio.create_task(_hold(scheduler, LLMPriority.SPECULATIVE, log, "speculative", 0.02))
+        await asyncio.sleep(0.005)
+        scheduler.promote(background, LLMPriority.FOREGROUND)
+        foreground = asyncio.create_task(_hold(scheduler, LLMPriority.PREFETCH, log, "prefetch", 0.0))
+        await asyncio.gather(background, foreground)
+        return scheduler, log
+
+    scheduler, log = asyncio.run(scenario())
+    assert "speculative preempted" not in log
+    assert scheduler.preemptions == 0
+
+
+def test_close_without_private_http_client():
+    async def scenario():
+        client = LLMClient(base_url="http://127.0.0.1:9")
+        client.client = object() # a client without the private httpx attribute
+        await client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,68 @@
+import json
+import random
+import pytest
+from core.agents.streaming import IncrementalJSONParser
+
+
+DOCUMENT = {
+    "evidence": {"h1": "++", "h2": "-"},
+    "candidate_tests": [
+        {"test_text": "Measure the sensor resistance", "effort": 2, "expected": 1.5e3, "safe": True, "note": None},
+        {"test_text": "Check the \"ABS\" fuse\nand relay", "effort": 1, "options": []},
+    ],
+    "summary": "Wheel speed sensor ✓ or ring 🚚",
+}
+
+
+def _feed_in_chunks(text: str, sizes):
+    parser, events = IncrementalJSONParser(), []
+    position = 0
+    for size in sizes:
+        events += parser.feed(text[position:position + size])
+        position += size
+    events += parser.feed(text[position:])
+    return parser, events
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("seed", range(5))
+def test_any_chunking_yields_the_full_document(seed, ensure_ascii):
+    text = json.dumps(DOCUMENT, ensure_ascii=ensure_ascii)
+    rng = random.Random(seed)
+    parser, events = _feed_in_chunks(text, [rng.randint(1, 7) for _ in range(len(text))])
+    assert parser.done
+    assert parser.value == DOCUMENT
+    assert events[-1] == ("value", (), DOCUMENT)
+
+
+def test_string_deltas_reassemble_the_value():
+    text = json.dumps(DOCUMENT)
+    _, events = _feed_in_chunks(text, [3] * len(text))
+    deltas = "".join(delta for kind, path, delta in events if kind == "string" and path == ("candidate_tests", 1, "test_text"))
+    assert deltas == DOCUMENT["candidate_tests"][1]["test_text"]
+
+
+def test_completed_values_are_reported_with_their_paths():
+    _, events = _feed_in_chunks(json.dumps(DOCUMENT), [1000])
+    values = {path: value for kind, path, value in events if kind == "value"}
+    assert values[("evidence", "h1")] == "++"
+    assert values[("candidate_tests", 0, "effort")] == 2
+    assert values[("candidate_tests", 0, "safe")] is True
+    assert values[("candidate_tests", 0, "note")] is None
+    assert values[("candidate_tests", 1, "options")] == []
+    assert values[("candidate_tests", 0)] == DOCUMENT["candidate_tests"][0]
+
+
+def test_partial_state_is_visible_before_the_document_completes():
+    parser = IncrementalJSONParser()
+    parser.feed('{"evidence": {"h1": "+"}, "candidate_tests": [{"test_text": "Meas')
+    assert not parser.done
+    assert parser.value["evidence"] == {"h1": "+"}
+    assert parser.value["candidate_tests"] == [{}]
+
+
+def test_leading_prose_and_trailing_text_are_ignored():
+    parser = IncrementalJSONParser()
+    parser.feed('Here is the answer: {"a": [1, 2.5, -3]} and some more {"b": 1}')
+    assert parser.done
+    assert parser.value == {"a": [1, 2.5, -3]}
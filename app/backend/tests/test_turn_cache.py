@@ -0,0 +1,80 @@
+import asyncio
+import json
+import numpy as np
+from core.agents.diagnostics import LLMDiagnosticsAgent
+from core.agents.probability import ProbabilityEngine
+from core.agents.turn_cache import TurnCache
+
+
+ANSWER = json.dumps({
+    "evidence": {},
+    "new_hypotheses": [{"diagnosis": "Damaged sensor cable", "prior": 0.6}, {"diagnosis": "Loose pole ring", "prior": 0.4}],
+    "candidate_tests": [{
+        "test_text": "Is the sensor cable chafed?", "test_result_field_type": "boolean",
+        "likelihoods": {"h1": [0.9, 0.1], "h2": [0.2, 0.8]},
+    }],
+})
+
+
+class FakeClient:
+    calls = 0
+
+    async def chat(self, messages, **kwargs):
+        FakeClient.calls += 1
+        yield {"thinking": None, "content": ANSWER, "done": True, "metrics": None}
+
+
+async def _embed(text: str):
+    vector = np.zeros(64, dtype=np.float32)
+    for word in text.lower().split():
+        vector[hash(word) % 64] += 1.0
+    return vector
+
+
+def _log(complaint: str):
+    return [{"id": "issue_description", "name": "Issue Description", "result": complaint}]
+
+
+def test_speculative_turn_is_stored_only_once_adopted():
+    async def scenario():
+        cache = TurnCache(_embed)
+        agent = LLMDiagnosticsAgent(FakeClient(), turn_cache=cache)
+        branch = agent.fork()
+        await branch.run(ProbabilityEngine(), _log("ABS warning light on"))
+        stored_before_adoption = len(cache.entries)
+        agent.adopt(branch)
+        await agent.commit_turn()
+        return stored_before_adoption, cache
+
+    stored_before_adoption, cache = asyncio.run(scenario())
+    assert stored_before_adoption == 0
+    assert len(cache.entries) == 1
+    assert cache.entries[0]["turn"]["candidate_tests"][0]["likelihoods"] == {"Damaged sensor cable": [0.9, 0.1], "Loose pole ring": [0.2, 0.8]}
+
+
+def test_discarded_branch_never_reaches_the_cache():
+    async def scenario():
+        cache = TurnCache(_embed)
+        agent = LLMDiagnosticsAgent(FakeClient(), turn_cache=cache)
+        await agent.fork().run(ProbabilityEngine(), _log("ABS warning light on"))
+        await agent.commit_turn()
+        return cache
+
+    assert asyncio.run(scenario()).entries == []
+
+
+def test_foreground_turn_is_stored_and_served(tmp_path):
+    async def scenario():
+        cache = TurnCache(_embed, directory=tmp_path)
+        agent = LLMDiagnosticsAgent(FakeClient(), turn_cache=cache)
+        await agent.run(ProbabilityEngine(), _log("ABS warning light on"))
+        calls = FakeClient.calls
+        other = LLMDiagnosticsAgent(FakeClient(), turn_cache=cache)
+        await other.run(ProbabilityEngine(), _log("ABS warning light on"))
+        return cache, other, FakeClient.calls - calls
+
+    cache, other, calls = asyncio.run(scenario())
+    assert len(cache.entries) == 1
+    assert other.last_turn["source"] == "cache" and calls == 0
+    lookups = (tmp_path / "lookups.jsonl").read_text().splitlines()
+    assert [json.loads(line)["hit"] for line in lookups] == [False, True]
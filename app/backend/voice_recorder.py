@@ -10,9 +10,15 @@ import tempfile
 import os
 import sounddevice as sd
 import numpy as np
-import whisper
 import time
 import wave
+import json
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from speech.audio import decode_audio, resample
+from speech.backends import BACKEND_CHOICES, create_backend
+from speech.vad import EnergyVAD, RingBuffer
 
 def _pick_input_device() -> int | None:
     """
@@ -116,24 +122,59 @@ def save_audio_to_file(audio_data, sample_rate=16000):
         print(f"Error saving audio file: {e}", file=sys.stderr)
         return None
 
-def transcribe_audio(audio_file_path, model_size="base"):
+def transcribe_via_api(audio_file_path, api_base, timeout=120):
+    """
+    Transcribe audio file with the backend's resident Whisper model (POST /speech/transcribe),
+    which avoids loading the model for every recording.
+    
+    Args:
+        audio_file_path (str): Path to the WAV file
+        api_base (str): Backend base URL, e.g. http://127.0.0.1:8000
+    
+    Returns:
+        str: Transcribed text, or None if the backend could not transcribe it
+    """
+    try:
+        with open(audio_file_path, "rb") as f:
+            request = urllib.request.Request(
+                f"{api_base.rstrip('/')}/speech/transcribe?format=wav",
+                data=f.read(),
+                headers={"Content-Type": "audio/wav"},
+                method="POST",
+            )
+        print("Transcribing audio with the backend...", file=sys.stderr)
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            result = json.loads(response.read().decode("utf-8"))
+        print(f"Transcription completed in {result.get('timing', {}).get('total_seconds')}s. Result: '{result.get('text')}'", file=sys.stderr)
+        if not result.get("text"):
+            return "No speech detected. Please try speaking louder or closer to the microphone."
+        return result["text"]
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        print(f"Backend transcription failed ({e}); falling back to a local model", file=sys.stderr)
+        return None
+
+def transcribe_audio(audio_file_path, model_size="base", backend="auto"):
     """
     Transcribe audio file using Whisper.
     
     Args:
         audio_file_path (str): Path to the audio file
         model_size (str): Whisper model size (tiny, base, small, medium, large)
+        backend (str): Speech backend (auto, whisper, faster-whisper, stub; see speech/backends.py)
     
     Returns:
         str: Transcribed text
     """
     try:
-        print(f"Loading Whisper model '{model_size}'...", file=sys.stderr)
-        model = whisper.load_model(model_size)
+        # only needed when the backend can't transcribe; slow to import
+        engine = create_backend(backend, model_size)
+        print(f"Loading {engine.name} model '{model_size}'...", file=sys.stderr)
+        engine.load()
         
         print("Transcribing audio...", file=sys.stderr)
-        # Use fp16=False to avoid ffmpeg dependency issues
-        result = model.transcribe(audio_file_path, fp16=False)
+        # decode the WAV ourselves to avoid ffmpeg dependency issues
+        with open(audio_file_path, "rb") as f:
+            result = engine.transcribe(decode_audio(f.read(), format="wav"))
         
         transcription = result["text"].strip()
         print(f"Transcription completed. Result: '{transcription}'", file=sys.stderr)
@@ -148,14 +189,139 @@ def transcribe_audio(audio_file_path, model_size="base"):
         # Return a fallback message if transcription fails
         return "Voice input detected but transcription failed. Please try again or use text input."
 
+class Transcriber:
+    """
+    Transcribe in-memory float32 audio (no temp file): with the backend's resident model when an API
+    base is given, else (or once the backend fails) with a local Whisper model loaded on first use.
+    """
+    def __init__(self, api_base=None, model_size="base", sample_rate=16000, backend="auto"):
+        self.api_base = api_base
+        self.sample_rate = sample_rate
+        self.engine = create_backend(backend, model_size)
+
+    def __call__(self, audio):
+        if self.api_base:
+            try:
+                request = urllib.request.Request(
+                    f"{self.api_base.rstrip('/')}/speech/transcribe?format=pcm_f32le&sample_rate={self.sample_rate}",
+                    data=audio.astype("<f4").tobytes(),
+                    headers={"Content-Type": "application/octet-stream"},
+                    method="POST",
+                )
+                with urllib.request.urlopen(request, timeout=120) as response:
+                    return json.loads(response.read().decode("utf-8")).get("text", "")
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                print(f"Backend transcription failed ({e}); falling back to a local model", file=sys.stderr)
+                self.api_base = None
+        if self.engine.model is None:
+            print(f"Loading {self.engine.name} model '{self.engine.model_size}'...", file=sys.stderr)
+            self.engine.load()
+        return self.engine.transcribe(resample(audio, self.sample_rate))["text"]
+
+
+def stream_and_transcribe(transcriber, max_duration=30, sample_rate=16000, silence_ms=800,
+                          partial_interval=1.5, no_speech_timeout=8, on_partial=None):
+    """
+    Listen until the speaker stops instead of recording a fixed duration.
+    
+    Audio from a sounddevice InputStream lands in a ring buffer; an energy VAD walks it in 30 ms
+    frames and ends the utterance after `silence_ms` of silence (or at `max_duration`). While the
+    technician speaks, the utterance so far is transcribed every `partial_interval` seconds on a
+    worker thread and passed to `on_partial`.
+    
+    Returns:
+        str: Final transcription, or None if no speech was detected
+    """
+    vad = EnergyVAD(sample_rate, silence_ms=silence_ms)
+    frame = vad.frame_length
+    preroll = int(0.3 * sample_rate)  # keep the onset the VAD needed to confirm speech
+    ring = RingBuffer(int((max_duration + 1) * sample_rate))
+    limit = int(max_duration * sample_rate)
+
+    def callback(indata, frames, time_info, status):
+        if status:
+            print(f"Audio status: {status}", file=sys.stderr)
+        ring.write(indata[:, 0])
+
+    device_index = _pick_input_device()
+    executor = ThreadPoolExecutor(max_workers=1)
+    partial = None
+    start = end = None
+    position = last_partial = 0
+    try:
+        with sd.InputStream(samplerate=sample_rate, channels=1, dtype="float32", blocksize=frame,
+                            device=device_index, callback=callback):
+            print(f"Listening (up to {max_duration}s)...", file=sys.stderr)
+            while position < limit:
+                if not ring.wait_for(position + frame, timeout=1.0):
+                    print("No audio from the input device", file=sys.stderr)
+                    break
+                event = vad.update(ring.read(position, position + frame))
+                position += frame
+                if event == "start":
+                    start = max(0, position - vad.start_frames * frame - preroll)
+                    last_partial = position
+                    print(f"Speech detected at {start / sample_rate:.2f}s", file=sys.stderr)
+                elif event == "end":
+                    end = position
+                    break
+                elif start is None and position >= no_speech_timeout * sample_rate:
+                    break
+
+                # partial transcript of the utterance so far, one at a time so they never queue up
+                if partial is not None and partial.done():
+                    if partial.exception() is None and on_partial is not None and partial.result():
+                        on_partial(partial.result())
+                    partial = None
+                if start is not None and partial is None and partial_interval \
+                        and position - last_partial >= partial_interval * sample_rate:
+                    last_partial = position
+                    partial = executor.submit(transcriber, ring.read(start, position))
+
+        if start is None:
+            return None
+        end = end or position
+        print(f"Utterance {start / sample_rate:.2f}s-{end / sample_rate:.2f}s; transcribing...", file=sys.stderr)
+        return executor.submit(transcriber, ring.read(start, end)).result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Record and transcribe voice input")
     parser.add_argument("--duration", type=int, default=5, help="Recording duration in seconds")
     parser.add_argument("--model", default="base", help="Whisper model size")
     parser.add_argument("--sample-rate", type=int, default=16000, help="Audio sample rate")
+    parser.add_argument("--backend", choices=BACKEND_CHOICES, default="auto", help="Local speech backend (auto: faster-whisper int8 when installed)")
+    parser.add_argument("--api", help="Backend base URL; transcribe with its resident model instead of loading one here")
+    parser.add_argument("--stream", action="store_true", help="Stop at the end of speech (VAD) instead of after --duration, which becomes the maximum")
+    parser.add_argument("--silence-ms", type=int, default=800, help="Silence that ends the utterance in --stream mode")
+    parser.add_argument("--partial-interval", type=float, default=1.5, help="Seconds between partial transcripts in --stream mode (0 disables)")
+    parser.add_argument("--json", action="store_true", help="In --stream mode, write JSON lines ({type: partial|final, text}) to stdout")
     
     args = parser.parse_args()
     
+    if args.stream:
+        def emit(kind, text):
+            if args.json:
+                print(json.dumps({"type": kind, "text": text}), flush=True)
+            elif kind == "final":
+                print(text, flush=True)
+            else:
+                print(f"Partial transcript: '{text}'", file=sys.stderr, flush=True)
+
+        transcriber = Transcriber(args.api, args.model, args.sample_rate, args.backend)
+        try:
+            transcription = stream_and_transcribe(
+                transcriber, args.duration, args.sample_rate, args.silence_ms, args.partial_interval,
+                on_partial=lambda text: emit("partial", text),
+            )
+        except Exception as e:
+            print(f"Error during streaming capture: {e}", file=sys.stderr)
+            sys.exit(1)
+        emit("final", transcription or "No speech detected. Please try speaking louder or closer to the microphone.")
+        return
+    
     # Record audio
     audio_data = record_audio(args.duration, args.sample_rate)
     if audio_data is None:
@@ -167,8 +333,10 @@ def main():
         sys.exit(1)
     
     try:
-        # Transcribe audio
-        transcription = transcribe_audio(audio_file, args.model)
+        # Transcribe audio (backend first, local model as a fallback)
+        transcription = transcribe_via_api(audio_file, args.api) if args.api else None
+        if transcription is None:
+            transcription = transcribe_audio(audio_file, args.model, args.backend)
         
         if transcription:
             print(transcription)
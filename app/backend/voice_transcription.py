@@ -9,40 +9,47 @@ import argparse
 import tempfile
 import json
 from pathlib import Path
+from speech.audio import decode_audio
+from speech.backends import BACKEND_CHOICES, SpeechUnavailable, create_backend
 
-try:
-    import whisper
-    WHISPER_AVAILABLE = True
-except ImportError:
-    WHISPER_AVAILABLE = False
+def load_audio_file(audio_file_path: str):
+    """WAV files are decoded directly; other formats need openai-whisper's ffmpeg loader."""
+    with open(audio_file_path, "rb") as f:
+        data = f.read()
+    try:
+        return decode_audio(data, format="wav")
+    except ValueError:
+        from whisper.audio import load_audio
+        return load_audio(audio_file_path)
 
-def transcribe_audio(audio_file_path: str, model_size: str = "base") -> str:
+def transcribe_audio(audio_file_path: str, model_size: str = "base", backend: str = "auto") -> str:
     """
     Transcribe audio file using Whisper.
     
     Args:
         audio_file_path: Path to the audio file
         model_size: Whisper model size (tiny, base, small, medium, large)
+        backend: Speech backend (auto, whisper, faster-whisper, stub; see speech/backends.py)
     
     Returns:
         Transcribed text
     """
-    if not WHISPER_AVAILABLE:
-        return "Whisper not available. Please install: pip install openai-whisper"
-    
     if not os.path.exists(audio_file_path):
         return f"Audio file not found: {audio_file_path}"
     
     try:
-        # Load Whisper model
-        model = whisper.load_model(model_size)
+        # Load the model
+        engine = create_backend(backend, model_size)
+        engine.load()
         
         # Transcribe audio
-        result = model.transcribe(audio_file_path)
+        result = engine.transcribe(load_audio_file(audio_file_path))
         
         # Return the transcribed text
         return result["text"].strip()
         
+    except (SpeechUnavailable, ImportError) as e:
+        return f"Speech backend not available: {e}"
     except Exception as e:
         return f"Transcription error: {str(e)}"
 
@@ -50,12 +57,13 @@ def main():
     parser = argparse.ArgumentParser(description="Transcribe audio using Whisper")
     parser.add_argument("audio_file", help="Path to audio file")
     parser.add_argument("--model", default="base", help="Whisper model size")
+    parser.add_argument("--backend", choices=BACKEND_CHOICES, default="auto", help="Speech backend (auto: faster-whisper int8 when installed)")
     parser.add_argument("--output", help="Output file for transcription")
     
     args = parser.parse_args()
     
     # Transcribe the audio
-    transcription = transcribe_audio(args.audio_file, args.model)
+    transcription = transcribe_audio(args.audio_file, args.model, args.backend)
     
     if args.output:
         # Save to file
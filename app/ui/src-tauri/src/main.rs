@@ -2,7 +2,7 @@
 #![cfg_attr(not(debug_assertions), windows_subsystem = "windows")]
 
 // Imports
-use tauri::{Manager, State};
+use tauri::{Emitter, Manager, State};
 use std::net::TcpListener;
 use std::path::PathBuf;
 use std::process::{Command, Stdio};
@@ -19,10 +19,19 @@ struct ApiBase(String);
 #[tauri::command]
 fn api_base(base: State<ApiBase>) -> String { base.0.clone() }
 
+// Partial transcripts are emitted as "voice-partial" events (payload: the utterance so far) while recording
+fn emit_partials(app: tauri::AppHandle) -> impl Fn(String) + Send + 'static {
+    move |text: String| {
+        if let Err(e) = app.emit("voice-partial", text) {
+            eprintln!("Failed to emit partial transcript: {}", e);
+        }
+    }
+}
+
 #[tauri::command]
-async fn start_voice_input() -> Result<String, String> {
-    // Record and transcribe audio using Python script
-    match record_and_transcribe().await {
+async fn start_voice_input(app: tauri::AppHandle, base: State<'_, ApiBase>) -> Result<String, String> {
+    // Record audio with the Python script; the backend's resident Whisper model transcribes it
+    match record_and_transcribe(Some(base.0.clone()), emit_partials(app)).await {
         Ok(transcription) => {
             println!("Voice transcription: {}", transcription);
             Ok(transcription)
@@ -35,9 +44,9 @@ async fn start_voice_input() -> Result<String, String> {
 }
 
 #[tauri::command]
-async fn start_voice_input_long() -> Result<String, String> {
+async fn start_voice_input_long(app: tauri::AppHandle, base: State<'_, ApiBase>) -> Result<String, String> {
     // Record and transcribe audio for 10 seconds
-    match record_and_transcribe_with_duration(10).await {
+    match record_and_transcribe_with_duration(10, Some(base.0.clone()), emit_partials(app)).await {
         Ok(transcription) => {
             println!("Voice transcription: {}", transcription);
             Ok(transcription)
@@ -50,9 +59,9 @@ async fn start_voice_input_long() -> Result<String, String> {
 }
 
 #[tauri::command]
-async fn start_voice_input_very_long() -> Result<String, String> {
+async fn start_voice_input_very_long(app: tauri::AppHandle, base: State<'_, ApiBase>) -> Result<String, String> {
     // Record and transcribe audio for 30 seconds
-    match record_and_transcribe_with_duration(30).await {
+    match record_and_transcribe_with_duration(30, Some(base.0.clone()), emit_partials(app)).await {
         Ok(transcription) => {
             println!("Voice transcription: {}", transcription);
             Ok(transcription)
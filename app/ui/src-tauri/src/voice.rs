@@ -1,9 +1,12 @@
 use std::time::Duration;
 use tokio::time::sleep;
 use anyhow::Result;
-use std::process::Command;
+use std::process::{Command, Stdio};
 use std::path::PathBuf;
 use std::env;
+use serde::Deserialize;
+use tokio::io::{AsyncBufReadExt, AsyncReadExt, BufReader};
+use tokio::process::Command as TokioCommand;
 
 pub struct VoiceRecorder {
     // Simplified struct for testing
@@ -95,60 +98,100 @@ fn find_backend_directory() -> String {
         .to_string()
 }
 
-pub async fn record_and_transcribe() -> Result<String> {
-    record_and_transcribe_with_duration(10).await
+pub async fn record_and_transcribe<F>(api_base: Option<String>, on_partial: F) -> Result<String>
+where
+    F: Fn(String) + Send + 'static,
+{
+    record_and_transcribe_with_duration(10, api_base, on_partial).await
 }
 
-pub async fn record_and_transcribe_with_duration(duration_seconds: u32) -> Result<String> {
+#[derive(Deserialize)]
+struct TranscriptLine {
+    #[serde(rename = "type")]
+    kind: String, // "partial" | "final"
+    text: String,
+}
+
+pub async fn record_and_transcribe_with_duration<F>(duration_seconds: u32, api_base: Option<String>, on_partial: F) -> Result<String>
+where
+    F: Fn(String) + Send + 'static,
+{
     println!("Starting real voice recording for {} seconds...", duration_seconds);
     
     // Resolve backend directory, then choose Python interpreter
     let backend_dir = find_backend_directory();
     let python_cmd = find_python_executable(&backend_dir);
     
-    // Call the Python voice recorder script with configurable duration
-    let result = Command::new(python_cmd)
-        .args(&["voice_recorder.py", "--duration", &duration_seconds.to_string(), "--model", "base"])
+    // Call the Python voice recorder script; it stops when the technician stops speaking, with the duration
+    // as the upper bound. With an API base it sends the audio to the backend (resident model) and only
+    // loads Whisper itself if that fails. --json makes it write one JSON line per partial and a final one,
+    // which are read as they arrive so partial transcripts reach the UI while the technician is speaking
+    let duration = duration_seconds.to_string();
+    let mut args = vec!["voice_recorder.py", "--stream", "--json", "--duration", duration.as_str(), "--model", "base"];
+    if let Some(api) = api_base.as_deref() {
+        args.extend(["--api", api]);
+    }
+    let spawned = TokioCommand::new(python_cmd)
+        .args(&args)
         .current_dir(&backend_dir)
-        .output();
-    
-    match result {
-        Ok(output) => {
-            let stderr_output = String::from_utf8_lossy(&output.stderr);
-            println!("Voice recording stderr: {}", stderr_output);
-            
-            if output.status.success() {
-                let transcription = String::from_utf8_lossy(&output.stdout).trim().to_string();
-                println!("Voice transcription: {}", transcription);
-                
-                if !transcription.is_empty() && !transcription.contains("No speech detected") {
-                    Ok(transcription)
-                } else {
-                    Ok("No speech detected. Please try speaking louder or closer to the microphone.".to_string())
-                }
-            } else {
-                let error = String::from_utf8_lossy(&output.stderr);
-                println!("Voice recording error: {}", error);
-                
-                // Check for common error patterns and provide helpful messages
-                if error.contains("Permission denied") || error.contains("microphone") {
-                    Err(anyhow::anyhow!("Microphone permission denied. Please allow microphone access in your system settings and try again."))
-                } else if error.contains("No module named") {
-                    Err(anyhow::anyhow!("Missing Python dependencies. Please install required packages: pip install sounddevice openai-whisper numpy"))
-                } else if error.contains("No such file or directory") {
-                    Err(anyhow::anyhow!("Voice recording script not found. Please ensure the backend directory is properly set up."))
-                } else {
-                    Err(anyhow::anyhow!("Voice recording failed: {}", error))
-                }
-            }
-        }
+        .stdout(Stdio::piped())
+        .stderr(Stdio::piped())
+        .kill_on_drop(true)
+        .spawn();
+    let mut child = match spawned {
+        Ok(child) => child,
         Err(e) => {
             println!("Failed to run voice recorder: {}", e);
-            if e.kind() == std::io::ErrorKind::NotFound {
+            return if e.kind() == std::io::ErrorKind::NotFound {
                 Err(anyhow::anyhow!("Python not found. Please ensure Python is installed and available in your PATH."))
             } else {
                 Err(anyhow::anyhow!("Failed to run voice recorder: {}", e))
-            }
+            };
+        }
+    };
+
+    // drain stderr concurrently so a chatty recorder can never block on a full pipe
+    let mut stderr = child.stderr.take().expect("stderr is piped");
+    let stderr_task = tokio::spawn(async move {
+        let mut text = String::new();
+        let _ = stderr.read_to_string(&mut text).await;
+        text
+    });
+
+    let mut transcription = String::new();
+    let mut lines = BufReader::new(child.stdout.take().expect("stdout is piped")).lines();
+    while let Some(line) = lines.next_line().await? {
+        match serde_json::from_str::<TranscriptLine>(&line) {
+            Ok(parsed) if parsed.kind == "partial" => on_partial(parsed.text),
+            Ok(parsed) => transcription = parsed.text.trim().to_string(),
+            Err(_) => println!("Voice recorder: {}", line),
+        }
+    }
+
+    let status = child.wait().await?;
+    let error = stderr_task.await.unwrap_or_default();
+    println!("Voice recording stderr: {}", error);
+
+    if status.success() {
+        println!("Voice transcription: {}", transcription);
+
+        if !transcription.is_empty() && !transcription.contains("No speech detected") {
+            Ok(transcription)
+        } else {
+            Ok("No speech detected. Please try speaking louder or closer to the microphone.".to_string())
+        }
+    } else {
+        println!("Voice recording error: {}", error);
+
+        // Check for common error patterns and provide helpful messages
+        if error.contains("Permission denied") || error.contains("microphone") {
+            Err(anyhow::anyhow!("Microphone permission denied. Please allow microphone access in your system settings and try again."))
+        } else if error.contains("No module named") {
+            Err(anyhow::anyhow!("Missing Python dependencies. Please install required packages: pip install sounddevice openai-whisper numpy"))
+        } else if error.contains("No such file or directory") {
+            Err(anyhow::anyhow!("Voice recording script not found. Please ensure the backend directory is properly set up."))
+        } else {
+            Err(anyhow::anyhow!("Voice recording failed: {}", error))
         }
     }
 }
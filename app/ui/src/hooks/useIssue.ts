@@ -1,6 +1,36 @@
-import { useCallback, useEffect, useState } from "react";
+import { useCallback, useEffect, useRef, useState } from "react";
 import { invoke } from "@tauri-apps/api/core";
 
+// Backend events that carry bookkeeping only and are not shown in the feed
+const HIDDEN_EVENT_TYPES = new Set<string>([
+  "diagnostics.probabilities",
+  "diagnostics.speculation",
+  "diagnostics.latency",
+  "issue.closed",
+  "issue.attached",
+  "issue.attach_rejected",
+  "issue.create_rejected",
+]);
+
+// Backoff between attempts to reattach after the connection drops (ms)
+const REATTACH_DELAYS = [500, 1000, 2000, 5000, 10000];
+
+// Type of a backend event, or null for anything that is not one
+function eventType(event: MessageEvent): string | null {
+  try {
+    return JSON.parse(event.data).type ?? null;
+  } catch {
+    return null;
+  }
+}
+
+// Provisional view of the next test while the diagnostics agent is still generating it
+export interface TestPreview {
+  text: string;
+  steps: string[];
+  warnings: string[];
+}
+
 export function useIssue() {
   const [activeIssue, setActiveIssue] = useState(false);
   const [socket, setSocket] = useState<WebSocket | null>(null);
@@ -9,32 +39,169 @@ export function useIssue() {
   const [serverReady, setServerReady] = useState(false);
   const [loading, setLoading] = useState(false);
   const [thinking, setThinking] = useState<string>("");
-
-  // no-op queue placeholder removed
+  const [testPreview, setTestPreview] = useState<TestPreview | null>(null);
+
+  // Reattach state: the open issue and the last event seen, so a dropped connection resumes where it left off
+  const issueIdRef = useRef<string | null>(null);
+  const lastSeqRef = useRef(0);
+  const socketRef = useRef<WebSocket | null>(null); // the socket in use (state lags behind for callbacks)
+  const attachingRef = useRef<Promise<WebSocket | null> | null>(null); // reattach under way
+  const reattachAttemptRef = useRef(0);
+  const reattachTimerRef = useRef<number | undefined>(undefined);
+  const mountedRef = useRef(true);
+  const reattachRef = useRef<() => void>(() => {});
 
   const enqueueIssueLog = useCallback((log: any) => {
     setIssueLog((prev) => [...prev, log]);
   }, []);
 
+  // Redraw from a state snapshot (sent instead of a replay when too much was missed)
+  const applySnapshot = useCallback((snapshot: any) => {
+    setLoading(false);
+    setTestPreview(null);
+    setIssueLog((prev) => {
+      const shown = (type: string, match: (p: any) => boolean) => prev.some((e) => e.type === type && match(e.payload || {}));
+      const next = [...prev];
+      const pending = snapshot.pending_test;
+      if (pending && !shown("diagnostics.test", (p) => p.id === pending.id)) {
+        next.push({ type: "diagnostics.test", issue_id: snapshot.issue_id, payload: pending });
+      }
+      const plan = snapshot.maintenance_plan;
+      if (plan && !shown("maintenance.plan", () => true)) {
+        next.push({ type: "maintenance.plan", issue_id: snapshot.issue_id, payload: { diagnosis: snapshot.active_diagnosis?.diagnosis, plan } });
+      }
+      return next;
+    });
+  }, []);
+
   const handleWebSocketMessage = useCallback((event: MessageEvent) => {
     console.log("WebSocket message received:", event.data);
     try {
       const data = JSON.parse(event.data);
       console.log("Parsed WebSocket data:", data);
+      // events are numbered per issue; skip anything already seen (e.g. replayed after a reattach)
+      if (data.type === "issue.created") lastSeqRef.current = 0;
+      if (typeof data.seq === "number") {
+        if (data.seq <= lastSeqRef.current && data.type !== "issue.snapshot") return;
+        lastSeqRef.current = data.seq;
+      }
+      if (data.type === "issue.created") {
+        issueIdRef.current = data.payload?.issue_id ?? data.issue_id ?? null;
+      } else if (data.type === "issue.create_rejected" && data.issue_id) {
+        // an issue is already open (e.g. this client lost track of it): resume that one instead
+        issueIdRef.current = data.issue_id;
+        lastSeqRef.current = 0;
+      } else if (data.type === "issue.attached") {
+        reattachAttemptRef.current = 0;
+      } else if (data.type === "issue.closed" || data.type === "issue.attach_rejected") {
+        issueIdRef.current = null; // nothing to reattach to
+      }
       // handle special types for UI hints
-      if (data.type === "diagnostics.loading") {
+      if (data.type === "issue.snapshot") {
+        applySnapshot(data.payload || {});
+      } else if (data.type === "diagnostics.loading" || data.type === "maintenance.loading") {
         setLoading(data.payload?.status === "started");
+        setTestPreview(null);
+      } else if (data.type === "diagnostics.test_partial") {
+        const payload = data.payload || {};
+        setTestPreview((prev) => {
+          const preview: TestPreview = prev ?? { text: "", steps: [], warnings: [] };
+          if (payload.field === "test_text") {
+            return { ...preview, text: preview.text + String(payload.delta ?? "") };
+          }
+          if (payload.field === "test_instructions") {
+            const steps = [...preview.steps];
+            steps[payload.index ?? steps.length] = String(payload.step?.step_text ?? "");
+            return { ...preview, steps };
+          }
+          if (payload.field === "safety_and_warnings") {
+            return { ...preview, warnings: (payload.value || []).map(String) };
+          }
+          return preview;
+        });
       } else if (data.type === "llm.thinking") {
         const text = data.payload?.text ?? "";
         setThinking((prev) => prev + String(text));
+      } else if (HIDDEN_EVENT_TYPES.has(data.type)) {
+        // not displayed to the user
       } else {
+        if (data.type === "diagnostics.test") setTestPreview(null);
         enqueueIssueLog(data);
       }
     } catch (error) {
       console.log("Raw WebSocket data (not JSON):", event.data);
       enqueueIssueLog({ type: "raw", payload: String(event.data) });
     }
-  }, [enqueueIssueLog]);
+  }, [enqueueIssueLog, applySnapshot]);
+
+  const adoptSocket = useCallback((ws: WebSocket) => {
+    socketRef.current = ws;
+    setActiveIssue(true);
+    setSocket(ws);
+  }, []);
+
+  // Connection dropped: unless the issue was closed, reattach with backoff and catch up on missed events
+  const handleWebSocketClose = useCallback((event?: CloseEvent) => {
+    // a socket the backend replaced with a newer one (e.g. a reattach) closing: nothing was lost
+    if (event && event.target !== socketRef.current && socketRef.current?.readyState === WebSocket.OPEN) return;
+    socketRef.current = null;
+    setActiveIssue(false);
+    setSocket(null);
+    if (!mountedRef.current || issueIdRef.current === null) return;
+    const delay = REATTACH_DELAYS[Math.min(reattachAttemptRef.current, REATTACH_DELAYS.length - 1)];
+    reattachAttemptRef.current += 1;
+    clearTimeout(reattachTimerRef.current);
+    reattachTimerRef.current = window.setTimeout(() => reattachRef.current(), delay);
+  }, []);
+
+  // Reattach to the known issue (or join the reattach already under way). Resolves with the socket once the backend
+  // confirmed it with issue.attached, or null if the issue is gone or the connection failed again.
+  const attach = useCallback((): Promise<WebSocket | null> => {
+    const current = socketRef.current;
+    if (current && current.readyState === WebSocket.OPEN) return Promise.resolve(current);
+    if (attachingRef.current) return attachingRef.current;
+    const issueId = issueIdRef.current;
+    if (!mountedRef.current || issueId === null) return Promise.resolve(null);
+    clearTimeout(reattachTimerRef.current);
+    const attaching = (async () => {
+      try {
+        const apiBase = (await invoke("api_base")) as string;
+        const params = new URLSearchParams({ issue_id: issueId, last_seq: String(lastSeqRef.current) });
+        const ws = new WebSocket(apiBase.replace("http", "ws") + "/issue/attach?" + params);
+        return await new Promise<WebSocket | null>((resolve) => {
+          ws.onopen = () => {
+            adoptSocket(ws);
+            console.log("WebSocket reattached");
+          };
+          ws.onmessage = (event) => {
+            handleWebSocketMessage(event);
+            const type = eventType(event);
+            if (type === "issue.attached") resolve(ws);
+            else if (type === "issue.attach_rejected") resolve(null);
+          };
+          ws.onclose = (event) => {
+            resolve(null);
+            handleWebSocketClose(event);
+          };
+          ws.onerror = (error) => {
+            console.error("WebSocket error:", error);
+          };
+        });
+      } catch (error) {
+        console.error("Failed to reattach:", error);
+        handleWebSocketClose();
+        return null;
+      } finally {
+        attachingRef.current = null;
+      }
+    })();
+    attachingRef.current = attaching;
+    return attaching;
+  }, [adoptSocket, handleWebSocketMessage, handleWebSocketClose]);
+
+  reattachRef.current = () => {
+    void attach();
+  };
 
   const createIssue = useCallback(async () => {
     try {
@@ -44,17 +211,13 @@ export function useIssue() {
       const ws = new WebSocket(wsUrl);
 
       ws.onopen = () => {
-        setActiveIssue(true);
-        setSocket(ws);
+        adoptSocket(ws);
         console.log("WebSocket connected");
       };
 
       ws.onmessage = handleWebSocketMessage;
 
-      ws.onclose = () => {
-        setActiveIssue(false);
-        setSocket(null);
-      };
+      ws.onclose = handleWebSocketClose;
 
       ws.onerror = (error) => {
         console.error("WebSocket error:", error);
@@ -63,76 +226,73 @@ export function useIssue() {
     } catch (error) {
       console.error("Failed to create issue:", error);
     }
-  }, [handleWebSocketMessage]);
+  }, [adoptSocket, handleWebSocketMessage, handleWebSocketClose]);
 
-  const startDiagnostics = useCallback(async () => {
-    try {
-      if (socket && socket.readyState === WebSocket.OPEN) {
-        socket.send(JSON.stringify({ type: "diagnostics.start" }));
-        return;
+  // A socket ready for messages about the issue: the open one, a reattach to the known issue (a new /issue/create
+  // would be rejected while it is open), or a new issue. Resolves once the backend confirmed it, null on failure.
+  const ensureSocketOpen = useCallback(async (): Promise<WebSocket | null> => {
+    const current = socketRef.current;
+    if (current && current.readyState === WebSocket.OPEN) return current;
+    if (issueIdRef.current !== null) {
+      // keep trying through the backoff while the issue is still open
+      for (const delay of [0, ...REATTACH_DELAYS]) {
+        if (delay) await new Promise((resolve) => setTimeout(resolve, delay));
+        if (!mountedRef.current || issueIdRef.current === null) break;
+        const ws = await attach();
+        if (ws) return ws;
       }
-
-      const apiBase = (await invoke("api_base")) as string;
-      const wsUrl = apiBase.replace("http", "ws") + "/issue/create";
-      const ws = new WebSocket(wsUrl);
-
-      ws.onopen = () => {
-        setActiveIssue(true);
-        setSocket(ws);
-        ws.send(JSON.stringify({ type: "diagnostics.start" }));
-      };
-
-      ws.onmessage = handleWebSocketMessage;
-
-      ws.onclose = () => {
-        setActiveIssue(false);
-        setSocket(null);
-      };
-
-      ws.onerror = (error) => {
-        console.error("WebSocket error:", error);
-      };
-    } catch (error) {
-      console.error("Failed to start diagnostics:", error);
+      console.error("Could not reattach to the issue; message not sent");
+      return null;
     }
-  }, [socket, handleWebSocketMessage]);
-
-  const ensureSocketOpen = useCallback(async (): Promise<WebSocket | null> => {
-    if (socket && socket.readyState === WebSocket.OPEN) return socket;
     try {
       const apiBase = (await invoke("api_base")) as string;
       const wsUrl = apiBase.replace("http", "ws") + "/issue/create";
       const ws = new WebSocket(wsUrl);
       return await new Promise<WebSocket | null>((resolve) => {
-        ws.onopen = () => {
-          setActiveIssue(true);
-          setSocket(ws);
-          resolve(ws);
+        let rejected = false;
+        ws.onopen = () => adoptSocket(ws);
+        ws.onmessage = (event) => {
+          handleWebSocketMessage(event);
+          const type = eventType(event);
+          if (type === "issue.created") resolve(ws);
+          else if (type === "issue.create_rejected") rejected = true;
         };
-        ws.onmessage = handleWebSocketMessage;
-        ws.onclose = () => {
-          setActiveIssue(false);
-          setSocket(null);
+        ws.onclose = (event) => {
+          handleWebSocketClose(event);
+          // another issue is open (its id came with the rejection): send to that one
+          resolve(rejected && issueIdRef.current !== null ? attach() : null);
         };
         ws.onerror = (error) => {
           console.error("WebSocket error:", error);
-          resolve(null);
         };
       });
     } catch (error) {
       console.error("Failed to open websocket:", error);
       return null;
     }
-  }, [socket, handleWebSocketMessage]);
+  }, [attach, adoptSocket, handleWebSocketMessage, handleWebSocketClose]);
+
+  const startDiagnostics = useCallback(async () => {
+    let ws = socketRef.current;
+    if (ws && ws.readyState === WebSocket.OPEN) {
+      ws.send(JSON.stringify({ type: "diagnostics.start" }));
+      return;
+    }
+    const resuming = issueIdRef.current !== null;
+    ws = await ensureSocketOpen();
+    // a resumed issue already greeted the technician
+    if (ws && !resuming) ws.send(JSON.stringify({ type: "diagnostics.start" }));
+  }, [ensureSocketOpen]);
 
   const sendIssueBegin = useCallback(async (description: string) => {
     if (!description || description.trim().length === 0) return;
-    let ws = socket;
+    let ws = socketRef.current;
     if (!ws || ws.readyState !== WebSocket.OPEN) {
+      const resuming = issueIdRef.current !== null;
       ws = await ensureSocketOpen();
       if (!ws) return;
-      // Prompt the backend to greet the user
-      ws.send(JSON.stringify({ type: "diagnostics.start" }));
+      // Prompt the backend to greet the user (a resumed issue already did)
+      if (!resuming) ws.send(JSON.stringify({ type: "diagnostics.start" }));
     }
     const payload = {
       id: `issue_description`,
@@ -143,17 +303,44 @@ export function useIssue() {
       result: description,
     };
     ws.send(JSON.stringify({ type: "issue.begin", payload }));
-  }, [socket, ensureSocketOpen]);
+  }, [ensureSocketOpen]);
 
   const submitTestResult = useCallback(async (testId: string, result: any) => {
     if (!testId) return;
-    let ws = socket;
+    let ws = socketRef.current;
     if (!ws || ws.readyState !== WebSocket.OPEN) {
       ws = await ensureSocketOpen();
       if (!ws) return;
     }
     ws.send(JSON.stringify({ type: "diagnostics.test_result", payload: { test_id: testId, result } }));
-  }, [socket, ensureSocketOpen]);
+  }, [ensureSocketOpen]);
+
+  // Finish the issue: the backend archives it, releases its state and closes the socket, so the next description
+  // starts a new issue right away instead of waiting for the backend's idle timeout
+  const closeIssue = useCallback(async () => {
+    if (issueIdRef.current === null) return;
+    const ws = await attach(); // the open socket, or a reattach just to close it
+    issueIdRef.current = null; // the backend closes the socket next: don't reattach
+    ws?.send(JSON.stringify({ type: "issue.close", payload: { reason: "client" } }));
+    setIssueLog([]);
+    setThinking("");
+    setTestPreview(null);
+    setLoading(false);
+  }, [attach]);
+
+  // Leaving the view finishes the issue (declared before the socket cleanup below, so the socket is still open)
+  useEffect(() => {
+    mountedRef.current = true;
+    return () => {
+      mountedRef.current = false;
+      clearTimeout(reattachTimerRef.current);
+      const ws = socketRef.current;
+      if (issueIdRef.current !== null && ws && ws.readyState === WebSocket.OPEN) {
+        issueIdRef.current = null;
+        ws.send(JSON.stringify({ type: "issue.close", payload: { reason: "client" } }));
+      }
+    };
+  }, []);
 
   useEffect(() => {
     return () => {
@@ -203,7 +390,7 @@ export function useIssue() {
 
 
 
-  return { activeIssue, createIssue, startDiagnostics, issueLog, serverReady, sendIssueBegin, submitTestResult, loading, thinking };
+  return { activeIssue, createIssue, startDiagnostics, closeIssue, issueLog, serverReady, sendIssueBegin, submitTestResult, loading, thinking, testPreview };
 }
 
 
@@ -2,12 +2,13 @@ import styles from "./Chat.module.css";
 import { useState, useRef } from "react";
 import { useIssue } from "../../hooks/useIssue";
 import { invoke } from "@tauri-apps/api/core";
+import { listen } from "@tauri-apps/api/event";
 import ChatFeed from "./ChatFeed/ChatFeed";
 
 
 export default function Chat() {
     
-    const { startDiagnostics, issueLog, sendIssueBegin, submitTestResult, loading, thinking } = useIssue();
+    const { startDiagnostics, closeIssue, issueLog, sendIssueBegin, submitTestResult, loading, thinking, testPreview } = useIssue();
     const [chatType, setChatType] = useState<"default" | "diagnostics" | "communications">("default");
     const [isListening, setIsListening] = useState(false);
     const [isSpeaking, setIsSpeaking] = useState(false);
@@ -19,10 +20,18 @@ export default function Chat() {
         startDiagnostics();
     }
 
+    // Done with the vehicle (or giving up on it): close the issue so the backend archives it and frees it for the next one
+    const handleFinishIssue = () => {
+        setChatType("default");
+        closeIssue();
+    }
+
     const handleVoiceInput = async () => {
         if (isListening) return;
         
         setIsListening(true);
+        // partial transcripts of the utterance so far, shown while the technician is still speaking
+        const unlisten = await listen<string>("voice-partial", (event) => setUserInput(event.payload));
         try {
             // Use the longer recording duration for better results
             const transcription = await invoke("start_voice_input_long") as string;
@@ -34,6 +43,7 @@ export default function Chat() {
             console.error("Voice input failed:", error);
             alert(`Voice input failed: ${error}`);
         } finally {
+            unlisten();
             setIsListening(false);
         }
     }
@@ -82,6 +92,11 @@ export default function Chat() {
                     >
                         {isSpeaking ? '🔊 Speaking...' : '🔊 Test Voice Output'}
                     </button>
+                    {chatType === "diagnostics" && (
+                        <button className={styles.voiceDemoButton} onClick={handleFinishIssue}>
+                            ✓ Finish Issue
+                        </button>
+                    )}
                 </div>
             </div>
 
@@ -95,7 +110,7 @@ export default function Chat() {
                         
                         {
                             chatType === "diagnostics" ? (
-                                <ChatFeed issueLog={issueLog} onSubmitTestResult={submitTestResult} loading={loading} thinking={thinking} />
+                                <ChatFeed issueLog={issueLog} onSubmitTestResult={submitTestResult} loading={loading} thinking={thinking} testPreview={testPreview} />
                             )
                             : (
                                 <div className={`${styles.actionsGridContainer}`}>
@@ -3,6 +3,7 @@
 import styles from "./ChatFeed.module.css";
 import FeedEntry from "../FeedEntries/FeedEntry";
 import { useEffect, useRef } from "react";
+import type { TestPreview } from "../../../hooks/useIssue";
 
 
 interface ChatFeedProps {
@@ -10,9 +11,10 @@ interface ChatFeedProps {
     onSubmitTestResult?: (testId: string, result: any) => void;
     loading?: boolean;
     thinking?: string;
+    testPreview?: TestPreview | null;
 }
 
-export default function ChatFeed({issueLog, onSubmitTestResult, loading, thinking}: ChatFeedProps) {
+export default function ChatFeed({issueLog, onSubmitTestResult, loading, thinking, testPreview}: ChatFeedProps) {
     const thinkingScrollRef = useRef<HTMLDivElement | null>(null);
 
     useEffect(() => {
@@ -32,6 +34,21 @@ export default function ChatFeed({issueLog, onSubmitTestResult, loading, thinkin
                         <div className={styles.loadingText}>Thinking…</div>
                     </div>
                 )}
+                {testPreview && (testPreview.text || testPreview.steps.length > 0) && (
+                    <div className={styles.previewRow}>
+                        {testPreview.text && <div className={styles.previewText}>{testPreview.text}</div>}
+                        {testPreview.steps.length > 0 && (
+                            <ul className={styles.previewList}>
+                                {testPreview.steps.map((step, idx) => (
+                                    <li key={idx}>{step}</li>
+                                ))}
+                            </ul>
+                        )}
+                        {testPreview.warnings.length > 0 && (
+                            <div className={styles.previewWarning}>⚠ {testPreview.warnings.join(" · ")}</div>
+                        )}
+                    </div>
+                )}
                 {thinking && thinking.length > 0 && (
                     <div className={styles.thinkingRow}>
                         <div className={styles.thinkingScroll} ref={thinkingScrollRef}>
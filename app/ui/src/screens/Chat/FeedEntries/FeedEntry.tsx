@@ -10,6 +10,7 @@ export default function FeedEntry({log, onSubmitTestResult}: {log: any, onSubmit
         "communications.talk": <TalkEntry log={log} />,
         "issue.created": <IssueCreatedEntry log={log} />,
         "diagnostics.test": <DiagnosticsTestEntry log={log} onSubmitTestResult={onSubmitTestResult} />,
+        "maintenance.plan": <MaintenancePlanEntry log={log} />,
     };
     const entry = feedEntries[log.type as keyof typeof feedEntries] ?? <RawEntry log={log} />;
     return (
@@ -133,6 +134,33 @@ function DiagnosticsTestEntry({log, onSubmitTestResult}: {log: any, onSubmitTest
     );
 }
 
+function MaintenancePlanEntry({log}: {log: any}) {
+    const diagnosis: string = log?.payload?.diagnosis?.diagnosis || "";
+    const plan = log?.payload?.plan || {};
+    const tools: string[] = Array.isArray(plan.tools) ? plan.tools : [];
+    const parts: string[] = Array.isArray(plan.parts) ? plan.parts : [];
+    const steps: string[] = Array.isArray(plan.steps) ? plan.steps : [];
+
+    return (
+        <div className={styles.messageRow}>
+            <div className={styles.agentAvatar}>🔧</div>
+            <div className={`${styles.messageBubble} ${styles.testCard}`}>
+                {diagnosis && <div className={styles.messageText}>Repair plan: {diagnosis}</div>}
+                {plan.difficulty !== undefined && <div className={styles.messageSubtext}>Difficulty: {plan.difficulty}/10</div>}
+                {tools.length > 0 && <div className={styles.messageSubtext}>Tools: {tools.join(", ")}</div>}
+                {parts.length > 0 && <div className={styles.messageSubtext}>Parts: {parts.join(", ")}</div>}
+                {steps.length > 0 && (
+                    <ol className={styles.messageList}>
+                        {steps.map((step, idx) => (
+                            <li key={idx}>{step}</li>
+                        ))}
+                    </ol>
+                )}
+            </div>
+        </div>
+    );
+}
+
 function RawEntry({log}: {log: any}) {
     return (
         <div className={styles.messageRow}>